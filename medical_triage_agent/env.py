@@ -0,0 +1,37 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Numeric settings from environment variables."""
+
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+def env_number(name: str, default: float, minimum: float = 0.0) -> float:
+    """
+    Number from an environment variable, at least `minimum`.
+
+    Unset or empty variables give the default; invalid values log a warning
+    and give the default.
+    """
+    value = os.getenv(name, "").strip()
+    if not value:
+        return default
+    try:
+        return max(minimum, float(value))
+    except ValueError:
+        logger.warning(f"Ignoring invalid {name}={value!r}; using {default}")
+        return default
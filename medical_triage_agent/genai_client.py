@@ -0,0 +1,210 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Shared Gemini (Vertex AI) Client.
+
+Every tool and the embedding backend get their `genai.Client` here instead of
+constructing one per call. That way credentials are loaded once, and HTTP
+connections are kept alive in one pool per process:
+- `get_genai_client()`: the sync client (`client.models...`)
+- `get_async_genai_client()`: its async facade (`client.aio.models...`). It
+  shares the credentials but has its own connection pool, which belongs to
+  the event loop that first uses it.
+
+The project and location are resolved once, loading `.env` if needed.
+Timeouts and pool sizes come from the environment:
+- GENAI_TIMEOUT_SECONDS: per-request timeout (default 120)
+- GENAI_MAX_CONNECTIONS: connections per pool (default 32)
+- GENAI_KEEPALIVE_SECONDS: how long idle connections are kept (default 60)
+"""
+
+import os
+import threading
+from pathlib import Path
+from typing import Any, Optional, Tuple
+
+from .env import env_number
+
+DEFAULT_LOCATION = "us-central1"
+DEFAULT_TIMEOUT_SECONDS = 120.0
+DEFAULT_MAX_CONNECTIONS = 32
+DEFAULT_KEEPALIVE_SECONDS = 60.0
+
+ENV_PATH = Path(__file__).parent.parent / ".env"
+
+_settings: Optional[Tuple[Optional[str], str]] = None
+_settings_lock = threading.Lock()
+
+
+def _resolve_settings() -> Tuple[Optional[str], str]:
+    """(project, location), resolved once; retried while the project is missing."""
+    global _settings
+    with _settings_lock:
+        if _settings is None or _settings[0] is None:
+            if not os.getenv("GOOGLE_CLOUD_PROJECT") and ENV_PATH.exists():
+                from dotenv import load_dotenv
+
+                load_dotenv(ENV_PATH)
+            _settings = (
+                os.getenv("GOOGLE_CLOUD_PROJECT") or None,
+                os.getenv("GOOGLE_CLOUD_LOCATION", DEFAULT_LOCATION),
+            )
+        return _settings
+
+
+def get_google_cloud_project() -> Optional[str]:
+    """Get GOOGLE_CLOUD_PROJECT, loading .env if needed."""
+    return _resolve_settings()[0]
+
+
+def get_google_cloud_location() -> str:
+    """Get GOOGLE_CLOUD_LOCATION (default us-central1), loading .env if needed."""
+    return _resolve_settings()[1]
+
+
+def get_genai_timeout() -> float:
+    """Get the per-request timeout in seconds from GENAI_TIMEOUT_SECONDS (default 120)."""
+    return env_number("GENAI_TIMEOUT_SECONDS", DEFAULT_TIMEOUT_SECONDS, minimum=0.1)
+
+
+def get_genai_max_connections() -> int:
+    """Get the connection pool size from GENAI_MAX_CONNECTIONS (default 32)."""
+    try:
+        return max(1, int(os.getenv("GENAI_MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS)))
+    except ValueError:
+        return DEFAULT_MAX_CONNECTIONS
+
+
+def get_genai_keepalive() -> float:
+    """Get how long idle connections are kept, from GENAI_KEEPALIVE_SECONDS (default 60)."""
+    return env_number("GENAI_KEEPALIVE_SECONDS", DEFAULT_KEEPALIVE_SECONDS, minimum=0.1)
+
+
+class GenAIClientProvider:
+    """Creates one pooled Vertex AI `genai.Client` on first use (thread-safe)."""
+
+    def __init__(
+        self,
+        project: Optional[str] = None,
+        location: Optional[str] = None,
+        timeout: Optional[float] = None,
+        max_connections: Optional[int] = None,
+        keepalive: Optional[float] = None,
+    ):
+        """
+        Args:
+            project: GCP project. If None, uses GOOGLE_CLOUD_PROJECT
+            location: Vertex AI location. If None, uses GOOGLE_CLOUD_LOCATION
+            timeout: Per-request timeout in seconds. If None, uses GENAI_TIMEOUT_SECONDS
+            max_connections: Connections per pool. If None, uses GENAI_MAX_CONNECTIONS
+            keepalive: Idle connection lifetime in seconds. If None, uses GENAI_KEEPALIVE_SECONDS
+        """
+        self.project = project
+        self.location = location
+        self.timeout = timeout or get_genai_timeout()
+        self.max_connections = max_connections or get_genai_max_connections()
+        self.keepalive = keepalive or get_genai_keepalive()
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _http_options(self) -> Any:
+        import httpx
+        from google.genai import types
+
+        def pool_args() -> dict:
+            return {
+                "limits": httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                    keepalive_expiry=self.keepalive,
+                ),
+            }
+
+        return types.HttpOptions(
+            timeout=int(self.timeout * 1000),  # milliseconds
+            client_args=pool_args(),
+            async_client_args=pool_args(),
+        )
+
+    def client(self) -> Any:
+        """The shared sync `genai.Client`, created on first use."""
+        client = self._client
+        if client is not None:
+            return client
+        with self._lock:
+            if self._client is None:
+                from google import genai
+
+                project = self.project or get_google_cloud_project()
+                if not project:
+                    raise ValueError(
+                        "GOOGLE_CLOUD_PROJECT environment variable is not set. "
+                        "Please set it or ensure it's in your .env file."
+                    )
+                self._client = genai.Client(
+                    vertexai=True,
+                    project=project,
+                    location=self.location or get_google_cloud_location(),
+                    http_options=self._http_options(),
+                )
+            return self._client
+
+    def async_client(self) -> Any:
+        """The async facade (`client.aio`) of the shared client."""
+        return self.client().aio
+
+    def close(self) -> None:
+        """Close the sync connection pool and forget the client."""
+        with self._lock:
+            client, self._client = self._client, None
+        if client is not None:
+            try:
+                client.close()
+            except Exception:
+                pass
+
+
+_provider: Optional[GenAIClientProvider] = None
+_provider_lock = threading.Lock()
+
+
+def get_genai_provider() -> GenAIClientProvider:
+    """Get the process-wide client provider."""
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            _provider = GenAIClientProvider()
+        return _provider
+
+
+def get_genai_client() -> Any:
+    """Get the shared sync `genai.Client` for Vertex AI."""
+    return get_genai_provider().client()
+
+
+def get_async_genai_client() -> Any:
+    """Get the shared async client (`genai.Client.aio`) for Vertex AI."""
+    return get_genai_provider().async_client()
+
+
+def reset_genai_clients() -> None:
+    """Close the shared client and re-resolve settings on next use (e.g. after the environment changed)."""
+    global _provider, _settings
+    with _provider_lock:
+        provider, _provider = _provider, None
+    with _settings_lock:
+        _settings = None
+    if provider is not None:
+        provider.close()
@@ -12,13 +12,18 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from .chroma_setup import get_chroma_client, initialize_knowledge_base
+from .chroma_setup import get_chroma_client, get_chroma_registry, initialize_knowledge_base
 from .chroma_tools import query_knowledge_base_tool
+from .retrieval import SearchResults, search_knowledge_base, search_knowledge_base_async
 
 __all__ = [
     "get_chroma_client",
+    "get_chroma_registry",
     "initialize_knowledge_base",
     "query_knowledge_base_tool",
+    "search_knowledge_base",
+    "search_knowledge_base_async",
+    "SearchResults",
 ]
 
 
@@ -0,0 +1,116 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Token-Budget Batch Packer for Embedding Requests.
+
+Instead of a fixed number of chunks per request, chunks are packed so each
+request carries as many estimated tokens as the limit allows. Short chunks
+share a request; chunks too large for the limit are sent on their own.
+"""
+
+import math
+import os
+from typing import List
+
+# gemini-embedding-001 input token limit (see chroma_setup.generate_embeddings)
+DEFAULT_MAX_REQUEST_TOKENS = 2048
+
+# Upper bound on texts per request regardless of their size
+DEFAULT_MAX_BATCH_ITEMS = 100
+
+# Characters per token (~250 tokens per 1000-character chunk). Requests the
+# estimate gets wrong are split by EmbeddingEngine on the API error.
+CHARS_PER_TOKEN = 4.0
+
+
+def get_max_request_tokens() -> int:
+    """Get the per-request token budget from EMBEDDING_MAX_REQUEST_TOKENS (default 2048)."""
+    try:
+        return max(1, int(os.getenv("EMBEDDING_MAX_REQUEST_TOKENS", DEFAULT_MAX_REQUEST_TOKENS)))
+    except ValueError:
+        return DEFAULT_MAX_REQUEST_TOKENS
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the token count of a text without calling the tokenizer API.
+
+    Takes the larger of a character-based and a word-based estimate so that
+    both long words (drug names, ICD codes) and short-word text are covered.
+
+    Args:
+        text: Text to estimate
+
+    Returns:
+        Estimated number of tokens (at least 1)
+    """
+    by_chars = len(text) / CHARS_PER_TOKEN
+    by_words = len(text.split()) * 1.3
+    return max(1, math.ceil(max(by_chars, by_words)))
+
+
+def pack_batches(
+    texts: List[str],
+    max_tokens: int = DEFAULT_MAX_REQUEST_TOKENS,
+    max_items: int = DEFAULT_MAX_BATCH_ITEMS,
+) -> List[List[int]]:
+    """
+    Pack texts into requests that fill the token budget as closely as possible.
+
+    Texts are sorted by estimated size. Each request starts with the largest
+    remaining text, takes further large texts while they fit, and tops up
+    with the smallest ones. A text that alone exceeds the budget is routed
+    to a request of its own (the API truncates it instead of failing the
+    whole batch).
+
+    Args:
+        texts: Texts to pack
+        max_tokens: Estimated token budget per request
+        max_items: Maximum texts per request
+
+    Returns:
+        List of requests, each a list of indices into `texts`
+    """
+    sizes = [estimate_tokens(text) for text in texts]
+    order = sorted(range(len(texts)), key=lambda i: sizes[i], reverse=True)
+
+    batches: List[List[int]] = []
+    low, high = 0, len(order) - 1
+    while low <= high:
+        first = order[low]
+        low += 1
+        batch = [first]
+        used = sizes[first]
+        if used >= max_tokens:
+            batches.append(batch)
+            continue
+
+        # Next largest texts while they fit
+        while low <= high and len(batch) < max_items and used + sizes[order[low]] <= max_tokens:
+            batch.append(order[low])
+            used += sizes[order[low]]
+            low += 1
+
+        # Top up with the smallest texts
+        while low <= high and len(batch) < max_items and used + sizes[order[high]] <= max_tokens:
+            batch.append(order[high])
+            used += sizes[order[high]]
+            high -= 1
+
+        batches.append(sorted(batch))
+
+    # Keep requests roughly in document order
+    batches.sort(key=lambda batch: batch[0])
+    return batches
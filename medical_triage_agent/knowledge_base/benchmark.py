@@ -0,0 +1,536 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the knowledge base ingestion and retrieval pipeline.
+
+Usage:
+    python -m medical_triage_agent.knowledge_base.benchmark extraction
+    python -m medical_triage_agent.knowledge_base.benchmark extraction --pdf path/to/file.pdf --workers 8
+    python -m medical_triage_agent.knowledge_base.benchmark packing --pdf path/to/file.pdf
+    python -m medical_triage_agent.knowledge_base.benchmark cleaning --pdf path/to/file.pdf
+    python -m medical_triage_agent.knowledge_base.benchmark chunking --pdf path/to/file.pdf --k 1 3 5 10
+    python -m medical_triage_agent.knowledge_base.benchmark dimensionality --collection bates_guide
+    python -m medical_triage_agent.knowledge_base.benchmark client --collection bates_guide
+    python -m medical_triage_agent.knowledge_base.benchmark concurrency --sessions 16 --embed-latency-ms 200
+"""
+
+import argparse
+import asyncio
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+from .batch_packer import estimate_tokens, get_max_request_tokens, pack_batches
+from .chunk_cleaner import CleaningStats, strip_repeated_lines
+from .chroma_setup import (
+    BATES_PDF_PATH,
+    CHROMA_DB_PATH,
+    COLLECTION_BATES,
+    get_chroma_registry,
+    new_chroma_client,
+)
+from .collection_aliases import resolve_collection
+from .compact_store import COMPACT_DTYPES, CompactVectorStore
+from .embedding_backends import get_embedding_backend
+from .retrieval import ALL_COLLECTIONS, search_knowledge_base, search_knowledge_base_async
+from .pdf_pipeline import DEFAULT_CHUNK_SIZE, iter_chunks, iter_pdf_chunks, iter_pdf_pages, iter_pdf_pages_parallel
+from .structured_chunker import iter_sections, iter_structured_chunks
+
+
+def benchmark_extraction(pdf_path: Path, workers: int, repeat: int) -> dict:
+    """
+    Compare serial and process-pool PDF text extraction.
+
+    Args:
+        pdf_path: PDF to extract
+        workers: Worker processes for the parallel run
+        repeat: Number of timed runs per mode (best time is reported)
+
+    Returns:
+        Dictionary with timings, speedup and whether both modes produced identical text
+    """
+    def run(pages_iter):
+        start = time.perf_counter()
+        pages = list(pages_iter)
+        return time.perf_counter() - start, pages
+
+    serial_times, parallel_times = [], []
+    serial_pages = parallel_pages = None
+    for _ in range(repeat):
+        elapsed, serial_pages = run(iter_pdf_pages(pdf_path))
+        serial_times.append(elapsed)
+        elapsed, parallel_pages = run(iter_pdf_pages_parallel(pdf_path, workers))
+        parallel_times.append(elapsed)
+
+    serial_best = min(serial_times)
+    parallel_best = min(parallel_times)
+    return {
+        "pdf": pdf_path.name,
+        "pages": len(serial_pages),
+        "workers": workers,
+        "serial_sec": round(serial_best, 3),
+        "parallel_sec": round(parallel_best, 3),
+        "speedup": round(serial_best / parallel_best, 2) if parallel_best else None,
+        "identical_text": serial_pages == parallel_pages,
+    }
+
+
+def benchmark_packing(pdf_path: Path, fixed_batch_size: int = 8) -> dict:
+    """
+    Compare fixed-size embedding batches with token-budget packing.
+
+    Args:
+        pdf_path: PDF whose chunks are packed
+        fixed_batch_size: Chunks per request in the fixed scheme
+
+    Returns:
+        Dictionary with request counts and estimated tokens per request for both schemes
+    """
+    texts = [chunk.text for chunk in iter_pdf_chunks(pdf_path)]
+    sizes = [estimate_tokens(text) for text in texts]
+    max_tokens = get_max_request_tokens()
+
+    fixed = [list(range(i, min(i + fixed_batch_size, len(texts)))) for i in range(0, len(texts), fixed_batch_size)]
+    packed = pack_batches(texts, max_tokens)
+
+    def describe(batches):
+        tokens = [sum(sizes[i] for i in batch) for batch in batches]
+        return {
+            "requests": len(batches),
+            "avg_tokens_per_request": round(sum(tokens) / len(tokens), 1) if tokens else 0,
+            "over_limit_requests": sum(1 for t in tokens if t > max_tokens),
+        }
+
+    return {
+        "pdf": pdf_path.name,
+        "chunks": len(texts),
+        "max_request_tokens": max_tokens,
+        f"fixed_{fixed_batch_size}": describe(fixed),
+        "packed": describe(packed),
+    }
+
+
+def benchmark_cleaning(pdf_path: Path) -> dict:
+    """
+    Compare the chunks embedded with and without header/footer and near-duplicate cleaning.
+
+    Args:
+        pdf_path: PDF to chunk
+
+    Returns:
+        Dictionary with chunk and estimated token counts of both runs and what cleaning removed
+    """
+    raw_tokens = [estimate_tokens(chunk.text) for chunk in iter_pdf_chunks(pdf_path)]
+    stats = CleaningStats()
+    cleaned_tokens = [estimate_tokens(chunk.text) for chunk in iter_pdf_chunks(pdf_path, cleaning=stats)]
+
+    return {
+        "pdf": pdf_path.name,
+        "raw_chunks": len(raw_tokens),
+        "raw_tokens": sum(raw_tokens),
+        "cleaned_chunks": len(cleaned_tokens),
+        "cleaned_tokens": sum(cleaned_tokens),
+        "chunks_saved": len(raw_tokens) - len(cleaned_tokens),
+        "tokens_saved": sum(raw_tokens) - sum(cleaned_tokens),
+        "cleaning": stats.as_dict(),
+    }
+
+
+def benchmark_chunking(pdf_path: Path, ks: list, queries: int = 100, chunk_size: int = DEFAULT_CHUNK_SIZE) -> dict:
+    """
+    Compare how many retrieved chunks each chunker needs to return a whole section.
+
+    Sections found by the structured chunker's heading detection are the
+    ground truth: each sampled section's heading path ("VIII THT 13 Vertigo
+    (berat)") is the query, and its lines are the text that should come back. Both chunkings of the (cleaned) PDF
+    are embedded with the active embedding backend (EMBEDDING_BACKEND=hashing
+    runs offline) and searched exactly. Coverage@k is the share of the
+    section's lines found in the top k chunks.
+
+    Args:
+        pdf_path: PDF to chunk
+        ks: Result counts to evaluate
+        queries: Number of sampled sections
+        chunk_size: Chunk size for both chunkers
+
+    Returns:
+        Dictionary with, per chunker, chunk counts, coverage@k, full recall@k
+        (coverage >= 90%) and the mean number of results needed for it
+    """
+    pages = list(strip_repeated_lines(iter_pdf_pages_parallel(pdf_path)))
+    sections = [section for section in iter_sections(pages) if section.heading and section.lines]
+    if not sections:
+        return {"pdf": pdf_path.name, "error": "no headings detected"}
+    sample = np.random.default_rng(0).choice(len(sections), size=min(queries, len(sections)), replace=False)
+    targets = []
+    for i in sorted(sample):
+        section = sections[i]
+        targets.append((" ".join(section.path), [text for _, text in [section.heading, *section.lines]]))
+
+    backend = get_embedding_backend()
+    query_vectors = np.asarray([backend.embed_query(query) for query, _ in targets], dtype=np.float32)
+    max_k = max(ks)
+    result = {"pdf": pdf_path.name, "embedding_backend": backend.describe(), "queries": len(targets)}
+    chunkings = {
+        "fixed": iter_chunks(pages, chunk_size),
+        "structured": iter_structured_chunks(pages, chunk_size),
+    }
+    for name, chunks in chunkings.items():
+        texts = [chunk.text for chunk in chunks]
+        vectors = np.asarray(backend.embed_documents(texts)[0], dtype=np.float32)
+        vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        ranked = np.argsort(-(query_vectors @ vectors.T), axis=1)[:, :max_k]
+
+        coverage = {k: [] for k in ks}
+        needed = []
+        for (_, lines), order in zip(targets, ranked):
+            found = set()
+            need = None
+            for rank, chunk_index in enumerate(order, start=1):
+                found.update(i for i, line in enumerate(lines) if line in texts[chunk_index])
+                share = len(found) / len(lines)
+                if rank in coverage:
+                    coverage[rank].append(share)
+                if need is None and share >= 0.9:
+                    need = rank
+            needed.append(need if need is not None else max_k + 1)
+        result[name] = {
+            "chunks": len(texts),
+            "avg_chunk_chars": round(sum(len(text) for text in texts) / max(1, len(texts))),
+            **{f"coverage@{k}": round(float(np.mean(coverage[k])), 3) for k in ks},
+            **{f"full_recall@{k}": round(float(np.mean([n <= k for n in needed])), 3) for k in ks},
+            "mean_results_needed": round(float(np.mean(needed)), 2),
+        }
+    return result
+
+
+def _directory_bytes(path: Path) -> int:
+    return sum(f.stat().st_size for f in path.rglob("*") if f.is_file()) if path.exists() else 0
+
+
+def benchmark_dimensionality(collection_name: str, dimensionalities: list, k: int = 10, queries: int = 100) -> dict:
+    """
+    Compare vector size, query latency and recall of reduced and quantized embeddings.
+
+    Uses the vectors already stored in a collection, so no API calls are made:
+    a sample of stored chunks serves as queries, the exact float32 neighbours
+    at full size are the ground truth (the query chunk itself excluded), and
+    each dimensionality/dtype pair is searched exactly with `CompactVectorStore`.
+    Chroma's own HNSW query latency is reported for the current setup.
+
+    Args:
+        collection_name: Chroma collection to sample
+        dimensionalities: Truncated sizes to evaluate (larger than stored are skipped)
+        k: Neighbours compared for recall@k
+        queries: Number of sampled query chunks
+
+    Returns:
+        Dictionary with the baseline and one entry per "dim/dtype" configuration
+    """
+    collection = get_chroma_registry().collection(resolve_collection(CHROMA_DB_PATH, collection_name))
+    data = collection.get(include=["embeddings"])
+    ids = data["ids"]
+    vectors = np.asarray(data["embeddings"], dtype=np.float32)
+    if not len(ids):
+        return {"collection": collection_name, "error": "collection is empty"}
+
+    full_dim = vectors.shape[1]
+    k = min(k, len(ids) - 1) or 1
+    sample = np.random.default_rng(0).choice(len(ids), size=min(queries, len(ids)), replace=False)
+    query_vectors = vectors[sample]
+    no_text = [""] * len(ids)
+    no_meta = [{}] * len(ids)
+
+    def neighbours(store: CompactVectorStore, query_vector: np.ndarray, self_id: str) -> list:
+        found = store.query([query_vector], k + 1)["ids"][0]
+        return [chunk_id for chunk_id in found if chunk_id != self_id][:k]
+
+    baseline = CompactVectorStore.from_vectors(ids, no_text, no_meta, vectors, "float32")
+    truth = [set(neighbours(baseline, query_vectors[i], ids[j])) for i, j in enumerate(sample)]
+
+    start = time.perf_counter()
+    for query_vector in query_vectors:
+        collection.query(query_embeddings=[query_vector.tolist()], n_results=k)
+    chroma_ms = (time.perf_counter() - start) * 1000 / len(sample)
+
+    result = {
+        "collection": collection_name,
+        "vectors": len(ids),
+        "stored_dimensionality": full_dim,
+        "queries": len(sample),
+        "chroma_db_mb": round(_directory_bytes(CHROMA_DB_PATH) / 1024 / 1024, 1),
+        "chroma_hnsw_query_ms": round(chroma_ms, 3),
+    }
+    for dimensionality in sorted({d for d in dimensionalities if d <= full_dim} | {full_dim}, reverse=True):
+        for dtype in COMPACT_DTYPES:
+            store = CompactVectorStore.from_vectors(ids, no_text, no_meta, vectors, dtype, dimensionality)
+            start = time.perf_counter()
+            found = [neighbours(store, query_vectors[i], ids[j]) for i, j in enumerate(sample)]
+            elapsed_ms = (time.perf_counter() - start) * 1000 / len(sample)
+            recall = sum(len(truth[i] & set(f)) for i, f in enumerate(found)) / max(1, sum(len(t) for t in truth))
+            result[f"{dimensionality}/{dtype}"] = {
+                "vector_mb": round(store.nbytes / 1024 / 1024, 2),
+                "query_ms": round(elapsed_ms, 3),
+                f"recall@{k}": round(recall, 4),
+            }
+    return result
+
+
+def benchmark_client(collection_name: str, repeat: int = 200) -> dict:
+    """
+    Compare per-query Chroma overhead with a new client per call and with the shared registry.
+
+    "Before" repeats what every tool call used to do: create a client (and its
+    directory) and open the collection. "After" looks the handle up in the
+    process-wide registry. Both are also timed with a query (a stored vector,
+    so no embedding call is made).
+
+    Args:
+        collection_name: Logical collection to open
+        repeat: Timed calls per mode
+
+    Returns:
+        Dictionary with mean milliseconds per call for each mode and the speedup
+    """
+    physical_name = resolve_collection(CHROMA_DB_PATH, collection_name)
+    registry = get_chroma_registry()
+    sample = registry.collection(physical_name).get(limit=1, include=["embeddings"])
+    if not sample["ids"]:
+        return {"collection": collection_name, "error": "collection is empty"}
+    query_vector = [float(x) for x in sample["embeddings"][0]]
+
+    def per_call():
+        return new_chroma_client(CHROMA_DB_PATH).get_collection(physical_name)
+
+    def shared():
+        return registry.collection(physical_name)
+
+    def mean_ms(open_collection, query: bool) -> float:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            collection = open_collection()
+            if query:
+                collection.query(query_embeddings=[query_vector], n_results=5)
+        return (time.perf_counter() - start) * 1000 / repeat
+
+    before = mean_ms(per_call, False)
+    after = mean_ms(shared, False)
+    before_query = mean_ms(per_call, True)
+    after_query = mean_ms(shared, True)
+    return {
+        "collection": collection_name,
+        "calls": repeat,
+        "open_per_call_ms": round(before, 3),
+        "open_shared_ms": round(after, 4),
+        "query_per_call_ms": round(before_query, 3),
+        "query_shared_ms": round(after_query, 3),
+        "overhead_saved_per_query_ms": round(before_query - after_query, 3),
+        "registry": registry.stats(),
+    }
+
+
+class _SlowBackend:
+    """Adds a fixed latency to a backend's query embeddings (a stand-in for the Vertex round trip)."""
+
+    def __init__(self, backend, latency: float):
+        self._backend = backend
+        self._latency = latency
+
+    def __getattr__(self, name):
+        return getattr(self._backend, name)
+
+    def embed_query(self, text: str):
+        time.sleep(self._latency)
+        return self._backend.embed_query(text)
+
+    async def embed_query_async(self, text: str):
+        await asyncio.sleep(self._latency)
+        return await self._backend.embed_query_async(text)
+
+
+def benchmark_concurrency(
+    sessions: int = 16,
+    embed_latency_ms: float = 200.0,
+    collection_names: list = None,
+    n_results: int = 5,
+) -> dict:
+    """
+    Load test: concurrent sessions each running a knowledge base tool call on one event loop.
+
+    "sync" calls the blocking search from the coroutine, which is what ADK
+    did with the old synchronous tools, so the sessions run one after another.
+    "async" awaits `search_knowledge_base_async`, like the async tools do.
+    Every query is distinct, so the query cache does not hide the embedding
+    call. A ticker coroutine records the longest stall of the event loop,
+    i.e. how long a WebSocket could go unserved.
+
+    Args:
+        sessions: Concurrent sessions
+        embed_latency_ms: Latency added to each query embedding (0 = the backend's own)
+        collection_names: Collections to search. If None, searches all
+        n_results: Results per collection
+
+    Returns:
+        Dictionary with wall time and worst event loop stall per mode, and the speedup
+    """
+    backend = get_embedding_backend()
+    if embed_latency_ms:
+        backend = _SlowBackend(backend, embed_latency_ms / 1000)
+    collection_names = collection_names or ALL_COLLECTIONS
+
+    async def run(mode: str) -> dict:
+        async def session(i: int):
+            query = f"{mode} load test session {i} nyeri dada sesak napas {time.time_ns()}"
+            if mode == "sync":
+                return search_knowledge_base(query, collection_names, n_results, backend=backend)
+            return await search_knowledge_base_async(query, collection_names, n_results, backend=backend)
+
+        stalls = []
+        done = asyncio.Event()
+
+        async def ticker():
+            while not done.is_set():
+                start = time.perf_counter()
+                await asyncio.sleep(0.005)
+                stalls.append(time.perf_counter() - start - 0.005)
+
+        ticking = asyncio.create_task(ticker())
+        await asyncio.sleep(0)
+        start = time.perf_counter()
+        results = await asyncio.gather(*[session(i) for i in range(sessions)])
+        wall = time.perf_counter() - start
+        done.set()
+        await ticking
+        return {
+            "wall_ms": round(wall * 1000, 1),
+            "max_loop_stall_ms": round(max(stalls, default=0.0) * 1000, 1),
+            "errors": sum(1 for r in results if r.error),
+        }
+
+    sync_run = asyncio.run(run("sync"))
+    async_run = asyncio.run(run("async"))
+    return {
+        "sessions": sessions,
+        "collections": collection_names,
+        "embed_latency_ms": embed_latency_ms,
+        "sync": sync_run,
+        "async": async_run,
+        "speedup": round(sync_run["wall_ms"] / async_run["wall_ms"], 2) if async_run["wall_ms"] else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark knowledge base ingestion and retrieval"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    extraction = subparsers.add_parser(
+        "extraction",
+        help="Compare serial and parallel PDF text extraction"
+    )
+    extraction.add_argument("--pdf", type=Path, default=BATES_PDF_PATH, help="PDF to extract")
+    extraction.add_argument(
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Worker processes for the parallel run (default: CPU count)"
+    )
+    extraction.add_argument("--repeat", type=int, default=3, help="Timed runs per mode")
+
+    packing = subparsers.add_parser(
+        "packing",
+        help="Compare fixed-size embedding batches with token-budget packing"
+    )
+    packing.add_argument("--pdf", type=Path, default=BATES_PDF_PATH, help="PDF to chunk")
+    packing.add_argument("--fixed-batch-size", type=int, default=8, help="Chunks per request in the fixed scheme")
+
+    cleaning = subparsers.add_parser(
+        "cleaning",
+        help="Compare chunk and token counts with and without text cleaning"
+    )
+    cleaning.add_argument("--pdf", type=Path, default=BATES_PDF_PATH, help="PDF to chunk")
+
+    chunking = subparsers.add_parser(
+        "chunking",
+        help="Compare results needed per query with fixed and structured chunking"
+    )
+    chunking.add_argument("--pdf", type=Path, default=BATES_PDF_PATH, help="PDF to chunk")
+    chunking.add_argument("--k", type=int, nargs="+", default=[1, 3, 5, 10], help="Result counts to evaluate")
+    chunking.add_argument("--queries", type=int, default=100, help="Sampled sections")
+    chunking.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Chunk size for both chunkers")
+
+    dimensionality = subparsers.add_parser(
+        "dimensionality",
+        help="Compare size, latency and recall of reduced and quantized embeddings"
+    )
+    dimensionality.add_argument("--collection", default=COLLECTION_BATES, help="Collection to sample")
+    dimensionality.add_argument(
+        "--dims",
+        type=int,
+        nargs="+",
+        default=[1536, 768, 256],
+        help="Truncated sizes to evaluate (full size is always included)"
+    )
+    dimensionality.add_argument("--k", type=int, default=10, help="Neighbours compared for recall@k")
+    dimensionality.add_argument("--queries", type=int, default=100, help="Sampled query chunks")
+
+    client = subparsers.add_parser(
+        "client",
+        help="Compare per-query overhead of a new Chroma client per call and the shared registry"
+    )
+    client.add_argument("--collection", default=COLLECTION_BATES, help="Collection to open")
+    client.add_argument("--repeat", type=int, default=200, help="Timed calls per mode")
+
+    concurrency = subparsers.add_parser(
+        "concurrency",
+        help="Load test concurrent sessions with the blocking and the async retrieval path"
+    )
+    concurrency.add_argument("--sessions", type=int, default=16, help="Concurrent sessions")
+    concurrency.add_argument(
+        "--embed-latency-ms",
+        type=float,
+        default=200.0,
+        help="Latency added to each query embedding (0 = the backend's own)"
+    )
+    concurrency.add_argument("--collections", nargs="+", default=None, help="Collections to search (default: all)")
+    concurrency.add_argument("--n-results", type=int, default=5, help="Results per collection")
+
+    args = parser.parse_args()
+
+    if args.command == "extraction":
+        if not args.pdf.exists():
+            print(f"❌ PDF not found: {args.pdf}")
+            return
+        result = benchmark_extraction(args.pdf, args.workers, args.repeat)
+    elif args.command == "packing":
+        if not args.pdf.exists():
+            print(f"❌ PDF not found: {args.pdf}")
+            return
+        result = benchmark_packing(args.pdf, args.fixed_batch_size)
+    elif args.command == "cleaning":
+        if not args.pdf.exists():
+            print(f"❌ PDF not found: {args.pdf}")
+            return
+        result = benchmark_cleaning(args.pdf)
+    elif args.command == "chunking":
+        if not args.pdf.exists():
+            print(f"❌ PDF not found: {args.pdf}")
+            return
+        result = benchmark_chunking(args.pdf, sorted(set(args.k)), args.queries, args.chunk_size)
+    elif args.command == "dimensionality":
+        result = benchmark_dimensionality(args.collection, args.dims, args.k, args.queries)
+    elif args.command == "client":
+        result = benchmark_client(args.collection, args.repeat)
+    elif args.command == "concurrency":
+        result = benchmark_concurrency(args.sessions, args.embed_latency_ms, args.collections, args.n_results)
+
+    print("=" * 60)
+    for key, value in result.items():
+        print(f"  {key}: {value}")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
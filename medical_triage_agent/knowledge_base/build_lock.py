@@ -0,0 +1,299 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Lease Locks for Knowledge Base Builds.
+
+When several instances start on a missing knowledge base, only the one
+holding the build lease ingests and publishes. The others wait for the
+snapshot. A lease is a small record (owner, expiry). It has to be renewed
+before it expires, so a crashed holder does not block everyone forever.
+
+Backends:
+- `InProcessLeaseLock`: a dictionary shared by the process (tests)
+- `FileLeaseLock`: a local file guarded by `flock` (one host)
+- `ObjectStoreLeaseLock`: a blob updated with generation preconditions
+  (instances sharing a bucket)
+"""
+
+import fcntl
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+from .object_store import ObjectStore
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LEASE_TTL_SECONDS = 120.0
+DEFAULT_LEASE_POLL_SECONDS = 10.0
+
+# Object store prefix for lease blobs
+LEASE_PREFIX = "locks"
+
+# Returned by a change function to leave the record as it is
+_UNCHANGED = object()
+
+# Attempts at a conditional object store update before giving up
+_MAX_CAS_ATTEMPTS = 10
+
+
+def get_lease_ttl() -> float:
+    """Get the lease duration from KB_LOCK_TTL_SECONDS (default 120)."""
+    try:
+        return max(1.0, float(os.getenv("KB_LOCK_TTL_SECONDS", DEFAULT_LEASE_TTL_SECONDS)))
+    except ValueError:
+        return DEFAULT_LEASE_TTL_SECONDS
+
+
+def get_lease_poll_interval() -> float:
+    """Get how often waiting instances check the lease, from KB_LOCK_POLL_SECONDS (default 10)."""
+    try:
+        return max(0.1, float(os.getenv("KB_LOCK_POLL_SECONDS", DEFAULT_LEASE_POLL_SECONDS)))
+    except ValueError:
+        return DEFAULT_LEASE_POLL_SECONDS
+
+
+def default_owner() -> str:
+    """Identify this process: host, pid and a random suffix."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+
+def _live(record: Optional[dict], now: float) -> bool:
+    return bool(record) and record.get("expires_at", 0) > now
+
+
+class LeaseLock:
+    """
+    Lease on a named lock.
+
+    Backends implement `_update`, an atomic read-modify-write of the lease
+    record. Acquire, renew and release are built on it.
+    """
+
+    def __init__(self, name: str, ttl: Optional[float] = None, owner: Optional[str] = None):
+        """
+        Args:
+            name: Lock name
+            ttl: Lease duration in seconds. If None, uses KB_LOCK_TTL_SECONDS
+            owner: Holder id. If None, a unique id for this process is generated
+        """
+        self.name = name
+        self.ttl = ttl or get_lease_ttl()
+        self.owner = owner or default_owner()
+        self.lost = False
+
+    def _update(self, change: Callable[[Optional[dict]], object]) -> Optional[dict]:
+        """
+        Atomically apply `change` to the current record (None if free).
+
+        `change` returns the new record, None to clear it, or `_UNCHANGED`.
+
+        Returns:
+            The record stored afterwards
+        """
+        raise NotImplementedError
+
+    def _record(self, now: float, acquired_at: Optional[float] = None) -> dict:
+        return {
+            "owner": self.owner,
+            "acquired_at": acquired_at or now,
+            "renewed_at": now,
+            "expires_at": now + self.ttl,
+        }
+
+    def holder(self) -> Optional[dict]:
+        """The live lease record (whoever holds it), or None if the lock is free."""
+        now = time.time()
+        record = self._update(lambda current: _UNCHANGED)
+        return record if _live(record, now) else None
+
+    def try_acquire(self) -> bool:
+        """Take the lease if it is free, expired or already ours. Never blocks."""
+        now = time.time()
+
+        def claim(current):
+            if _live(current, now) and current.get("owner") != self.owner:
+                return _UNCHANGED
+            if current and current.get("owner") == self.owner:
+                return self._record(now, current.get("acquired_at"))
+            return self._record(now)
+
+        record = self._update(claim)
+        acquired = bool(record) and record.get("owner") == self.owner
+        if acquired:
+            self.lost = False
+        return acquired
+
+    def renew(self) -> bool:
+        """Extend the lease. Returns False if it is no longer ours."""
+        now = time.time()
+
+        def extend(current):
+            if not current or current.get("owner") != self.owner:
+                return _UNCHANGED
+            return self._record(now, current.get("acquired_at"))
+
+        record = self._update(extend)
+        return bool(record) and record.get("owner") == self.owner
+
+    def release(self) -> None:
+        """Give the lease up (no-op if it is not ours)."""
+        self._update(lambda current: None if current and current.get("owner") == self.owner else _UNCHANGED)
+
+    @contextmanager
+    def keep_alive(self, interval: Optional[float] = None, release: bool = True):
+        """
+        Renew the held lease in the background and (by default) release it on exit.
+
+        If a renewal fails (the lease expired and was taken over), `lost` is
+        set and a warning is logged; the work in progress is not interrupted.
+
+        Args:
+            interval: Seconds between renewals. If None, a third of the TTL
+            release: Release the lease on exit. False keeps holding it for
+                work that follows (it then expires unless renewed again)
+        """
+        interval = interval or self.ttl / 3
+        stop = threading.Event()
+
+        def heartbeat():
+            while not stop.wait(interval):
+                try:
+                    if not self.renew():
+                        self.lost = True
+                        logger.warning(f"Lost lease '{self.name}' held by {self.owner}")
+                        return
+                except Exception as e:
+                    logger.warning(f"Could not renew lease '{self.name}': {e}")
+
+        thread = threading.Thread(target=heartbeat, name=f"lease-{self.name}", daemon=True)
+        thread.start()
+        try:
+            yield self
+        finally:
+            stop.set()
+            thread.join()
+            if release:
+                self.release()
+
+
+class InProcessLeaseLock(LeaseLock):
+    """Lease held in a process-wide dictionary (tests and single-process runs)."""
+
+    _records: Dict[str, dict] = {}
+    _guard = threading.Lock()
+
+    def _update(self, change):
+        with self._guard:
+            current = self._records.get(self.name)
+            new = change(current)
+            if new is _UNCHANGED:
+                return current
+            if new is None:
+                self._records.pop(self.name, None)
+            else:
+                self._records[self.name] = new
+            return new
+
+
+class FileLeaseLock(LeaseLock):
+    """Lease stored in a local file; updates hold an exclusive `flock` on it."""
+
+    def __init__(self, path: Path, ttl: Optional[float] = None, owner: Optional[str] = None):
+        """
+        Args:
+            path: Lease file (created if missing; empty means free)
+            ttl: Lease duration in seconds. If None, uses KB_LOCK_TTL_SECONDS
+            owner: Holder id. If None, a unique id for this process is generated
+        """
+        self.path = Path(path)
+        super().__init__(self.path.name, ttl, owner)
+
+    def _update(self, change):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                content = f.read().strip()
+                try:
+                    current = json.loads(content) if content else None
+                except ValueError:
+                    logger.warning(f"Ignoring unreadable lease file {self.path}")
+                    current = None
+                new = change(current)
+                if new is _UNCHANGED:
+                    return current
+                f.seek(0)
+                f.truncate()
+                if new is not None:
+                    f.write(json.dumps(new))
+                f.flush()
+                os.fsync(f.fileno())
+                return new
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class ObjectStoreLeaseLock(LeaseLock):
+    """
+    Lease stored as a blob (`locks/<name>.json`).
+
+    Every update is a compare-and-set on the blob generation, so two instances
+    can never both see their write succeed.
+    """
+
+    def __init__(self, store: ObjectStore, name: str, ttl: Optional[float] = None, owner: Optional[str] = None):
+        """
+        Args:
+            store: Object store shared by all instances
+            name: Lock name
+            ttl: Lease duration in seconds. If None, uses KB_LOCK_TTL_SECONDS
+            owner: Holder id. If None, a unique id for this process is generated
+        """
+        self.store = store
+        self.blob_name = f"{LEASE_PREFIX}/{name}.json"
+        super().__init__(name, ttl, owner)
+
+    def _update(self, change):
+        for _ in range(_MAX_CAS_ATTEMPTS):
+            versioned = self.store.read_versioned(self.blob_name)
+            if versioned:
+                data, generation = versioned
+                try:
+                    current = json.loads(data) if data.strip() else None
+                except ValueError:
+                    logger.warning(f"Ignoring unreadable lease {self.store.describe(self.blob_name)}")
+                    current = None
+            else:
+                current, generation = None, 0
+
+            new = change(current)
+            if new is _UNCHANGED:
+                return current
+            if new is None:
+                if not generation or self.store.delete_if_generation(self.blob_name, generation):
+                    return None
+            elif self.store.write_if_generation(self.blob_name, json.dumps(new).encode("utf-8"), generation):
+                return new
+            # Another instance changed the lease in between; re-read and re-decide
+        raise RuntimeError(f"Lease {self.store.describe(self.blob_name)} is under contention; giving up")
@@ -0,0 +1,139 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Process-Wide Chroma Client and Collection Handles.
+
+Building a `chromadb.PersistentClient` validates its settings, tenant and
+database, and `get_collection` reads the collection from the system
+database. Doing both on every tool call adds overhead to each query. A
+`ChromaRegistry` creates one client per Chroma directory on first use and
+caches collection handles by physical name, so a query after the first only
+does a dictionary lookup.
+
+Handles stay valid while their collection exists. Rebuilds write new
+physical versions (see collection_aliases), so a cached handle is never
+reused for different data. `invalidate()` drops the client and every handle
+after the directory was replaced (snapshot install, hot reload).
+`discard(name)` drops one handle when its collection is deleted.
+"""
+
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+
+class ChromaRegistry:
+    """One lazily created Chroma client and its collection handles (thread-safe)."""
+
+    def __init__(self, persist_directory: Path, client_factory: Callable[[Path], Any]):
+        """
+        Args:
+            persist_directory: Chroma DB directory
+            client_factory: Creates a client for the directory
+        """
+        self.persist_directory = Path(persist_directory)
+        self._client_factory = client_factory
+        self._lock = threading.Lock()
+        self._client = None
+        self._collections: Dict[str, Any] = {}
+        self.generation = 0  # Incremented by every invalidate()
+        self.clients_created = 0
+        self.collection_hits = 0
+        self.collection_misses = 0
+
+    @property
+    def client(self):
+        """The shared client, created on first use."""
+        client = self._client
+        if client is not None:
+            return client
+        with self._lock:
+            if self._client is None:
+                self._client = self._client_factory(self.persist_directory)
+                self.clients_created += 1
+            return self._client
+
+    def collection(self, name: str):
+        """
+        Get a cached handle of a physical collection.
+
+        Raises:
+            Whatever `client.get_collection` raises if the collection does not exist
+            (missing collections are not cached)
+        """
+        handle = self._collections.get(name)
+        if handle is not None:
+            self.collection_hits += 1
+            return handle
+        generation = self.generation
+        handle = self.client.get_collection(name)
+        with self._lock:
+            self.collection_misses += 1
+            # A handle opened before an invalidate() belongs to the old client
+            if generation == self.generation:
+                handle = self._collections.setdefault(name, handle)
+        return handle
+
+    def discard(self, name: str) -> None:
+        """Forget the handle of a collection (after it was deleted)."""
+        with self._lock:
+            self._collections.pop(name, None)
+
+    def invalidate(self) -> None:
+        """Forget the client and all handles; the next use creates a new client."""
+        with self._lock:
+            self._client = None
+            self._collections.clear()
+            self.generation += 1
+
+    def stats(self) -> dict:
+        """Registry counters; never opens the DB."""
+        with self._lock:
+            return {
+                "client_open": self._client is not None,
+                "generation": self.generation,
+                "clients_created": self.clients_created,
+                "cached_collections": len(self._collections),
+                "collection_hits": self.collection_hits,
+                "collection_misses": self.collection_misses,
+            }
+
+
+_registries: Dict[Path, ChromaRegistry] = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry(persist_directory: Path, client_factory: Callable[[Path], Any]) -> ChromaRegistry:
+    """Get the process-wide registry of a Chroma directory, creating it on first use."""
+    key = Path(persist_directory).resolve()
+    with _registries_lock:
+        registry = _registries.get(key)
+        if registry is None:
+            registry = _registries[key] = ChromaRegistry(key, client_factory)
+        return registry
+
+
+def peek_registry(persist_directory: Path) -> Optional[ChromaRegistry]:
+    """The registry of a directory if one was created, without creating it."""
+    with _registries_lock:
+        return _registries.get(Path(persist_directory).resolve())
+
+
+def invalidate_registries() -> None:
+    """Invalidate every registry (after Chroma files were replaced)."""
+    with _registries_lock:
+        registries = list(_registries.values())
+    for registry in registries:
+        registry.invalidate()
@@ -19,53 +19,96 @@ This module handles:
 - Initializing Chroma client
 - Extracting text from PDFs
 - Chunking text for vectorization
-- Generating embeddings using Google's text-embedding-004
+- Generating embeddings through the configured embedding backend
 - Storing vectors in Chroma
 """
 
 import os
-import hashlib
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional
 import chromadb
+from chromadb.api.client import SharedSystemClient
 from chromadb.config import Settings
-from pypdf import PdfReader
-from google import genai
-from google.genai import types
-from google.cloud import logging as cloud_logging
-from google.cloud import storage
 
-logger = logging.getLogger(__name__)
+from ..genai_client import get_google_cloud_location, get_google_cloud_project
+from .embedding_cache import chunk_hash, get_embedding_cache
+from .pdf_pipeline import (
+    CHUNKERS,
+    DEFAULT_CHUNKER,
+    DEFAULT_CHUNK_OVERLAP,
+    DEFAULT_CHUNK_SIZE,
+    TextChunk,
+    batched,
+    iter_pdf_chunks,
+    iter_pdf_pages,
+)
+from .chroma_writer import ChromaBatchWriter
+from .chroma_registry import ChromaRegistry, get_registry, invalidate_registries, peek_registry
+from .directory_sync import download_directory, upload_directory
+from .object_store import GCSObjectStore, ObjectStore
+from .snapshot import (
+    discard_previous_snapshot,
+    fetch_snapshot,
+    get_snapshot_store,
+    publish_snapshot,
+    read_local_snapshot_manifest,
+)
+from .readiness import check_readiness, clear_readiness, write_readiness
+from .build_lock import (
+    FileLeaseLock,
+    InProcessLeaseLock,
+    LeaseLock,
+    ObjectStoreLeaseLock,
+    get_lease_poll_interval,
+)
+from .collection_aliases import (
+    clear_alias_cache,
+    collection_versions,
+    parse_version,
+    resolve_collection,
+    set_alias,
+    versioned_name,
+)
+from .compact_store import (
+    COMPACT_DTYPES,
+    CompactVectorStore,
+    clear_compact_stores,
+    compact_store_path,
+    export_compact_stores,
+)
+from .parent_store import (
+    DEFAULT_CHILD_CHUNK_SIZE,
+    DEFAULT_PARENT_CHUNK_SIZE,
+    DEFAULT_RETRIEVAL_MODE,
+    RETRIEVAL_MODES,
+    delete_parents,
+    parent_key,
+    save_parents,
+)
+from .ingest_manifest import (
+    STATUS_COMPLETE,
+    IngestManifest,
+    delete_manifest,
+    file_sha256,
+    is_collection_complete,
+    load_manifest,
+    save_manifest,
+)
+from .embedding_backends import (
+    EmbeddingBackend,
+    VertexEmbeddingBackend,
+    backend_mismatch,
+    get_embedding_backend,
+)
+from .embedding_engine import EmbeddingBudget, truncate_embedding
+from .chunk_cleaner import CLEANER_VERSION, CleaningStats, is_cleaning_enabled
+from .telemetry import get_telemetry_sink
 
+logger = logging.getLogger(__name__)
 
-# Environment variables will be read when needed (not at module import time)
-# This allows .env file to be loaded first
-def get_google_cloud_project():
-    """Get GOOGLE_CLOUD_PROJECT, loading .env if needed."""
-    project = os.getenv("GOOGLE_CLOUD_PROJECT")
-    if not project:
-        # Try loading .env file
-        from pathlib import Path
-        from dotenv import load_dotenv
-        env_path = Path(__file__).parent.parent.parent / ".env"
-        if env_path.exists():
-            load_dotenv(env_path)
-            project = os.getenv("GOOGLE_CLOUD_PROJECT")
-    return project
-
-def get_google_cloud_location():
-    """Get GOOGLE_CLOUD_LOCATION, loading .env if needed."""
-    location = os.getenv("GOOGLE_CLOUD_LOCATION", "us-central1")
-    if not os.getenv("GOOGLE_CLOUD_PROJECT"):
-        # Try loading .env file if project not set
-        from pathlib import Path
-        from dotenv import load_dotenv
-        env_path = Path(__file__).parent.parent.parent / ".env"
-        if env_path.exists():
-            load_dotenv(env_path)
-            location = os.getenv("GOOGLE_CLOUD_LOCATION", "us-central1")
-    return location
 
 # Chroma database path
 CHROMA_DB_PATH = Path(__file__).parent.parent.parent / "chroma_db"
@@ -75,6 +118,73 @@ COLLECTION_BPJS = "bpjs_criteria"
 COLLECTION_PPK = "ppk_kemenkes"
 COLLECTION_BATES = "bates_guide"
 
+# Paths to knowledge PDFs
+# Note: Folder name is "knowlegde" (typo in original, but keeping it as is)
+REASONING_KNOWLEDGE_DIR = Path(__file__).parent.parent / "sub_agents" / "reasoning_agent" / "knowlegde"
+INTERVIEW_KNOWLEDGE_DIR = Path(__file__).parent.parent / "sub_agents" / "interview_agent" / "knowledge"
+BPJS_PDF_PATH = REASONING_KNOWLEDGE_DIR / "Pedoman-BPJS-Kriteria-Gawat-Darurat.pdf"
+PPK_PDF_PATH = REASONING_KNOWLEDGE_DIR / "ppk-kemenkes.pdf"
+BATES_PDF_PATH = INTERVIEW_KNOWLEDGE_DIR / "Bates_Guide_to_Physical_Examination.pdf"
+
+# (collection name, PDF path, label) for every knowledge source
+KNOWLEDGE_SOURCES = [
+    (COLLECTION_BPJS, BPJS_PDF_PATH, "BPJS Criteria"),
+    (COLLECTION_PPK, PPK_PDF_PATH, "PPK Kemenkes"),
+    (COLLECTION_BATES, BATES_PDF_PATH, "Bates Guide"),
+]
+
+
+def _collection_setting(variable: str, collection_name: str, choices: tuple, default: str) -> str:
+    """Value for a collection from an environment variable of `collection=value` pairs."""
+    for entry in os.getenv(variable, "").split(","):
+        name, _, value = entry.partition("=")
+        if name.strip() == collection_name and value.strip():
+            value = value.strip().lower()
+            if value not in choices:
+                raise ValueError(f"Unknown value {value!r} for '{collection_name}' in {variable}; use one of {choices}")
+            return value
+    return default
+
+
+def get_collection_chunker(collection_name: str) -> str:
+    """
+    Get the chunker of a collection from KB_CHUNKERS.
+    
+    KB_CHUNKERS lists `collection=chunker` pairs, e.g.
+    "bpjs_criteria=structured,ppk_kemenkes=structured". Collections not
+    listed use the fixed-size chunker.
+    """
+    return _collection_setting("KB_CHUNKERS", collection_name, CHUNKERS, DEFAULT_CHUNKER)
+
+
+def get_collection_retrieval_mode(collection_name: str) -> str:
+    """
+    Get the retrieval mode of a collection from KB_RETRIEVAL_MODES.
+    
+    KB_RETRIEVAL_MODES lists `collection=mode` pairs, e.g.
+    "ppk_kemenkes=parent". In "parent" mode small child chunks are indexed
+    and queries return their parent sections (see parent_store). Collections
+    not listed use "chunk".
+    """
+    return _collection_setting("KB_RETRIEVAL_MODES", collection_name, RETRIEVAL_MODES, DEFAULT_RETRIEVAL_MODE)
+
+# Blob prefix of the Chroma DB directory in the bucket (directory persistence)
+CHROMA_DIRECTORY_PREFIX = "chroma_db/"
+
+# Chunks extracted, embedded and written per ingestion step
+INGEST_WINDOW_SIZE = 256
+
+
+def get_persistence_mode() -> str:
+    """
+    How the Chroma DB is persisted to Cloud Storage, from CHROMA_PERSISTENCE_MODE.
+
+    "snapshot" (default): one compressed tarball plus manifest (see snapshot.py).
+    "directory": the chroma_db/ directory file by file.
+    """
+    mode = os.getenv("CHROMA_PERSISTENCE_MODE", "snapshot").strip().lower()
+    return mode if mode in ("snapshot", "directory") else "snapshot"
+
 # Cloud Storage bucket name for Chroma persistence
 def get_chroma_bucket_name() -> Optional[str]:
     """Get Chroma Cloud Storage bucket name from environment or construct from project."""
@@ -92,17 +202,44 @@ def get_chroma_bucket_name() -> Optional[str]:
 
 def get_chroma_client(persist_directory: Optional[Path] = None) -> chromadb.Client:
     """
-    Initialize and return Chroma client.
+    Return the process-wide Chroma client (created on first use).
     
     Args:
         persist_directory: Directory to persist Chroma data. If None, uses default.
         
     Returns:
-        Chroma client instance
+        Chroma client instance, shared until reload_collections()
+    """
+    return get_chroma_registry(persist_directory).client
+
+
+def get_chroma_registry(persist_directory: Optional[Path] = None) -> ChromaRegistry:
+    """
+    Return the process-wide registry of a Chroma directory: its client and
+    cached collection handles (see chroma_registry).
+    
+    Args:
+        persist_directory: Directory to persist Chroma data. If None, uses default.
     """
-    if persist_directory is None:
-        persist_directory = CHROMA_DB_PATH
+    return get_registry(persist_directory or CHROMA_DB_PATH, new_chroma_client)
+
+
+def get_chroma_registry_stats() -> Optional[dict]:
+    """Counters of the default registry, or None if nothing opened the DB yet. Never opens it."""
+    registry = peek_registry(CHROMA_DB_PATH)
+    return registry.stats() if registry else None
+
+
+def new_chroma_client(persist_directory: Path) -> chromadb.Client:
+    """
+    Create a new Chroma client. Prefer get_chroma_client(), which shares one.
     
+    Args:
+        persist_directory: Directory to persist Chroma data
+        
+    Returns:
+        Chroma client instance
+    """
     # Create directory if it doesn't exist
     persist_directory.mkdir(parents=True, exist_ok=True)
     
@@ -117,21 +254,30 @@ def get_chroma_client(persist_directory: Optional[Path] = None) -> chromadb.Clie
     return client
 
 
-def download_chroma_from_gcs(bucket_name: Optional[str] = None, local_path: Optional[Path] = None) -> bool:
+def download_chroma_from_gcs(
+    bucket_name: Optional[str] = None,
+    local_path: Optional[Path] = None,
+    workers: Optional[int] = None,
+    store: Optional[ObjectStore] = None,
+) -> bool:
     """
     Download Chroma database from Cloud Storage.
+    Only files whose checksum differs from the local copy are downloaded,
+    in parallel (see directory_sync.py).
     
     Args:
         bucket_name: GCS bucket name. If None, uses get_chroma_bucket_name()
         local_path: Local directory to download to. If None, uses CHROMA_DB_PATH
+        workers: Concurrent downloads. If None, uses CHROMA_SYNC_WORKERS
+        store: Object store to download from instead of the bucket
         
     Returns:
         True if download was successful, False otherwise
     """
-    if bucket_name is None:
+    if bucket_name is None and store is None:
         bucket_name = get_chroma_bucket_name()
     
-    if not bucket_name:
+    if not bucket_name and store is None:
         logger.warning("No Chroma bucket name configured. Skipping download from GCS.")
         return False
     
@@ -139,41 +285,26 @@ def download_chroma_from_gcs(bucket_name: Optional[str] = None, local_path: Opti
         local_path = CHROMA_DB_PATH
     
     try:
-        storage_client = storage.Client()
-        bucket = storage_client.bucket(bucket_name)
-        
-        # Check if bucket exists
-        if not bucket.exists():
-            logger.info(f"Chroma bucket {bucket_name} does not exist. Will initialize locally.")
-            return False
+        if store is None:
+            store = GCSObjectStore(bucket_name)
+            # Check if bucket exists
+            if not store.bucket.exists():
+                logger.info(f"Chroma bucket {bucket_name} does not exist. Will initialize locally.")
+                return False
         
-        # List all blobs in the bucket
-        blobs = list(bucket.list_blobs(prefix="chroma_db/"))
-        
-        if not blobs:
-            logger.info(f"No Chroma DB found in bucket {bucket_name}. Will initialize locally.")
+        if not store.list_blobs(CHROMA_DIRECTORY_PREFIX):
+            logger.info(f"No Chroma DB found in {store.describe()}. Will initialize locally.")
             return False
         
-        logger.info(f"Downloading Chroma DB from gs://{bucket_name}/chroma_db/...")
-        
-        # Create local directory
-        local_path.mkdir(parents=True, exist_ok=True)
+        logger.info(f"Syncing Chroma DB from {store.describe(CHROMA_DIRECTORY_PREFIX)}...")
+        stats = download_directory(store, CHROMA_DIRECTORY_PREFIX, local_path, workers)
         
-        # Download all files
-        downloaded_count = 0
-        for blob in blobs:
-            # Get relative path from chroma_db/ prefix
-            relative_path = blob.name.replace("chroma_db/", "")
-            if not relative_path:
-                continue
-            
-            local_file = local_path / relative_path
-            local_file.parent.mkdir(parents=True, exist_ok=True)
-            
-            blob.download_to_filename(str(local_file))
-            downloaded_count += 1
-        
-        logger.info(f"Successfully downloaded {downloaded_count} files from Cloud Storage.")
+        # Clients cached by chromadb may hold the replaced files open
+        reload_collections()
+        logger.info(
+            f"Successfully downloaded {stats.transferred} files ({stats.bytes_transferred / 1024 / 1024:.1f} MB) "
+            f"from Cloud Storage; {stats.unchanged} unchanged, {stats.deleted} removed."
+        )
         return True
         
     except Exception as e:
@@ -181,21 +312,30 @@ def download_chroma_from_gcs(bucket_name: Optional[str] = None, local_path: Opti
         return False
 
 
-def upload_chroma_to_gcs(bucket_name: Optional[str] = None, local_path: Optional[Path] = None) -> bool:
+def upload_chroma_to_gcs(
+    bucket_name: Optional[str] = None,
+    local_path: Optional[Path] = None,
+    workers: Optional[int] = None,
+    store: Optional[ObjectStore] = None,
+) -> bool:
     """
     Upload Chroma database to Cloud Storage.
+    Only files whose checksum differs from the blob are uploaded, in
+    parallel; blobs of files that no longer exist locally are deleted.
     
     Args:
         bucket_name: GCS bucket name. If None, uses get_chroma_bucket_name()
         local_path: Local directory to upload from. If None, uses CHROMA_DB_PATH
+        workers: Concurrent uploads. If None, uses CHROMA_SYNC_WORKERS
+        store: Object store to upload to instead of the bucket
         
     Returns:
         True if upload was successful, False otherwise
     """
-    if bucket_name is None:
+    if bucket_name is None and store is None:
         bucket_name = get_chroma_bucket_name()
     
-    if not bucket_name:
+    if not bucket_name and store is None:
         logger.warning("No Chroma bucket name configured. Skipping upload to GCS.")
         return False
     
@@ -207,33 +347,17 @@ def upload_chroma_to_gcs(bucket_name: Optional[str] = None, local_path: Optional
         return False
     
     try:
-        storage_client = storage.Client()
-        bucket = storage_client.bucket(bucket_name)
-        
-        # Create bucket if it doesn't exist
-        if not bucket.exists():
-            logger.info(f"Creating Chroma bucket: {bucket_name}")
-            bucket.create(location=get_google_cloud_location())
-        
-        logger.info(f"Uploading Chroma DB to gs://{bucket_name}/chroma_db/...")
+        if store is None:
+            # Create bucket if it doesn't exist
+            store = GCSObjectStore(bucket_name, location=get_google_cloud_location(), create=True)
         
-        # Upload all files in chroma_db directory
-        uploaded_count = 0
-        for root, dirs, files in os.walk(local_path):
-            for file in files:
-                local_file = Path(root) / file
-                relative_path = local_file.relative_to(local_path)
-                
-                # Skip SQLite journal files
-                if relative_path.name.endswith("-journal"):
-                    continue
-                
-                blob_path = f"chroma_db/{relative_path.as_posix()}"
-                blob = bucket.blob(blob_path)
-                blob.upload_from_filename(str(local_file))
-                uploaded_count += 1
+        logger.info(f"Syncing Chroma DB to {store.describe(CHROMA_DIRECTORY_PREFIX)}...")
+        stats = upload_directory(store, local_path, CHROMA_DIRECTORY_PREFIX, workers)
         
-        logger.info(f"Successfully uploaded {uploaded_count} files to Cloud Storage.")
+        logger.info(
+            f"Successfully uploaded {stats.transferred} files ({stats.bytes_transferred / 1024 / 1024:.1f} MB) "
+            f"to Cloud Storage; {stats.unchanged} unchanged, {stats.deleted} stale removed."
+        )
         return True
         
     except Exception as e:
@@ -241,45 +365,68 @@ def upload_chroma_to_gcs(bucket_name: Optional[str] = None, local_path: Optional
         return False
 
 
+def is_knowledge_base_ready() -> Optional[dict]:
+    """
+    Cheap readiness check: reads only the readiness manifest (`ready.json`).
+    
+    Returns:
+        The readiness manifest (collections, counts, build id) if every
+        knowledge source collection is built and non-empty, else None
+    """
+    return check_readiness(CHROMA_DB_PATH, [name for name, _, _ in KNOWLEDGE_SOURCES])
+
+
 def ensure_chroma_from_gcs() -> bool:
     """
     Ensure Chroma DB exists locally, downloading from GCS if needed.
     This is called at startup to get the DB from Cloud Storage.
     
     Returns:
-        True if Chroma DB is available (either downloaded or already exists), False otherwise
+        True if Chroma DB is available (either downloaded or already exists) and every
+        collection finished building, False otherwise
     """
-    # Check if Chroma DB already exists locally
+    readiness = is_knowledge_base_ready()
+    if readiness:
+        logger.info(f"Chroma DB already exists locally and is ready (build {readiness['build_id']}).")
+        return True
+    
+    # Check if Chroma DB already exists locally (built before readiness manifests existed)
     if CHROMA_DB_PATH.exists():
-        # Check if it has collections
         try:
             client = get_chroma_client()
-            collections = client.list_collections()
-            expected = ["bpjs_criteria", "ppk_kemenkes", "bates_guide"]
+            counts = get_collection_counts(client)
+            expected = [name for name, _, _ in KNOWLEDGE_SOURCES]
+            
+            # Check if all expected collections exist, have data and finished building
+            all_exist = True
+            for coll_name in expected:
+                if not counts.get(coll_name):
+                    all_exist = False
+                    break
+                # A run that died part-way leaves data but no complete manifest
+                if not is_collection_built(coll_name):
+                    logger.warning(f"Collection '{coll_name}' is only partially built.")
+                    all_exist = False
+                    break
             
-            # Check if all expected collections exist and have data
-            all_exist = all(c in collections for c in expected)
             if all_exist:
-                # Verify they have data
-                for coll_name in expected:
-                    try:
-                        collection = client.get_collection(coll_name)
-                        if collection.count() == 0:
-                            all_exist = False
-                            break
-                    except Exception:
-                        all_exist = False
-                        break
-                
-                if all_exist:
-                    logger.info("Chroma DB already exists locally and is ready.")
-                    return True
+                # Record readiness so later checks skip opening the DB
+                write_readiness(CHROMA_DB_PATH, counts)
+                logger.info("Chroma DB already exists locally and is ready.")
+                return True
         except Exception as e:
             logger.warning(f"Error checking local Chroma DB: {e}")
     
-    # Try to download from GCS
+    # Try to download from GCS: the snapshot first, then the legacy directory layout
     logger.info("Chroma DB not found locally. Attempting to download from Cloud Storage...")
-    if download_chroma_from_gcs():
+    if (get_persistence_mode() == "snapshot" and _fetch_latest_snapshot()) or download_chroma_from_gcs():
+        incomplete = [name for name, _, _ in KNOWLEDGE_SOURCES if not is_collection_built(name)]
+        if incomplete:
+            # Ingestion will resume these from their manifests
+            logger.warning(f"Downloaded Chroma DB has partially built collections: {incomplete}")
+            return False
+        if not is_knowledge_base_ready():
+            write_readiness(CHROMA_DB_PATH, get_collection_counts(get_chroma_client()))
         logger.info("Successfully downloaded Chroma DB from Cloud Storage.")
         return True
     else:
@@ -287,9 +434,144 @@ def ensure_chroma_from_gcs() -> bool:
         return False
 
 
+BUILD_LEASE_NAME = "knowledge_base_build"
+
+
+def get_build_lease() -> LeaseLock:
+    """
+    Get the lease an instance must hold to build the knowledge base.
+    
+    KB_LOCK_BACKEND selects the backend: "storage" (a blob in the snapshot
+    store, shared by every instance), "file" (a lock file next to the Chroma
+    DB) or "memory" (this process only). By default "storage" is used when a
+    bucket or CHROMA_SNAPSHOT_DIR is configured, else "file".
+    """
+    backend = os.getenv("KB_LOCK_BACKEND", "").strip().lower()
+    store = None
+    if backend in ("", "storage"):
+        store = get_snapshot_store(create=True)
+        if store is None and backend == "storage":
+            logger.warning("KB_LOCK_BACKEND=storage but no bucket is configured; using a lock file.")
+    if store is not None:
+        return ObjectStoreLeaseLock(store, BUILD_LEASE_NAME)
+    if backend == "memory":
+        return InProcessLeaseLock(BUILD_LEASE_NAME)
+    return FileLeaseLock(CHROMA_DB_PATH.parent / f".chroma_db.{BUILD_LEASE_NAME}.lock")
+
+
+def elect_knowledge_base_builder(lease: LeaseLock, poll_interval: Optional[float] = None) -> bool:
+    """
+    Decide whether this instance builds the knowledge base.
+    
+    Blocks while another instance holds the build lease. Once the lease is
+    released (the snapshot is published) or has expired (its holder died),
+    the published knowledge base is fetched; if there is none, this instance
+    takes the lease and builds.
+    
+    Args:
+        lease: Build lease (see `get_build_lease`)
+        poll_interval: Seconds between lease checks. If None, uses KB_LOCK_POLL_SECONDS
+        
+    Returns:
+        True if this instance now holds the lease and must build (and release it),
+        False if the knowledge base was built by another instance
+    """
+    poll_interval = poll_interval or get_lease_poll_interval()
+    waited = False
+    while not lease.try_acquire():
+        holder = lease.holder()
+        if holder and not waited:
+            logger.info(f"Knowledge base is being built by {holder['owner']}; waiting for its snapshot...")
+            waited = True
+        time.sleep(poll_interval)
+    
+    # Whoever held the lease before may have finished (before or while we waited).
+    # A large snapshot download can outlast the TTL, so the lease is renewed meanwhile.
+    with lease.keep_alive(release=False):
+        fetched = ensure_chroma_from_gcs()
+    if fetched:
+        lease.release()
+        return False
+    if lease.lost:
+        # Another instance took over while we were fetching; wait for it instead
+        return elect_knowledge_base_builder(lease, poll_interval)
+    return True
+
+
+def _fetch_latest_snapshot() -> bool:
+    """Install the latest published snapshot, if any. Returns True on success."""
+    # Queries may be running on handles of the current files; they are kept until drained
+    registry = peek_registry(CHROMA_DB_PATH)
+    in_use = registry is not None and registry.stats()["client_open"]
+    try:
+        store = get_snapshot_store()
+        if store is None or fetch_snapshot(store, CHROMA_DB_PATH, keep_previous=True) is None:
+            return False
+    except Exception as e:
+        logger.warning(f"Failed to fetch knowledge base snapshot: {e}")
+        return False
+    # Clients cached by chromadb still point at the replaced files
+    reload_collections()
+    if not in_use:
+        discard_previous_snapshot(CHROMA_DB_PATH)
+    return True
+
+
+def reload_collections() -> None:
+    """
+    Drop every cached view of the Chroma DB directory: the shared client and
+    collection handles, chromadb's systems, collection aliases and compact
+    stores. Call after its files were replaced.
+    """
+    invalidate_registries()
+    SharedSystemClient.clear_system_cache()
+    clear_alias_cache()
+    clear_compact_stores()
+
+
+def refresh_knowledge_base() -> Optional[str]:
+    """
+    Hot reload: install a newer published snapshot into a running process.
+    
+    Later queries resolve aliases and open collections from the new files; no
+    restart is needed. The registry is reset before anything is deleted, and
+    the replaced directory is kept until the next refresh, so queries still
+    running on old handles finish against intact files. A no-op when the
+    local DB is already the latest build or snapshots are not in use.
+    
+    Returns:
+        The build id now installed, or None if nothing changed
+    """
+    if get_persistence_mode() != "snapshot":
+        return None
+    store = get_snapshot_store()
+    if store is None:
+        return None
+    before = (read_local_snapshot_manifest(CHROMA_DB_PATH) or {}).get("build_id")
+    manifest = fetch_snapshot(store, CHROMA_DB_PATH, keep_previous=True)
+    if manifest is None or manifest["build_id"] == before:
+        return None
+    reload_collections()
+    logger.info(f"Hot-reloaded knowledge base snapshot {manifest['build_id']}")
+    return manifest["build_id"]
+
+
+def get_collection_counts(client: chromadb.Client) -> dict:
+    """Chunks per knowledge collection present in the DB (counted in the live version)."""
+    existing = client.list_collections()
+    counts = {}
+    for collection_name, _, _ in KNOWLEDGE_SOURCES:
+        live_name = resolve_collection(CHROMA_DB_PATH, collection_name)
+        if live_name in existing:
+            counts[collection_name] = client.get_collection(live_name).count()
+    return counts
+
+
 def extract_text_from_pdf(pdf_path: Path) -> str:
     """
     Extract text from PDF file.
+    Ingestion streams pages with `iter_pdf_chunks` instead; this returns the
+    whole document for callers that need it as one string.
     
     Args:
         pdf_path: Path to PDF file
@@ -297,15 +579,8 @@ def extract_text_from_pdf(pdf_path: Path) -> str:
     Returns:
         Extracted text as string
     """
-    try:
-        reader = PdfReader(pdf_path)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() + "\n"
-        return text
-    except Exception as e:
-        print(f"Error extracting text from {pdf_path}: {e}")
-        return ""
+    # Join once instead of repeated `text +=` (quadratic on large PDFs)
+    return "".join(page_text + "\n" for _, page_text in iter_pdf_pages(pdf_path))
 
 
 def chunk_text(text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> List[str]:
@@ -347,191 +622,122 @@ def chunk_text(text: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> L
     return chunks
 
 
-def get_logger():
-    """Get Google Cloud Logger instance."""
-    try:
-        google_project = get_google_cloud_project()
-        if not google_project:
-            return None
-        
-        logging_client = cloud_logging.Client(project=google_project)
-        logger = logging_client.logger("chroma-embeddings")
-        return logger
-    except Exception as e:
-        print(f"Warning: Could not initialize Cloud Logging: {e}")
-        return None
-
-
-def generate_embeddings(texts: List[str]) -> List[List[float]]:
+def generate_embeddings(
+    texts: List[str],
+    max_in_flight: Optional[int] = None,
+    use_cache: bool = True,
+    budget: Optional[EmbeddingBudget] = None,
+    dimensionality: Optional[int] = None,
+    backend: Optional[EmbeddingBackend] = None,
+) -> List[List[float]]:
     """
-    Generate embeddings using Google's gemini-embedding-001 model.
-    Logs each batch to Google Cloud Logging.
+    Generate embeddings with the configured embedding backend
+    (gemini-embedding-001 on Vertex AI by default, see EMBEDDING_BACKEND).
+    Chunks already in the on-disk embedding cache are not embedded again;
+    for Vertex AI the rest are sent concurrently through `EmbeddingEngine`,
+    which backs off on 429/5xx responses and re-queues failed batches.
+    Each batch is reported to the buffered telemetry sink (see telemetry.py).
     
     Args:
         texts: List of texts to embed
+        max_in_flight: Maximum concurrent embedding requests. If None, uses EMBEDDING_MAX_IN_FLIGHT
+        use_cache: If True, read and write the content-addressed embedding cache
+        budget: Embedding budget shared with concurrent callers
+        dimensionality: Reduced output size (Vertex AI). If None, uses EMBEDDING_DIMENSIONALITY
+        backend: Embedding backend. If None, uses get_embedding_backend()
         
     Returns:
-        List of embedding vectors
+        List of embedding vectors (empty vector for chunks that could not be embedded)
     """
     if not texts:
         return []
     
-    # Get environment variables (will load .env if needed)
-    google_project = get_google_cloud_project()
-    google_location = get_google_cloud_location()
+    total = len(texts)
+    if backend is None:
+        backend = get_embedding_backend()
+    if dimensionality and backend.supports_truncation and dimensionality != backend.output_dimensionality:
+        backend = VertexEmbeddingBackend(backend.model, backend.task_type, dimensionality)
+    dimensionality = backend.output_dimensionality
     
-    # Validate environment variables
-    if not google_project:
-        raise ValueError(
-            "GOOGLE_CLOUD_PROJECT environment variable is not set. "
-            "Please set it or ensure it's in your .env file."
-        )
+    # Look up cached vectors by content hash; identical chunks are embedded once
+    cache = get_embedding_cache() if use_cache and backend.cacheable else None
+    hashes = [chunk_hash(text) for text in texts]
+    cached = cache.get_many(hashes, backend.model, backend.task_type, dimensionality) if cache else {}
+    if cache and dimensionality and backend.supports_truncation and len(cached) < len(set(hashes)):
+        # A cached full-size vector truncates locally to any smaller size
+        missing = [content_hash for content_hash in hashes if content_hash not in cached]
+        full = cache.get_many(missing, backend.model, backend.task_type)
+        cached.update({
+            content_hash: truncate_embedding(vector, dimensionality) for content_hash, vector in full.items()
+        })
     
-    client = genai.Client(
-        vertexai=True,
-        project=google_project,
-        location=google_location,
-    )
+    to_embed = {}
+    for content_hash, text in zip(hashes, texts):
+        if content_hash not in cached and content_hash not in to_embed:
+            to_embed[content_hash] = text
     
-    # Initialize Cloud Logging
-    logger = get_logger()
+    if cache:
+        print(f"Embedding cache: {total - len(to_embed)}/{total} chunks cached, {len(to_embed)} to embed")
     
-    embeddings = []
-    total = len(texts)
+    # Events are queued and written in the background; embedding never waits on them
+    telemetry = get_telemetry_sink()
     
-    # Process in batches to stay under 2,048 token limit per request
-    # According to docs: https://ai.google.dev/gemini-api/docs/embeddings
-    # - Model: gemini-embedding-001
-    # - Input token limit: 2,048 tokens
-    # - Can pass multiple texts at once
-    import time
+    if not to_embed:
+        telemetry.emit({"event": "embedding_generation_complete", "embedding_backend": backend.name, "cached_chunks": total})
+        return [cached[content_hash] for content_hash in hashes]
     
-    # Batch size: ~8 chunks per batch (each chunk ~1000 chars = ~250 tokens)
-    # 8 chunks * 250 tokens = ~2000 tokens (safe under 2,048 limit)
-    batch_size = 8
-    config = types.EmbedContentConfig(task_type="SEMANTIC_SIMILARITY")
+    def log_batch_event(event: dict) -> None:
+        severity = "ERROR" if event.get("event") == "embedding_batch_error" else "INFO"
+        telemetry.emit({**event, "total_chunks": len(to_embed)}, severity=severity)
     
-    print(f"Processing {total} chunks in batches of {batch_size}...")
+    telemetry.emit({
+        "event": "embedding_generation_start",
+        "embedding_backend": backend.describe(),
+        "chunks": len(to_embed),
+    })
     
-    # Log start (non-blocking)
-    if logger:
-        try:
-            logger.log_text(f"Starting embedding generation: {total} chunks, batch_size={batch_size}")
-        except Exception:
-            pass  # Ignore logging errors
-    
-    for i in range(0, total, batch_size):
-        batch = texts[i:i + batch_size]
-        batch_start_idx = i
-        batch_end_idx = min(i + batch_size, total)
-        
+    vectors, stats = backend.embed_documents(
+        list(to_embed.values()),
+        max_in_flight=max_in_flight,
+        budget=budget,
+        on_event=log_batch_event,
+    )
+    new_embeddings = dict(zip(to_embed.keys(), vectors))
+    
+    print(
+        f"Embedded {stats.embedded_chunks}/{len(to_embed)} chunks in {stats.elapsed:.1f}s "
+        f"({stats.chunks_per_sec:.1f} chunks/sec, {stats.requests} requests, "
+        f"{stats.retries} retries, {stats.failed_chunks} failed)"
+    )
+    
+    if cache:
         try:
-            # Log batch start (non-blocking)
-            if logger:
-                try:
-                    logger.log_struct({
-                        "event": "embedding_batch_start",
-                        "batch_index": i // batch_size,
-                        "chunk_start": batch_start_idx,
-                        "chunk_end": batch_end_idx,
-                        "batch_size": len(batch),
-                        "total_chunks": total
-                    })
-                except Exception:
-                    pass  # Ignore logging errors
-            
-            # Generate embeddings for batch (can pass list of strings directly)
-            response = client.models.embed_content(
-                model="gemini-embedding-001",
-                contents=batch,  # Can pass list of strings directly
-                config=config
-            )
-            
-            # Extract embeddings from response
-            # Response.embeddings is a list matching the input order
-            successful_embeddings = 0
-            if hasattr(response, 'embeddings') and response.embeddings:
-                for idx, content_embedding in enumerate(response.embeddings):
-                    if hasattr(content_embedding, 'values'):
-                        embedding = list(content_embedding.values)
-                        embeddings.append(embedding)
-                        successful_embeddings += 1
-                    else:
-                        embeddings.append([])
-            else:
-                # If no embeddings, add empty ones for this batch
-                embeddings.extend([[]] * len(batch))
-            
-            # Log batch completion (non-blocking, batched to avoid timeouts)
-            if logger:
-                try:
-                    # Only log batch summary, not individual chunks (too many API calls)
-                    logger.log_struct({
-                        "event": "embedding_batch_complete",
-                        "batch_index": i // batch_size,
-                        "chunk_start": batch_start_idx,
-                        "chunk_end": batch_end_idx,
-                        "successful_embeddings": successful_embeddings,
-                        "total_in_batch": len(batch)
-                    })
-                except Exception as log_error:
-                    # Don't let logging errors crash the process
-                    if i < 10:  # Only print first few logging errors
-                        print(f"Warning: Could not log to Cloud Logging: {log_error}")
-            
-            # Progress reporting - show every batch for better feedback
-            processed = min(i + batch_size, total)
-            if processed % 20 == 0 or processed == total:
-                progress_pct = 100 * processed // total
-                print(f"  Progress: {processed}/{total} chunks ({progress_pct}%)")
-                # Log progress (non-blocking, only every 100 chunks to reduce API calls)
-                if logger and processed % 100 == 0:
-                    try:
-                        logger.log_text(f"Embedding progress: {processed}/{total} chunks ({progress_pct}%)")
-                    except Exception:
-                        pass  # Ignore logging errors
-        
+            cache.put_many(new_embeddings.items(), backend.model, backend.task_type, dimensionality)
         except Exception as e:
-            error_msg = str(e)
-            print(f"Error generating embeddings for batch {i}: {error_msg}")
-            
-            # Log error to Google Cloud Logging (non-blocking)
-            if logger:
-                try:
-                    logger.log_struct({
-                        "event": "embedding_batch_error",
-                        "batch_index": i // batch_size,
-                        "chunk_start": batch_start_idx,
-                        "chunk_end": batch_end_idx,
-                        "error": error_msg
-                    }, severity="ERROR")
-                except Exception:
-                    pass  # Don't let logging errors crash the process
-            
-            # Add empty embeddings for failed batch
-            embeddings.extend([[]] * len(batch))
+            print(f"Warning: Could not write embedding cache: {e}")
     
-    # Log completion (non-blocking)
-    if logger:
-        try:
-            successful_count = sum(1 for e in embeddings if e)
-            logger.log_struct({
-                "event": "embedding_generation_complete",
-                "total_chunks": total,
-                "successful_embeddings": successful_count,
-                "failed_embeddings": total - successful_count
-            })
-        except Exception:
-            pass  # Ignore logging errors
+    telemetry.emit({
+        "event": "embedding_generation_complete",
+        "embedding_backend": backend.name,
+        "cached_chunks": total - len(to_embed),
+        **stats.as_dict(),
+        **({"cache": cache.stats()} if cache else {}),
+    })
     
-    return embeddings
+    return [cached.get(content_hash) or new_embeddings.get(content_hash, []) for content_hash in hashes]
 
 
 def ingest_pdf_to_chroma(
     pdf_path: Path,
     collection_name: str,
     client: Optional[chromadb.Client] = None,
-    force_reload: bool = False
+    force_reload: bool = False,
+    max_in_flight: Optional[int] = None,
+    sync: bool = False,
+    extraction_workers: Optional[int] = None,
+    budget: Optional[EmbeddingBudget] = None,
+    chunker: Optional[str] = None,
+    retrieval: Optional[str] = None,
 ) -> int:
     """
     Ingest PDF into Chroma vector database.
@@ -540,144 +746,582 @@ def ingest_pdf_to_chroma(
         pdf_path: Path to PDF file
         collection_name: Name of Chroma collection
         client: Chroma client (if None, creates new one)
-        force_reload: If True, delete existing collection and reload
+        force_reload: If True, rebuild into a new collection version; the current
+            one keeps serving until the alias is swapped, then is retired
+        max_in_flight: Maximum concurrent embedding requests. If None, uses EMBEDDING_MAX_IN_FLIGHT
+        sync: If True, diff against the existing collection instead (see sync_pdf_to_chroma).
+            Takes precedence over force_reload.
+        extraction_workers: PDF extraction processes. If None, uses PDF_EXTRACTION_WORKERS
+        budget: Embedding budget shared with concurrent ingestions
+        chunker: "fixed" or "structured". If None, uses get_collection_chunker()
+        retrieval: "chunk" or "parent". If None, uses get_collection_retrieval_mode()
         
     Returns:
         Number of chunks ingested
     """
     if client is None:
         client = get_chroma_client()
+    chunker = chunker or get_collection_chunker(collection_name)
+    retrieval = retrieval or get_collection_retrieval_mode(collection_name)
     
-    # Check if collection exists
-    try:
-        collection = client.get_collection(collection_name)
-        if force_reload:
-            client.delete_collection(collection_name)
-            collection = client.create_collection(name=collection_name)
-        else:
-            print(f"Collection '{collection_name}' already exists. Use force_reload=True to reload.")
-            return collection.count()
-    except Exception:
-        # Collection doesn't exist, create it
-        collection = client.create_collection(name=collection_name)
+    if sync:
+        return sync_pdf_to_chroma(
+            pdf_path, collection_name, client, max_in_flight, extraction_workers, budget, chunker, retrieval
+        )
     
     if not pdf_path.exists():
         print(f"PDF not found: {pdf_path}")
         return 0
     
-    print(f"Extracting text from {pdf_path.name}...")
-    text = extract_text_from_pdf(pdf_path)
+    # Queries are served from the live version (the alias target) while a
+    # rebuild writes the next version, which is swapped in once verified
+    collection_names = client.list_collections()
+    live_name = resolve_collection(CHROMA_DB_PATH, collection_name)
+    live_exists = live_name in collection_names
+    versions = collection_versions(collection_names, collection_name)
+    pending_name = versioned_name(collection_name, versions[-1]) if versions else None
+    if pending_name == live_name:
+        pending_name = None
+    previous = load_manifest(CHROMA_DB_PATH, pending_name) if pending_name else None
     
-    if not text:
+    if (
+        not force_reload
+        and previous
+        and not previous.complete
+        and previous.same_build(_new_manifest(pdf_path, pending_name, chunker, retrieval))
+        and previous.committed_chunks
+    ):
+        # Interrupted build over the same PDF, chunking and model: resume it
+        manifest = previous
+        collection = client.get_collection(pending_name)
+        print(
+            f"Resuming '{pending_name}' after batch {manifest.last_committed_batch} "
+            f"({manifest.committed_chunks} chunks committed)"
+        )
+    elif not force_reload and live_exists and is_collection_complete(CHROMA_DB_PATH, live_name):
+        live = load_manifest(CHROMA_DB_PATH, live_name)
+        if live and live.source_hash != file_sha256(pdf_path):
+            print(f"Note: {pdf_path.name} changed since '{collection_name}' was built. Use sync=True to update it.")
+        if live and live.chunker != chunker:
+            print(f"Note: '{collection_name}' was chunked with '{live.chunker}'. Use force_reload=True to rechunk it with '{chunker}'.")
+        if live and live.retrieval != retrieval:
+            print(f"Note: '{collection_name}' was built for '{live.retrieval}' retrieval. Use force_reload=True to rebuild it for '{retrieval}'.")
+        live_collection = client.get_collection(live_name)
+        mismatch = backend_mismatch(live_collection.metadata, get_embedding_backend())
+        if mismatch:
+            print(f"Warning: '{collection_name}' was {mismatch}. Use force_reload=True to rebuild it.")
+        print(f"Collection '{collection_name}' already exists. Use force_reload=True to reload.")
+        return live_collection.count()
+    else:
+        # New version; a half-built one from another PDF or configuration is left for cleanup
+        if pending_name and previous:
+            print(f"Collection '{pending_name}' was left partially built. Building a new version.")
+        build_name = versioned_name(collection_name, (versions[-1] if versions else 0) + 1)
+        collection = client.create_collection(name=build_name, metadata=_collection_metadata(retrieval))
+        manifest = _new_manifest(pdf_path, build_name, chunker, retrieval)
+        print(f"Building '{collection_name}' into '{build_name}' ({chunker} chunking, {retrieval} retrieval)...")
+    
+    # Durable before the first write, so a crash at any point is detectable
+    save_manifest(CHROMA_DB_PATH, manifest)
+    
+    def commit_window(checkpoint) -> None:
+        batch_number, next_chunk_index, written, failed = checkpoint
+        manifest.last_committed_batch = batch_number
+        manifest.next_chunk_index = next_chunk_index
+        manifest.committed_chunks += written
+        manifest.failed_chunks += failed
+        save_manifest(CHROMA_DB_PATH, manifest)
+    
+    resume_from = manifest.next_chunk_index
+    batch_number = manifest.last_committed_batch
+    print(f"Streaming chunks from {pdf_path.name}...")
+    chunk_count = resume_from
+    
+    # Extract, chunk and embed one window at a time while the previous window
+    # is written in the background; the bounded writer queue keeps memory flat
+    # and the manifest records every window once it is committed
+    # Cleaning runs over the whole PDF (also when resuming) so its decisions,
+    # and therefore the chunk indices, are the same as in the interrupted run
+    cleaning = _new_cleaning_stats()
+    chunks = (
+        chunk
+        for chunk in _iter_collection_chunks(pdf_path, extraction_workers, cleaning, chunker, retrieval)
+        if chunk.index >= resume_from
+    )
+    with ChromaBatchWriter(collection, client.get_max_batch_size(), on_commit=commit_window) as writer:
+        for window in batched(chunks, INGEST_WINDOW_SIZE):
+            chunk_count += len(window)
+            batch_number += 1
+            print(f"Generating embeddings for chunks {window[0].index}-{window[-1].index} "
+                  f"(pages {window[0].page_start}-{window[-1].page_end})...")
+            embeddings = generate_embeddings([chunk.text for chunk in window], max_in_flight=max_in_flight, budget=budget)
+            
+            # Filter out empty embeddings
+            valid = [(chunk, embedding) for chunk, embedding in zip(window, embeddings) if embedding]
+            # Parents are stored before their children can be found
+            _save_chunk_parents(collection.name, [chunk for chunk, _ in valid])
+            # Upsert: chunks written after the last checkpoint of a crashed run are rewritten
+            writer.put(
+                "upsert",
+                checkpoint=(batch_number, window[-1].index + 1, len(valid), len(window) - len(valid)),
+                ids=[_chunk_id(collection_name, chunk) for chunk, _ in valid],
+                documents=[chunk.text for chunk, _ in valid],
+                embeddings=[embedding for _, embedding in valid],
+                metadatas=[_chunk_metadata(pdf_path, chunk) for chunk, _ in valid],
+            )
+    ingested = manifest.committed_chunks
+    if cleaning is not None:
+        print(cleaning.summary())
+    
+    if not chunk_count:
         print(f"No text extracted from {pdf_path}")
         return 0
     
-    print(f"Chunking text...")
-    chunks = chunk_text(text)
-    print(f"Created {len(chunks)} chunks")
+    if not ingested:
+        print("No valid embeddings generated")
+        return 0
     
-    if not chunks:
+    manifest.status = STATUS_COMPLETE
+    save_manifest(CHROMA_DB_PATH, manifest)
+    if manifest.failed_chunks:
+        print(f"Warning: {manifest.failed_chunks} chunks could not be embedded. Run with sync=True to fill them in.")
+    
+    # Swap the alias only to a version that holds everything the manifest recorded
+    stored = collection.count()
+    if stored != ingested:
+        print(
+            f"Not serving '{collection.name}': it holds {stored} chunks but {ingested} were committed. "
+            f"'{collection_name}' still points to its previous version."
+        )
         return 0
+    previous_name = set_alias(CHROMA_DB_PATH, collection_name, collection.name)
+    print(f"'{collection_name}' now points to '{collection.name}'" + (f" (was '{previous_name}')" if previous_name else ""))
+    retire_collection_versions(client, collection_name)
+    
+    print(f"Successfully ingested {ingested}/{chunk_count} chunks from {pdf_path.name}")
+    return ingested
+
+
+def get_collection_versions_to_keep() -> int:
+    """Get how many superseded versions of a collection to keep, from COLLECTION_VERSIONS_TO_KEEP (default 0)."""
+    try:
+        return max(0, int(os.getenv("COLLECTION_VERSIONS_TO_KEEP", "0")))
+    except ValueError:
+        return 0
+
+
+def retire_collection_versions(
+    client: chromadb.Client,
+    collection_name: str,
+    keep: Optional[int] = None,
+) -> List[str]:
+    """
+    Delete versions of a logical collection that are no longer served.
     
-    print(f"Generating embeddings...")
-    embeddings = generate_embeddings(chunks)
+    The live version is never deleted. Of the others, the `keep` newest ones
+    older than it are kept (for rollback). Versions newer than the live one
+    are abandoned builds and are deleted. So is an unversioned collection
+    with the logical name, once the name is aliased. Their ingest manifests,
+    compact stores and parent sections go with them.
     
-    # Filter out empty embeddings
-    valid_chunks = []
-    valid_embeddings = []
-    for chunk, embedding in zip(chunks, embeddings):
-        if embedding:
-            valid_chunks.append(chunk)
-            valid_embeddings.append(embedding)
+    Args:
+        client: Chroma client
+        collection_name: Logical collection name
+        keep: Superseded versions to keep. If None, uses COLLECTION_VERSIONS_TO_KEEP
+        
+    Returns:
+        Names of the deleted collections
+    """
+    keep = get_collection_versions_to_keep() if keep is None else keep
+    live_name = resolve_collection(CHROMA_DB_PATH, collection_name)
+    live_version = parse_version(live_name, collection_name)
+    if live_version is None:
+        return []
     
-    if not valid_chunks:
-        print("No valid embeddings generated")
+    collection_names = client.list_collections()
+    older = [version for version in collection_versions(collection_names, collection_name) if version < live_version]
+    kept = set(older[-keep:]) if keep else set()
+    retired = [
+        versioned_name(collection_name, version)
+        for version in collection_versions(collection_names, collection_name)
+        if version != live_version and version not in kept
+    ]
+    if collection_name in collection_names:
+        retired.append(collection_name)
+    
+    for name in retired:
+        try:
+            client.delete_collection(name)
+        except Exception as e:
+            logger.warning(f"Could not delete retired collection '{name}': {e}")
+            continue
+        get_chroma_registry().discard(name)
+        delete_manifest(CHROMA_DB_PATH, name)
+        for dtype in COMPACT_DTYPES:
+            compact_store_path(CHROMA_DB_PATH, name, dtype).unlink(missing_ok=True)
+        delete_parents(CHROMA_DB_PATH, name)
+        print(f"Deleted retired collection '{name}'")
+    return retired
+
+
+def refresh_compact_stores(collection) -> List[str]:
+    """
+    Re-export the compact stores of a collection that was changed in place (sync).
+
+    Only stores that already exist are refreshed. A store that cannot be
+    re-exported is deleted, so queries fall back to Chroma instead of
+    serving stale vectors.
+
+    Returns:
+        dtypes that were re-exported
+    """
+    refreshed = []
+    for dtype in COMPACT_DTYPES:
+        path = compact_store_path(CHROMA_DB_PATH, collection.name, dtype)
+        if not path.exists():
+            continue
+        try:
+            CompactVectorStore.from_collection(collection, dtype).save(path)
+            refreshed.append(dtype)
+        except Exception as e:
+            logger.warning(f"Could not re-export compact store {path.name}, deleting it: {e}")
+            path.unlink(missing_ok=True)
+    clear_compact_stores()
+    return refreshed
+
+
+def is_collection_built(collection_name: str) -> bool:
+    """Whether the version a logical collection points to finished building."""
+    return is_collection_complete(CHROMA_DB_PATH, resolve_collection(CHROMA_DB_PATH, collection_name))
+
+
+def _collection_metadata(retrieval: str = DEFAULT_RETRIEVAL_MODE) -> dict:
+    """Embedding settings (and a non-default retrieval mode) recorded on a collection when it is created."""
+    metadata = dict(get_embedding_backend().identity)
+    if retrieval != DEFAULT_RETRIEVAL_MODE:
+        metadata["retrieval"] = retrieval
+    return metadata
+
+
+def _new_manifest(
+    pdf_path: Path,
+    collection_name: str,
+    chunker: str = DEFAULT_CHUNKER,
+    retrieval: str = DEFAULT_RETRIEVAL_MODE,
+) -> IngestManifest:
+    """Manifest describing a fresh build of a collection from a PDF."""
+    backend = get_embedding_backend()
+    return IngestManifest(
+        collection=collection_name,
+        source=pdf_path.name,
+        source_hash=file_sha256(pdf_path),
+        chunk_size=DEFAULT_PARENT_CHUNK_SIZE if retrieval == "parent" else DEFAULT_CHUNK_SIZE,
+        chunk_overlap=DEFAULT_CHUNK_OVERLAP,
+        chunker=chunker,
+        retrieval=retrieval,
+        embedding_model=backend.model,
+        task_type=backend.task_type,
+        dimensionality=backend.output_dimensionality,
+        cleaner=CLEANER_VERSION if is_cleaning_enabled() else None,
+    )
+
+
+def _iter_collection_chunks(
+    pdf_path: Path,
+    workers: Optional[int],
+    cleaning: Optional[CleaningStats],
+    chunker: str,
+    retrieval: str,
+):
+    """Chunks to index for a retrieval mode: parent sections cut into children, or plain chunks."""
+    if retrieval == "parent":
+        return iter_pdf_chunks(
+            pdf_path,
+            chunk_size=DEFAULT_PARENT_CHUNK_SIZE,
+            workers=workers,
+            cleaning=cleaning,
+            chunker=chunker,
+            child_size=DEFAULT_CHILD_CHUNK_SIZE,
+        )
+    return iter_pdf_chunks(pdf_path, workers=workers, cleaning=cleaning, chunker=chunker)
+
+
+def _save_chunk_parents(collection_name: str, chunks: List[TextChunk]) -> List[str]:
+    """Store the parent sections of child chunks; returns their ids."""
+    parents = {parent_key(chunk.parent): chunk.parent for chunk in chunks if chunk.parent is not None}
+    save_parents(CHROMA_DB_PATH, collection_name, parents.values())
+    return list(parents)
+
+
+def _new_cleaning_stats() -> Optional[CleaningStats]:
+    """Stats that switch chunk cleaning on for one ingestion, or None if INGEST_CLEANING is off."""
+    return CleaningStats() if is_cleaning_enabled() else None
+
+
+def _chunk_id(collection_name: str, chunk: TextChunk) -> str:
+    """Generate unique ID based on chunk position and content hash."""
+    return f"{collection_name}_{chunk.index}_{chunk_hash(chunk.text)}"
+
+
+def _chunk_metadata(pdf_path: Path, chunk: TextChunk) -> dict:
+    """Chroma metadata stored with each chunk."""
+    return {
+        "source": pdf_path.name,
+        "chunk_index": chunk.index,
+        "chunk_size": len(chunk.text),
+        "content_hash": chunk_hash(chunk.text),
+        "page_start": chunk.page_start,
+        "page_end": chunk.page_end,
+        **({"section_path": chunk.section_path} if chunk.section_path else {}),
+        **({"parent_id": parent_key(chunk.parent)} if chunk.parent is not None else {}),
+    }
+
+
+def sync_pdf_to_chroma(
+    pdf_path: Path,
+    collection_name: str,
+    client: Optional[chromadb.Client] = None,
+    max_in_flight: Optional[int] = None,
+    extraction_workers: Optional[int] = None,
+    budget: Optional[EmbeddingBudget] = None,
+    chunker: Optional[str] = None,
+    retrieval: Optional[str] = None,
+) -> int:
+    """
+    Incrementally sync a PDF into an existing Chroma collection.
+    
+    Chunks are matched to existing entries by content hash. Only new or
+    changed chunks are embedded and upserted, unchanged chunks keep their
+    vectors (their metadata is updated if their position moved), and chunks
+    that no longer appear in the PDF are deleted last. The collection is
+    never dropped, so queries keep being served from the existing data
+    while the sync runs.
+    
+    Args:
+        pdf_path: Path to PDF file
+        collection_name: Name of Chroma collection
+        client: Chroma client (if None, creates new one)
+        max_in_flight: Maximum concurrent embedding requests. If None, uses EMBEDDING_MAX_IN_FLIGHT
+        extraction_workers: PDF extraction processes. If None, uses PDF_EXTRACTION_WORKERS
+        budget: Embedding budget shared with concurrent ingestions
+        chunker: "fixed" or "structured". If None, uses get_collection_chunker()
+        retrieval: "chunk" or "parent". If None, uses get_collection_retrieval_mode()
+        
+    Returns:
+        Number of chunks in the collection after the sync
+    """
+    if client is None:
+        client = get_chroma_client()
+    chunker = chunker or get_collection_chunker(collection_name)
+    retrieval = retrieval or get_collection_retrieval_mode(collection_name)
+    
+    if not pdf_path.exists():
+        print(f"PDF not found: {pdf_path}")
         return 0
     
-    print(f"Storing {len(valid_chunks)} chunks in Chroma...")
-    
-    # Generate IDs for chunks
-    ids = []
-    metadata = []
-    for i, chunk in enumerate(valid_chunks):
-        # Generate unique ID based on content hash
-        chunk_hash = hashlib.md5(chunk.encode()).hexdigest()
-        ids.append(f"{collection_name}_{i}_{chunk_hash}")
-        metadata.append({
-            "source": pdf_path.name,
-            "chunk_index": i,
-            "chunk_size": len(chunk)
-        })
+    # Synced in place: the live version stays servable throughout. With no
+    # collection yet, the first version is created and aliased at the end.
+    live_name = resolve_collection(CHROMA_DB_PATH, collection_name)
+    collection_names = client.list_collections()
+    if live_name not in collection_names:
+        # Fill in the newest (unfinished) version, if any
+        versions = collection_versions(collection_names, collection_name)
+        live_name = versioned_name(collection_name, versions[-1] if versions else 1)
+    collection = client.get_or_create_collection(name=live_name, metadata=_collection_metadata(retrieval))
+    
+    # Vectors from different models (or of different sizes) cannot share a collection
+    mismatch = backend_mismatch(collection.metadata, get_embedding_backend())
+    if mismatch:
+        print(f"Collection '{collection_name}' was {mismatch}. Use force_reload=True to rebuild it.")
+        return collection.count()
+    # Neither can child chunks and plain chunks
+    built_for = (collection.metadata or {}).get("retrieval", DEFAULT_RETRIEVAL_MODE)
+    if built_for != retrieval:
+        print(f"Collection '{collection_name}' was built for '{built_for}' retrieval. Use force_reload=True to rebuild it for '{retrieval}'.")
+        return collection.count()
+    
+    # Existing entries grouped by content hash (a hash may appear more than once)
+    existing = collection.get(include=["metadatas"])
+    existing_by_hash = {}
+    existing_metadata = {}
+    for chunk_id, meta in zip(existing["ids"], existing["metadatas"] or [None] * len(existing["ids"])):
+        meta = meta or {}
+        content_hash = meta.get("content_hash") or chunk_id.rsplit("_", 1)[-1]
+        existing_by_hash.setdefault(content_hash, []).append(chunk_id)
+        existing_metadata[chunk_id] = meta
+    
+    print(f"Streaming chunks from {pdf_path.name}...")
+    chunk_count = 0
+    next_chunk_index = 0
+    new_count = 0
+    moved_count = 0
+    failed_count = 0
+    parent_ids = set()
+    
+    cleaning = _new_cleaning_stats()
+    with ChromaBatchWriter(collection, client.get_max_batch_size()) as writer:
+        chunks = _iter_collection_chunks(pdf_path, extraction_workers, cleaning, chunker, retrieval)
+        for window in batched(chunks, INGEST_WINDOW_SIZE):
+            chunk_count += len(window)
+            next_chunk_index = window[-1].index + 1
+            parent_ids.update(_save_chunk_parents(collection.name, window))
+            new_chunks = []
+            moved_ids = []
+            moved_metadata = []
+            for chunk in window:
+                content_hash = chunk_hash(chunk.text)
+                metadata = _chunk_metadata(pdf_path, chunk)
+                if existing_by_hash.get(content_hash):
+                    chunk_id = existing_by_hash[content_hash].pop()
+                    if existing_metadata[chunk_id] != metadata:
+                        moved_ids.append(chunk_id)
+                        moved_metadata.append(metadata)
+                else:
+                    new_chunks.append(chunk)
+            
+            # 1. Upsert new/changed chunks
+            if new_chunks:
+                embeddings = generate_embeddings(
+                    [chunk.text for chunk in new_chunks], max_in_flight=max_in_flight, budget=budget
+                )
+                valid = [(chunk, embedding) for chunk, embedding in zip(new_chunks, embeddings) if embedding]
+                failed_count += len(new_chunks) - len(valid)
+                writer.put(
+                    "upsert",
+                    ids=[_chunk_id(collection_name, chunk) for chunk, _ in valid],
+                    documents=[chunk.text for chunk, _ in valid],
+                    embeddings=[embedding for _, embedding in valid],
+                    metadatas=[_chunk_metadata(pdf_path, chunk) for chunk, _ in valid],
+                )
+                new_count += len(valid)
+            
+            # 2. Refresh metadata of unchanged chunks whose position changed
+            writer.put("update", ids=moved_ids, metadatas=moved_metadata)
+            moved_count += len(moved_ids)
+        
+        if not chunk_count:
+            # Keep serving the existing data rather than emptying the collection
+            print(f"No text extracted from {pdf_path}. Leaving '{collection_name}' unchanged.")
+            stale_ids = []
+        else:
+            # 3. Delete stale chunks last so the collection is never missing content
+            stale_ids = [chunk_id for ids in existing_by_hash.values() for chunk_id in ids]
+            writer.put("delete", ids=stale_ids)
+    
+    if not chunk_count:
+        return collection.count()
+    stale_parents = delete_parents(CHROMA_DB_PATH, collection.name, keep=parent_ids)
+    if cleaning is not None:
+        print(cleaning.summary())
     
-    # Add to collection
-    collection.add(
-        documents=valid_chunks,
-        embeddings=valid_embeddings,
-        ids=ids,
-        metadatas=metadata
+    print(
+        f"Sync of '{collection_name}': {new_count} new/changed, "
+        f"{chunk_count - new_count - failed_count} unchanged ({moved_count} moved), "
+        f"{len(stale_ids)} stale removed, {failed_count} failed"
+        + (f"; {len(parent_ids)} parent sections ({stale_parents} stale removed)" if parent_ids else "")
     )
     
-    print(f"Successfully ingested {len(valid_chunks)} chunks from {pdf_path.name}")
-    return len(valid_chunks)
+    count = collection.count()
+    
+    # Compact exports of this version were taken before the sync
+    refreshed = refresh_compact_stores(collection)
+    if refreshed:
+        print(f"Re-exported compact stores of '{collection_name}': {', '.join(refreshed)}")
+    
+    # Recorded only once the sync is done: an interrupted sync leaves old and
+    # new chunks side by side (still servable), and rerunning it embeds only
+    # the chunks it had not reached
+    manifest = _new_manifest(pdf_path, live_name, chunker, retrieval)
+    manifest.status = STATUS_COMPLETE
+    manifest.last_committed_batch = (chunk_count - 1) // INGEST_WINDOW_SIZE
+    manifest.next_chunk_index = next_chunk_index
+    manifest.committed_chunks = chunk_count - failed_count
+    manifest.failed_chunks = failed_count
+    save_manifest(CHROMA_DB_PATH, manifest)
+    if resolve_collection(CHROMA_DB_PATH, collection_name) != live_name:
+        set_alias(CHROMA_DB_PATH, collection_name, live_name)
+    
+    print(f"Successfully synced {pdf_path.name}: {count} chunks in '{collection_name}'")
+    return count
 
 
-def initialize_knowledge_base(force_reload: bool = False) -> dict:
+def initialize_knowledge_base(
+    force_reload: bool = False,
+    max_in_flight: Optional[int] = None,
+    sync: bool = False,
+    extraction_workers: Optional[int] = None,
+    concurrent: bool = True,
+    chunkers: Optional[Dict[str, str]] = None,
+    retrieval_modes: Optional[Dict[str, str]] = None,
+    export_compact: Optional[str] = None,
+) -> dict:
     """
     Initialize knowledge base by ingesting all PDFs into Chroma.
     
     Args:
-        force_reload: If True, delete existing collections and reload
+        force_reload: If True, rebuild every collection into a new version
+            (see ingest_pdf_to_chroma)
+        max_in_flight: Maximum concurrent embedding requests. If None, uses EMBEDDING_MAX_IN_FLIGHT
+        sync: If True, incrementally sync existing collections with the PDFs
+        extraction_workers: PDF extraction processes. If None, uses PDF_EXTRACTION_WORKERS
+        concurrent: If True, ingest all sources at once under a shared embedding budget
+        chunkers: Chunker per collection ("fixed" or "structured"). Collections
+            not listed use get_collection_chunker()
+        retrieval_modes: Retrieval mode per collection ("chunk" or "parent").
+            Collections not listed use get_collection_retrieval_mode()
+        export_compact: If set, also export the served collections to compact
+            stores of this dtype ("float32", "float16" or "int8")
         
     Returns:
-        Dictionary with ingestion results
+        Dictionary with ingestion results (chunks per collection)
     """
     client = get_chroma_client()
+    telemetry = get_telemetry_sink()
+    telemetry.metrics.reset()
     
-    results = {}
-    
-    # Paths to knowledge PDFs
-    reasoning_knowledge_dir = Path(__file__).parent.parent / "sub_agents" / "reasoning_agent" / "knowlegde"
-    interview_knowledge_dir = Path(__file__).parent.parent / "sub_agents" / "interview_agent" / "knowledge"
+    # One embedding budget shared by all sources, so concurrent ingestion
+    # never has more than max_in_flight requests against the quota
+    budget = EmbeddingBudget(max_in_flight)
     
-    bpjs_pdf = reasoning_knowledge_dir / "Pedoman-BPJS-Kriteria-Gawat-Darurat.pdf"
-    ppk_pdf = reasoning_knowledge_dir / "ppk-kemenkes.pdf"
-    bates_pdf = interview_knowledge_dir / "Bates_Guide_to_Physical_Examination.pdf"
-    
-    # Ingest BPJS PDF
-    if bpjs_pdf.exists():
+    def ingest_source(collection_name: str, pdf_path: Path, label: str) -> int:
+        if not pdf_path.exists():
+            print(f"{label} PDF not found: {pdf_path}")
+            return 0
         print(f"\n{'='*60}")
-        print(f"Ingesting BPJS Criteria PDF...")
+        print(f"Ingesting {label} PDF...")
         print(f"{'='*60}")
-        results[COLLECTION_BPJS] = ingest_pdf_to_chroma(
-            bpjs_pdf, COLLECTION_BPJS, client, force_reload
+        return ingest_pdf_to_chroma(
+            pdf_path,
+            collection_name,
+            client,
+            force_reload=force_reload,
+            max_in_flight=budget.capacity,
+            sync=sync,
+            extraction_workers=extraction_workers,
+            budget=budget,
+            chunker=(chunkers or {}).get(collection_name),
+            retrieval=(retrieval_modes or {}).get(collection_name),
         )
-    else:
-        print(f"BPJS PDF not found: {bpjs_pdf}")
-        results[COLLECTION_BPJS] = 0
     
-    # Ingest PPK Kemenkes PDF
-    if ppk_pdf.exists():
-        print(f"\n{'='*60}")
-        print(f"Ingesting PPK Kemenkes PDF...")
-        print(f"{'='*60}")
-        results[COLLECTION_PPK] = ingest_pdf_to_chroma(
-            ppk_pdf, COLLECTION_PPK, client, force_reload
-        )
-    else:
-        print(f"PPK PDF not found: {ppk_pdf}")
-        results[COLLECTION_PPK] = 0
-    
-    # Ingest Bates Guide PDF
-    if bates_pdf.exists():
-        print(f"\n{'='*60}")
-        print(f"Ingesting Bates Guide PDF...")
-        print(f"{'='*60}")
-        results[COLLECTION_BATES] = ingest_pdf_to_chroma(
-            bates_pdf, COLLECTION_BATES, client, force_reload
-        )
+    if concurrent:
+        # Extraction of one document overlaps with embedding of another
+        with ThreadPoolExecutor(max_workers=len(KNOWLEDGE_SOURCES), thread_name_prefix="ingest") as pool:
+            futures = {
+                collection_name: pool.submit(ingest_source, collection_name, pdf_path, label)
+                for collection_name, pdf_path, label in KNOWLEDGE_SOURCES
+            }
+        results = {}
+        for collection_name, future in futures.items():
+            try:
+                results[collection_name] = future.result()
+            except Exception as e:
+                print(f"Error ingesting {collection_name}: {e}")
+                results[collection_name] = 0
     else:
-        print(f"Bates Guide PDF not found: {bates_pdf}")
-        results[COLLECTION_BATES] = 0
+        results = {
+            collection_name: ingest_source(collection_name, pdf_path, label)
+            for collection_name, pdf_path, label in KNOWLEDGE_SOURCES
+        }
     
     print(f"\n{'='*60}")
     print(f"Knowledge Base Initialization Complete!")
@@ -686,10 +1330,46 @@ def initialize_knowledge_base(force_reload: bool = False) -> dict:
     for collection, count in results.items():
         print(f"  - {collection}: {count} chunks")
     print(f"{'='*60}\n")
+    if not telemetry.flush():
+        print("⚠️  Telemetry events are still being written.")
+    print(telemetry.summary())
+    
+    # Exported from the versions the aliases now point to, before readiness
+    # and the snapshot, so published snapshots carry the compact stores
+    if export_compact:
+        print(f"\nExporting compact {export_compact} stores...")
+        export_compact_stores(
+            client,
+            CHROMA_DB_PATH,
+            [collection_name for collection_name, _, _ in KNOWLEDGE_SOURCES],
+            export_compact,
+        )
+    
+    # Written last (and before publishing, so snapshots carry it): only a
+    # fully built knowledge base is reported ready. Rebuilds go into new
+    # versions, so the previous build stays ready (and served) meanwhile.
+    counts = get_collection_counts(client)
+    if all(
+        counts.get(collection_name, 0) > 0 and is_collection_built(collection_name)
+        for collection_name, _, _ in KNOWLEDGE_SOURCES
+    ):
+        readiness = write_readiness(CHROMA_DB_PATH, counts)
+        print(f"Knowledge base ready (build {readiness['build_id']}, {readiness['total_chunks']} chunks)")
+    else:
+        clear_readiness(CHROMA_DB_PATH)
+        print("⚠️  Knowledge base is incomplete; not marking it ready.")
     
     # Upload to Cloud Storage if configured
     bucket_name = get_chroma_bucket_name()
-    if bucket_name:
+    if get_persistence_mode() == "snapshot" and (bucket_name or os.getenv("CHROMA_SNAPSHOT_DIR")):
+        print("Publishing knowledge base snapshot...")
+        try:
+            store = get_snapshot_store(create=True)
+            manifest = publish_snapshot(store, CHROMA_DB_PATH, counts)
+            print(f"✅ Published snapshot {manifest['build_id']} to {store.describe(manifest['artifact']['name'])}")
+        except Exception as e:
+            print(f"⚠️  Failed to publish snapshot (non-fatal): {e}")
+    elif bucket_name:
         print(f"Uploading Chroma DB to Cloud Storage (gs://{bucket_name}/chroma_db/)...")
         if upload_chroma_to_gcs():
             print("✅ Successfully uploaded Chroma DB to Cloud Storage.")
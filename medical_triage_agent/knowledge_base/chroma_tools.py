@@ -17,48 +17,23 @@ Chroma Tools for Querying Vector Database.
 
 This module provides tools for querying the Chroma vector database
 to retrieve relevant information from the knowledge base.
+
+The tools are async, so ADK awaits them on the event loop instead of running
+blocking embedding and Chroma calls on it. Synchronous code can use
+`retrieval.search_knowledge_base(...).format()`.
 """
 
-import os
 from typing import List, Optional
-from google import genai
 from google.adk.tools import FunctionTool
-from google.genai import types
 from .chroma_setup import (
-    get_chroma_client,
     COLLECTION_BPJS,
     COLLECTION_PPK,
     COLLECTION_BATES,
 )
+from .retrieval import search_knowledge_base_async
 
 
-# Environment variables will be read when needed
-def get_google_cloud_project():
-    """Get GOOGLE_CLOUD_PROJECT, loading .env if needed."""
-    project = os.getenv("GOOGLE_CLOUD_PROJECT")
-    if not project:
-        from pathlib import Path
-        from dotenv import load_dotenv
-        env_path = Path(__file__).parent.parent.parent / ".env"
-        if env_path.exists():
-            load_dotenv(env_path)
-            project = os.getenv("GOOGLE_CLOUD_PROJECT")
-    return project
-
-def get_google_cloud_location():
-    """Get GOOGLE_CLOUD_LOCATION, loading .env if needed."""
-    location = os.getenv("GOOGLE_CLOUD_LOCATION", "us-central1")
-    if not os.getenv("GOOGLE_CLOUD_PROJECT"):
-        from pathlib import Path
-        from dotenv import load_dotenv
-        env_path = Path(__file__).parent.parent.parent / ".env"
-        if env_path.exists():
-            load_dotenv(env_path)
-            location = os.getenv("GOOGLE_CLOUD_LOCATION", "us-central1")
-    return location
-
-
-def query_knowledge_base(
+async def query_knowledge_base(
     query: str,
     collection_names: Optional[List[str]] = None,
     n_results: int = 5
@@ -69,81 +44,18 @@ def query_knowledge_base(
     Args:
         query: Search query/question
         collection_names: List of collection names to search. If None, searches all.
-        n_results: Number of results to return per collection
+        n_results: Number of results to return per collection (for collections in
+            "parent" retrieval mode: child hits, which collapse into at most as many parent sections)
         
     Returns:
         Formatted string with relevant information from knowledge base
     """
-    if collection_names is None:
-        collection_names = [COLLECTION_BPJS, COLLECTION_PPK, COLLECTION_BATES]
-    
-    client = get_chroma_client()
-    
-    # Generate embedding for query using Google GenAI
-    google_project = get_google_cloud_project()
-    google_location = get_google_cloud_location()
-    
-    if not google_project:
-        return "Error: GOOGLE_CLOUD_PROJECT environment variable is not set"
-    
-    client_genai = genai.Client(
-        vertexai=True,
-        project=google_project,
-        location=google_location,
-    )
-    
-    try:
-        # Use gemini-embedding-001 with SEMANTIC_SIMILARITY task type for better search results
-        config = types.EmbedContentConfig(task_type="SEMANTIC_SIMILARITY")
-        response = client_genai.models.embed_content(
-            model="gemini-embedding-001",
-            contents=query,  # Can pass string directly
-            config=config
-        )
-        
-        # Extract embedding from response.embeddings
-        query_embedding = None
-        if hasattr(response, 'embeddings') and response.embeddings:
-            if isinstance(response.embeddings, list) and len(response.embeddings) > 0:
-                content_embedding = response.embeddings[0]
-                if hasattr(content_embedding, 'values'):
-                    query_embedding = list(content_embedding.values)
-        
-        if not query_embedding:
-            return "Error: Could not extract embedding from response"
-    except Exception as e:
-        return f"Error generating embedding: {str(e)}"
-    
-    results_text = []
-    
-    for collection_name in collection_names:
-        try:
-            collection = client.get_collection(collection_name)
-            
-            # Query collection
-            results = collection.query(
-                query_embeddings=[query_embedding],
-                n_results=n_results
-            )
-            
-            if results['documents'] and results['documents'][0]:
-                results_text.append(f"\n=== {collection_name.upper()} ===")
-                for i, doc in enumerate(results['documents'][0], 1):
-                    results_text.append(f"\n[Result {i}]")
-                    results_text.append(doc)
-                    results_text.append("")
-        
-        except Exception as e:
-            print(f"Error querying collection {collection_name}: {e}")
-            continue
-    
-    if not results_text:
-        return "No relevant information found in knowledge base."
-    
-    return "\n".join(results_text)
+    # The query is embedded once and the collections are searched concurrently (see retrieval)
+    results = await search_knowledge_base_async(query, collection_names, n_results)
+    return results.format()
 
 
-def query_bpjs_criteria(query: str, n_results: int = 5) -> str:
+async def query_bpjs_criteria(query: str, n_results: int = 5) -> str:
     """
     Query BPJS emergency criteria knowledge base. Use this to find specific criteria for gawat darurat classification.
     
@@ -154,10 +66,10 @@ def query_bpjs_criteria(query: str, n_results: int = 5) -> str:
     Returns:
         Relevant BPJS criteria information
     """
-    return query_knowledge_base(query, [COLLECTION_BPJS], n_results)
+    return await query_knowledge_base(query, [COLLECTION_BPJS], n_results)
 
 
-def query_ppk_kemenkes(query: str, n_results: int = 5) -> str:
+async def query_ppk_kemenkes(query: str, n_results: int = 5) -> str:
     """
     Query PPK Kemenkes (Primary Health Care Guidelines) knowledge base. Use this for primary care guidelines and protocols.
     
@@ -168,10 +80,10 @@ def query_ppk_kemenkes(query: str, n_results: int = 5) -> str:
     Returns:
         Relevant PPK Kemenkes information
     """
-    return query_knowledge_base(query, [COLLECTION_PPK], n_results)
+    return await query_knowledge_base(query, [COLLECTION_PPK], n_results)
 
 
-def query_bates_guide(query: str, n_results: int = 5) -> str:
+async def query_bates_guide(query: str, n_results: int = 5) -> str:
     """
     Query Bates Guide to Physical Examination knowledge base. Use this for physical examination techniques and findings.
     
@@ -182,7 +94,7 @@ def query_bates_guide(query: str, n_results: int = 5) -> str:
     Returns:
         Relevant Bates Guide information
     """
-    return query_knowledge_base(query, [COLLECTION_BATES], n_results)
+    return await query_knowledge_base(query, [COLLECTION_BATES], n_results)
 
 
 # Create ADK tools
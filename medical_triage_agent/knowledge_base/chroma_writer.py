@@ -0,0 +1,138 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Pipelined Chroma Writer.
+
+Ingestion embeds the next window of chunks while a background thread writes
+the previous one to Chroma. A bounded queue provides backpressure: when
+Chroma falls behind, the embedding side blocks instead of piling vectors up
+in memory. Every window is committed as soon as it is written, so a crash
+late in a run keeps the progress made so far.
+"""
+
+import logging
+import queue
+import threading
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Windows waiting to be written before the producer blocks
+DEFAULT_QUEUE_SIZE = 2
+
+_STOP = object()
+
+
+class ChromaBatchWriter:
+    """
+    Background writer for a Chroma collection.
+
+    Usage:
+        with ChromaBatchWriter(collection, client.get_max_batch_size()) as writer:
+            writer.put("add", ids=..., documents=..., embeddings=..., metadatas=...)
+        print(writer.written)
+    """
+
+    def __init__(
+        self,
+        collection: Any,
+        max_batch_size: int,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        on_commit: Optional[Callable[[Any], None]] = None,
+    ):
+        """
+        Args:
+            collection: Chroma collection to write to
+            max_batch_size: Largest batch passed to a single Chroma call
+            queue_size: Pending writes allowed before `put` blocks
+            on_commit: Optional callback(checkpoint) run on the writer thread after
+                each write queued with a checkpoint has been committed
+        """
+        self.collection = collection
+        self.max_batch_size = max(1, max_batch_size)
+        self.on_commit = on_commit
+        self.written = 0
+        self.error: Optional[BaseException] = None
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, name=f"chroma-writer-{collection.name}", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            if self.error is not None:
+                continue  # Drain without writing after a failure
+
+            method, columns, checkpoint = item
+            try:
+                write = getattr(self.collection, method)
+                ids = columns["ids"]
+                for start in range(0, len(ids), self.max_batch_size):
+                    write(**{name: values[start:start + self.max_batch_size] for name, values in columns.items()})
+                if method in ("add", "upsert"):
+                    self.written += len(ids)
+                if self.on_commit and checkpoint is not None:
+                    self.on_commit(checkpoint)
+            except BaseException as e:
+                logger.error(f"Chroma write to '{self.collection.name}' failed: {e}")
+                self.error = e
+
+    def put(self, method: str, checkpoint: Any = None, **columns) -> None:
+        """
+        Queue a write, blocking while the queue is full.
+
+        Args:
+            method: Collection method to call ("add", "upsert", "update" or "delete")
+            checkpoint: Passed to `on_commit` once this write is committed. A write
+                with a checkpoint is queued even when it has no rows
+            **columns: Keyword arguments for the method; every value is a list aligned with `ids`
+        """
+        if self.error is not None:
+            raise RuntimeError(f"Chroma writer failed: {self.error}") from self.error
+        if not columns.get("ids") and checkpoint is None:
+            return
+        self._queue.put((method, columns, checkpoint))
+
+    def close(self) -> int:
+        """
+        Wait for queued writes to finish.
+
+        Returns:
+            Number of chunks added or upserted
+
+        Raises:
+            RuntimeError: If any write failed
+        """
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
+        if self.error is not None:
+            raise RuntimeError(f"Chroma writer failed: {self.error}") from self.error
+        return self.written
+
+    def __enter__(self) -> "ChromaBatchWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+            return
+        # Producer failed: finish the writes already queued (their vectors are
+        # paid for) and let the original exception propagate
+        if self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join()
@@ -0,0 +1,284 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Ingestion-Stage Text Cleaning.
+
+Two streaming filters sit between PDF extraction and embedding:
+- `strip_repeated_lines` removes running headers, footers and page numbers.
+  These are lines at the top or bottom of a page that recur on most pages
+  around it. Page-number lines ("12", "- 12 -", "Halaman 12", "12 / 340")
+  match whatever their number. Other lines must recur verbatim, so
+  numbered headings ("1. Bagian A", "2. Bagian B") are kept.
+- `drop_near_duplicates` drops chunks whose 64-bit SimHash (over word
+  3-gram shingles) is within a few bits of an earlier chunk's. Repeated
+  tables and boilerplate sections are then embedded once.
+
+Both work on a bounded window (pages for headers, the last
+INGEST_DEDUP_WINDOW kept chunks for near-duplicates), so ingestion memory
+stays flat. Both are deterministic, so resumed and synced builds see the
+same chunks.
+"""
+
+import hashlib
+import os
+import re
+from collections import Counter, deque
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .batch_packer import estimate_tokens
+
+# Recorded in ingest manifests; bump when the cleaning rules change
+CLEANER_VERSION = "v3"
+
+# Pages on each side of a page whose edge lines are compared with it
+DEFAULT_WINDOW_PAGES = 8
+
+# Non-empty lines at the top and bottom of a page that may be boilerplate
+DEFAULT_EDGE_LINES = 3
+
+# Share of the window's pages a line must appear on to count as boilerplate
+DEFAULT_MIN_PAGE_FRACTION = 0.5
+
+# SimHash bits two chunks may differ in and still be near-duplicates
+DEFAULT_MAX_HAMMING_DISTANCE = 3
+
+# Most recent kept chunks whose fingerprints are compared against
+DEFAULT_DEDUP_WINDOW = 10000
+
+# A page-number line: "12", "- 12 -", "Halaman 12", "Hal. 12", "Page 12 of 340", "12 / 340"
+_PAGE_NUMBER_LINE = re.compile(r"^\W*(?:(?:halaman|hal|page)\.?\s*)?\d+(?:\s*(?:/|dari|of)\s*\d+)?\W*$")
+
+_SIMHASH_BITS = 64
+# Hamming distance <= 3 means at least one of 4 16-bit blocks is identical
+_SIMHASH_BLOCKS = 4
+
+
+def is_cleaning_enabled() -> bool:
+    """Whether ingestion cleans text, from INGEST_CLEANING (default on; "0" disables)."""
+    return os.getenv("INGEST_CLEANING", "1").strip().lower() not in ("0", "false", "no", "off")
+
+
+def get_max_hamming_distance() -> int:
+    """Get the near-duplicate threshold from INGEST_DEDUP_MAX_DISTANCE (default 3 bits)."""
+    try:
+        return min(_SIMHASH_BLOCKS - 1, max(0, int(os.getenv("INGEST_DEDUP_MAX_DISTANCE", DEFAULT_MAX_HAMMING_DISTANCE))))
+    except ValueError:
+        return DEFAULT_MAX_HAMMING_DISTANCE
+
+
+def get_dedup_window() -> int:
+    """Get the kept chunks remembered for near-duplicate detection from INGEST_DEDUP_WINDOW (default 10000)."""
+    try:
+        return max(1, int(os.getenv("INGEST_DEDUP_WINDOW", DEFAULT_DEDUP_WINDOW)))
+    except ValueError:
+        return DEFAULT_DEDUP_WINDOW
+
+
+@dataclass
+class CleaningStats:
+    """What cleaning removed during one ingestion."""
+
+    pages: int = 0
+    lines_removed: int = 0
+    chars_removed: int = 0
+    tokens_removed: int = 0
+    chunks_kept: int = 0
+    chunks_dropped: int = 0
+    tokens_dropped: int = 0
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_removed + self.tokens_dropped
+
+    def as_dict(self) -> dict:
+        return {**asdict(self), "tokens_saved": self.tokens_saved}
+
+    def summary(self) -> str:
+        return (
+            f"Cleaning: removed {self.lines_removed} header/footer lines (~{self.tokens_removed} tokens) "
+            f"from {self.pages} pages; dropped {self.chunks_dropped} near-duplicate chunks "
+            f"(~{self.tokens_dropped} tokens) of {self.chunks_kept + self.chunks_dropped}; "
+            f"~{self.tokens_saved} tokens saved"
+        )
+
+
+def _line_key(line: str) -> str:
+    """Comparison key for a line: lowercase, whitespace collapsed, and digits as '#' in page-number lines."""
+    key = re.sub(r"\s+", " ", line.lower()).strip()
+    if _PAGE_NUMBER_LINE.match(key):
+        return re.sub(r"\d+", "#", key)
+    return key
+
+
+def _edge_keys(lines: List[str], edge_lines: int) -> set:
+    content = [line for line in lines if line.strip()]
+    edges = content[:edge_lines] + content[-edge_lines:]
+    return {_line_key(line) for line in edges}
+
+
+def strip_repeated_lines(
+    pages: Iterable[Tuple[int, str]],
+    stats: Optional[CleaningStats] = None,
+    window: int = DEFAULT_WINDOW_PAGES,
+    edge_lines: int = DEFAULT_EDGE_LINES,
+    min_fraction: float = DEFAULT_MIN_PAGE_FRACTION,
+) -> Iterator[Tuple[int, str]]:
+    """
+    Remove running headers, footers and page numbers from a page stream.
+
+    A line is removed if it is among the first or last `edge_lines` non-empty
+    lines of its page, and the same key is an edge line on at least
+    `min_fraction` of the pages within `window` pages either side (and on at
+    least 3 pages). Only `window` pages are buffered ahead.
+
+    Args:
+        pages: Iterable of (page_number, page_text) tuples
+        stats: Optional stats updated with what was removed
+        window: Pages compared on each side
+        edge_lines: Lines at each page edge considered
+        min_fraction: Required share of pages in the window
+
+    Yields:
+        (page_number, cleaned_text) tuples
+    """
+    # Each entry: (page_number, lines, edge keys); `history` holds emitted pages' keys
+    ahead = deque()
+    history = deque(maxlen=window)
+    counts: Counter = Counter()
+
+    def emit():
+        page_number, lines, keys = ahead.popleft()
+        pages_in_window = len(history) + 1 + len(ahead)
+        threshold = max(3, min_fraction * pages_in_window)
+        repeated = {key for key in keys if key and counts[key] >= threshold}
+
+        kept = []
+        content = [i for i, line in enumerate(lines) if line.strip()]
+        edge_indices = set(content[:edge_lines] + content[-edge_lines:])
+        for i, line in enumerate(lines):
+            if i in edge_indices and _line_key(line) in repeated:
+                if stats is not None:
+                    stats.lines_removed += 1
+                    stats.chars_removed += len(line)
+                    stats.tokens_removed += estimate_tokens(line)
+                continue
+            kept.append(line)
+
+        # Slide the window: this page's keys move to history, the oldest drop out
+        if len(history) == history.maxlen:
+            counts.subtract(history[0])
+        history.append(keys)
+        if stats is not None:
+            stats.pages += 1
+        return page_number, "\n".join(kept)
+
+    for page_number, text in pages:
+        lines = text.split("\n")
+        keys = _edge_keys(lines, edge_lines)
+        counts.update(keys)
+        ahead.append((page_number, lines, keys))
+        if len(ahead) > window:
+            yield emit()
+    while ahead:
+        yield emit()
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash of a text over lowercase word 3-gram shingles."""
+    words = re.findall(r"\w+", text.lower())
+    shingles = [" ".join(words[i:i + 3]) for i in range(max(1, len(words) - 2))]
+    weights = [0] * _SIMHASH_BITS
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "little")
+        for bit in range(_SIMHASH_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit, weight in enumerate(weights) if weight > 0)
+
+
+class NearDuplicateFilter:
+    """
+    Remembers SimHashes of the last `window` kept texts and flags texts close to one of them.
+
+    Fingerprints are indexed by each of their four 16-bit blocks. Two hashes
+    within 3 bits share at least one block, so only texts with a matching
+    block are compared. Once `window` fingerprints are held, the oldest is
+    forgotten, so memory and the work per lookup are bounded by the window.
+    Near-duplicates further apart than that are not detected.
+    """
+
+    def __init__(self, max_distance: int = DEFAULT_MAX_HAMMING_DISTANCE, window: int = DEFAULT_DEDUP_WINDOW):
+        self.max_distance = max_distance
+        self.window = window
+        self._blocks: List[Dict[int, deque]] = [{} for _ in range(_SIMHASH_BLOCKS)]
+        self._order: deque = deque()
+
+    def _block_values(self, fingerprint: int):
+        width = _SIMHASH_BITS // _SIMHASH_BLOCKS
+        mask = (1 << width) - 1
+        return [(fingerprint >> (block * width)) & mask for block in range(_SIMHASH_BLOCKS)]
+
+    def seen(self, text: str) -> bool:
+        """True if `text` is a near-duplicate of a remembered text; otherwise remembers it."""
+        fingerprint = simhash(text)
+        values = self._block_values(fingerprint)
+        for block, value in enumerate(values):
+            for candidate in self._blocks[block].get(value, ()):
+                if bin(candidate ^ fingerprint).count("1") <= self.max_distance:
+                    return True
+        for block, value in enumerate(values):
+            self._blocks[block].setdefault(value, deque()).append(fingerprint)
+        self._order.append(values)
+        if len(self._order) > self.window:
+            # Buckets fill in insertion order, so the oldest fingerprint leads each of its buckets
+            for block, value in enumerate(self._order.popleft()):
+                bucket = self._blocks[block][value]
+                bucket.popleft()
+                if not bucket:
+                    del self._blocks[block][value]
+        return False
+
+
+def drop_near_duplicates(
+    chunks: Iterable,
+    stats: Optional[CleaningStats] = None,
+    max_distance: Optional[int] = None,
+    window: Optional[int] = None,
+) -> Iterator:
+    """
+    Drop chunks that are near-duplicates of a recent earlier chunk.
+
+    Args:
+        chunks: Iterable of objects with a `text` attribute (e.g. TextChunk)
+        stats: Optional stats updated with what was dropped
+        max_distance: SimHash bits allowed to differ. If None, uses INGEST_DEDUP_MAX_DISTANCE
+        window: Kept chunks compared against. If None, uses INGEST_DEDUP_WINDOW
+
+    Yields:
+        The chunks that were kept, unchanged (indices are not renumbered)
+    """
+    seen = NearDuplicateFilter(
+        get_max_hamming_distance() if max_distance is None else max_distance,
+        window or get_dedup_window(),
+    )
+    for chunk in chunks:
+        if seen.seen(chunk.text):
+            if stats is not None:
+                stats.chunks_dropped += 1
+                stats.tokens_dropped += estimate_tokens(chunk.text)
+            continue
+        if stats is not None:
+            stats.chunks_kept += 1
+        yield chunk
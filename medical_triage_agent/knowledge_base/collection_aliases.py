@@ -0,0 +1,128 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Versioned Collections Behind Logical Aliases.
+
+Each knowledge source (e.g. `bpjs_criteria`) is a logical name. Its data
+lives in physical versions (`bpjs_criteria__v1`, `bpjs_criteria__v2`, ...).
+`collection_aliases.json` in the Chroma DB directory maps each logical name
+to the version being served. A rebuild writes a new version and then
+replaces the mapping with one atomic rename. Readers re-read the mapping
+whenever the file changes, so a running server switches to the new version
+without a restart.
+
+A logical name with no alias resolves to itself. This covers collections
+built before versioning.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ALIASES_FILE = "collection_aliases.json"
+VERSION_SEPARATOR = "__v"
+
+# Mapping per file, keyed by (inode, mtime): every atomic replace changes the inode
+_cache: Dict[Path, Tuple[Tuple[int, int], Dict[str, str]]] = {}
+_lock = threading.Lock()
+
+
+def aliases_path(db_path: Path) -> Path:
+    return Path(db_path) / ALIASES_FILE
+
+
+def versioned_name(alias: str, version: int) -> str:
+    """Physical collection name of a version, e.g. `bpjs_criteria__v7`."""
+    return f"{alias}{VERSION_SEPARATOR}{version}"
+
+
+def parse_version(collection_name: str, alias: str) -> Optional[int]:
+    """Version number if `collection_name` is a version of `alias`, else None."""
+    match = re.fullmatch(re.escape(alias + VERSION_SEPARATOR) + r"(\d+)", collection_name)
+    return int(match.group(1)) if match else None
+
+
+def collection_versions(collection_names: Iterable[str], alias: str) -> List[int]:
+    """Sorted version numbers of `alias` among `collection_names`."""
+    versions = (parse_version(name, alias) for name in collection_names)
+    return sorted(version for version in versions if version is not None)
+
+
+def load_aliases(db_path: Path) -> Dict[str, str]:
+    """
+    Read the alias mapping (cached until the file changes).
+
+    Returns:
+        Dictionary of logical name to physical collection name
+    """
+    path = aliases_path(db_path)
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return {}
+    stamp = (stat.st_ino, stat.st_mtime_ns)
+    with _lock:
+        cached = _cache.get(path)
+        if cached and cached[0] == stamp:
+            return cached[1]
+        try:
+            aliases = json.loads(path.read_text())
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable alias file {path}: {e}")
+            aliases = {}
+        _cache[path] = (stamp, aliases)
+        return aliases
+
+
+def resolve_collection(db_path: Path, alias: str) -> str:
+    """Physical collection a logical name currently points to (itself if unaliased)."""
+    return load_aliases(db_path).get(alias, alias)
+
+
+def set_alias(db_path: Path, alias: str, collection_name: str) -> Optional[str]:
+    """
+    Atomically point `alias` at `collection_name`.
+
+    Returns:
+        The collection the alias pointed to before, if any
+    """
+    path = aliases_path(db_path)
+    with _lock:
+        try:
+            aliases = json.loads(path.read_text())
+        except FileNotFoundError:
+            aliases = {}
+        previous = aliases.get(alias)
+        aliases[alias] = collection_name
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(aliases, f, indent=2, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        _cache.pop(path, None)
+    return previous
+
+
+def clear_alias_cache() -> None:
+    """Forget cached mappings (after the DB directory was replaced)."""
+    with _lock:
+        _cache.clear()
@@ -0,0 +1,284 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Compact Local Vector Store.
+
+Chroma keeps float32 vectors plus an HNSW graph. For a local read-only index
+the same vectors can be kept as float16 (half the size) or int8 with a
+per-vector scale (about a quarter) and searched exactly with one matrix
+product. Stores are exported from a Chroma collection and saved next to it
+in `chroma_db/compact/`.
+"""
+
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .collection_aliases import resolve_collection
+
+logger = logging.getLogger(__name__)
+
+COMPACT_DTYPES = ("float32", "float16", "int8")
+
+# Subdirectory of the Chroma DB directory holding exported stores
+COMPACT_DIR_NAME = "compact"
+
+# Stored rows upcast to float32 at a time while scoring
+_SCORE_BLOCK_ROWS = 4096
+
+
+def _normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+class CompactVectorStore:
+    """
+    Exact cosine search over quantized unit-length vectors.
+
+    `query` returns results in the same shape as `chromadb` collection
+    queries (`ids`, `documents`, `metadatas`, `distances`), with cosine
+    distance (1 - similarity).
+    """
+
+    def __init__(
+        self,
+        ids: List[str],
+        documents: List[str],
+        metadatas: List[dict],
+        vectors: np.ndarray,
+        dtype: str = "float16",
+        scales: Optional[np.ndarray] = None,
+    ):
+        """
+        Args:
+            ids: Chunk IDs
+            documents: Chunk texts
+            metadatas: Chunk metadata
+            vectors: Vectors already stored in `dtype` (use `from_vectors` to quantize)
+            dtype: "float32", "float16" or "int8"
+            scales: Per-vector scales for int8 storage
+        """
+        if dtype not in COMPACT_DTYPES:
+            raise ValueError(f"Unsupported compact dtype {dtype!r}; use one of {COMPACT_DTYPES}")
+        self.ids = list(ids)
+        self.documents = list(documents)
+        self.metadatas = list(metadatas)
+        self.vectors = vectors
+        self.dtype = dtype
+        self.scales = scales
+
+    @classmethod
+    def from_vectors(
+        cls,
+        ids: List[str],
+        documents: List[str],
+        metadatas: List[dict],
+        vectors: Any,
+        dtype: str = "float16",
+        dimensionality: Optional[int] = None,
+    ) -> "CompactVectorStore":
+        """
+        Quantize float vectors into a store.
+
+        Args:
+            ids: Chunk IDs
+            documents: Chunk texts
+            metadatas: Chunk metadata
+            vectors: 2-D array-like of float vectors
+            dtype: Storage type ("float32", "float16" or "int8")
+            dimensionality: Optional Matryoshka truncation applied before quantizing
+        """
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if dimensionality:
+            matrix = matrix[:, :dimensionality]
+        matrix = _normalize_rows(matrix)
+
+        scales = None
+        if dtype == "int8":
+            # Symmetric per-vector scale so every row uses the full int8 range
+            scales = np.abs(matrix).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            stored = np.round(matrix / scales[:, None]).astype(np.int8)
+        else:
+            stored = matrix.astype(np.dtype(dtype))
+        return cls(ids, documents, metadatas, stored, dtype, scales)
+
+    @classmethod
+    def from_collection(cls, collection: Any, dtype: str = "float16", dimensionality: Optional[int] = None):
+        """Export every vector of a Chroma collection into a compact store."""
+        data = collection.get(include=["embeddings", "documents", "metadatas"])
+        return cls.from_vectors(
+            data["ids"],
+            data["documents"],
+            data["metadatas"] or [{} for _ in data["ids"]],
+            data["embeddings"],
+            dtype,
+            dimensionality,
+        )
+
+    @property
+    def dimensionality(self) -> int:
+        return self.vectors.shape[1] if self.vectors.ndim == 2 else 0
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the vectors (and int8 scales)."""
+        return self.vectors.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def scores(self, query_embeddings: Any) -> np.ndarray:
+        """Cosine similarities of each query (rows) against every stored vector (columns)."""
+        queries = _normalize_rows(np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32)))
+        queries = queries[:, :self.dimensionality]
+        similarities = np.empty((len(queries), len(self)), dtype=np.float32)
+        for start in range(0, len(self), _SCORE_BLOCK_ROWS):
+            block = self.vectors[start:start + _SCORE_BLOCK_ROWS].astype(np.float32)
+            similarities[:, start:start + len(block)] = queries @ block.T
+        if self.scales is not None:
+            similarities *= self.scales[None, :]
+        return similarities
+
+    def query(self, query_embeddings: Any, n_results: int = 5) -> Dict[str, list]:
+        """
+        Find the nearest stored vectors for each query.
+
+        Args:
+            query_embeddings: One query vector or a list of them
+            n_results: Results per query
+
+        Returns:
+            Chroma-style result dict with one list per query
+        """
+        similarities = self.scores(query_embeddings)
+        n_results = min(n_results, len(self))
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for row in similarities:
+            top = np.argpartition(-row, n_results - 1)[:n_results] if n_results else np.array([], dtype=int)
+            top = top[np.argsort(-row[top])]
+            result["ids"].append([self.ids[i] for i in top])
+            result["documents"].append([self.documents[i] for i in top])
+            result["metadatas"].append([self.metadatas[i] for i in top])
+            result["distances"].append([float(1.0 - row[i]) for i in top])
+        return result
+
+    def save(self, path: Path) -> None:
+        """Write the store to a `.npz` file."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Text is stored as UTF-8 JSON (numpy string arrays pad every entry to the longest)
+        records = json.dumps({"ids": self.ids, "documents": self.documents, "metadatas": self.metadatas})
+        np.savez_compressed(
+            path,
+            vectors=self.vectors,
+            scales=self.scales if self.scales is not None else np.array([], dtype=np.float32),
+            records=np.frombuffer(records.encode("utf-8"), dtype=np.uint8),
+            dtype=np.array(self.dtype),
+        )
+
+    @classmethod
+    def load(cls, path: Path) -> "CompactVectorStore":
+        """Read a store written by `save`."""
+        with np.load(path) as data:
+            records = json.loads(data["records"].tobytes().decode("utf-8"))
+            scales = data["scales"]
+            return cls(
+                records["ids"],
+                records["documents"],
+                records["metadatas"],
+                data["vectors"],
+                str(data["dtype"]),
+                scales if scales.size else None,
+            )
+
+
+def get_compact_dtype() -> Optional[str]:
+    """Get the compact store type queries should use from COMPACT_STORE_DTYPE (unset: query Chroma)."""
+    dtype = os.getenv("COMPACT_STORE_DTYPE", "").strip().lower()
+    return dtype if dtype in COMPACT_DTYPES else None
+
+
+def compact_store_path(db_path: Path, collection_name: str, dtype: str) -> Path:
+    """Location of an exported store inside the Chroma DB directory."""
+    return Path(db_path) / COMPACT_DIR_NAME / f"{collection_name}.{dtype}.npz"
+
+
+_loaded_stores: Dict[Path, CompactVectorStore] = {}
+_loaded_lock = threading.Lock()
+
+
+def get_compact_store(db_path: Path, collection_name: str, dtype: str) -> Optional[CompactVectorStore]:
+    """
+    Load an exported store once per process.
+
+    Returns:
+        The store, or None if it has not been exported
+    """
+    path = compact_store_path(db_path, collection_name, dtype)
+    with _loaded_lock:
+        store = _loaded_stores.get(path)
+        if store is None and path.exists():
+            try:
+                store = _loaded_stores[path] = CompactVectorStore.load(path)
+            except Exception as e:
+                logger.warning(f"Could not load compact store {path}: {e}")
+        return store
+
+
+def clear_compact_stores() -> None:
+    """Forget loaded stores (after a rebuild or re-export)."""
+    with _loaded_lock:
+        _loaded_stores.clear()
+
+
+def export_compact_stores(client: Any, db_path: Path, collection_names: List[str], dtype: str) -> Dict[str, int]:
+    """
+    Export Chroma collections to compact stores in `chroma_db/compact/`.
+
+    Stores are named after the physical collection an alias points to, so a
+    later rebuild (a new version) never serves a stale export. A sync changes
+    the live version in place; it re-exports that version's existing stores
+    (`chroma_setup.refresh_compact_stores`).
+
+    Args:
+        client: Chroma client
+        db_path: Chroma DB directory
+        collection_names: Logical collections to export
+        dtype: Storage type ("float32", "float16" or "int8")
+
+    Returns:
+        Dictionary of vector bytes per exported collection
+    """
+    sizes = {}
+    for collection_name in collection_names:
+        physical_name = resolve_collection(db_path, collection_name)
+        try:
+            store = CompactVectorStore.from_collection(client.get_collection(physical_name), dtype)
+        except Exception as e:
+            print(f"Could not export '{collection_name}': {e}")
+            continue
+        store.save(compact_store_path(db_path, physical_name, dtype))
+        sizes[collection_name] = store.nbytes
+        print(f"Exported '{collection_name}': {len(store)} vectors, {store.nbytes / 1024 / 1024:.1f} MB as {dtype}")
+    clear_compact_stores()
+    return sizes
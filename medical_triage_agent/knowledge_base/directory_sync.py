@@ -0,0 +1,195 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Parallel Delta Sync Between a Local Directory and Object Storage.
+
+Used when the Chroma DB is persisted as a directory rather than a snapshot.
+Local files are checksummed (md5, plus crc32c for composite blobs) and
+compared with the blob listing, so only files that differ are transferred;
+transfers run on a thread pool. Unchanged SQLite and HNSW segment files are
+never re-uploaded or re-downloaded.
+"""
+
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from .object_store import BlobInfo, ObjectStore, file_checksums, same_content
+
+logger = logging.getLogger(__name__)
+
+# Concurrent transfers (and local checksum computations)
+DEFAULT_SYNC_WORKERS = 16
+
+# Chroma's SQLite catalog references the segment files, so it goes last on
+# upload and readers never see a catalog pointing at missing segments
+_CATALOG_FILE = "chroma.sqlite3"
+
+
+def get_sync_workers() -> int:
+    """Get the transfer parallelism from CHROMA_SYNC_WORKERS (default 16)."""
+    try:
+        return max(1, int(os.getenv("CHROMA_SYNC_WORKERS", DEFAULT_SYNC_WORKERS)))
+    except ValueError:
+        return DEFAULT_SYNC_WORKERS
+
+
+@dataclass
+class SyncStats:
+    """Outcome of one sync."""
+
+    transferred: int = 0
+    unchanged: int = 0
+    deleted: int = 0
+    bytes_transferred: int = 0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def _syncable(relative_path: str) -> bool:
+    # SQLite journals and half-written temp files are never synced
+    return not (relative_path.endswith("-journal") or relative_path.endswith(".tmp"))
+
+
+def _local_checksums(local_dir: Path, workers: int) -> Dict[str, BlobInfo]:
+    """Checksums of every syncable file under `local_dir`, keyed by relative posix path."""
+    paths = [
+        path for path in local_dir.rglob("*")
+        if path.is_file() and _syncable(path.relative_to(local_dir).as_posix())
+    ]
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="checksum") as pool:
+        checksums = pool.map(file_checksums, paths)
+    return {path.relative_to(local_dir).as_posix(): info for path, info in zip(paths, checksums)}
+
+
+def _catalog_last(names: List[str]) -> List[List[str]]:
+    """Split transfers into (segment files, catalog) phases."""
+    return [
+        [name for name in names if not name.endswith(_CATALOG_FILE)],
+        [name for name in names if name.endswith(_CATALOG_FILE)],
+    ]
+
+
+def upload_directory(
+    store: ObjectStore,
+    local_dir: Path,
+    prefix: str,
+    workers: Optional[int] = None,
+    delete: bool = True,
+) -> SyncStats:
+    """
+    Upload the files of `local_dir` that differ from the blobs under `prefix`.
+
+    Args:
+        store: Destination object store
+        local_dir: Local directory to upload
+        prefix: Blob name prefix ending in "/" (e.g. "chroma_db/")
+        workers: Concurrent uploads. If None, uses CHROMA_SYNC_WORKERS
+        delete: If True, delete blobs under `prefix` with no local counterpart
+
+    Returns:
+        SyncStats for the upload
+    """
+    workers = workers or get_sync_workers()
+    local = _local_checksums(local_dir, workers)
+    remote = {name[len(prefix):]: info for name, info in store.list_blobs(prefix).items()}
+
+    stats = SyncStats()
+    changed = []
+    for relative_path, info in local.items():
+        if relative_path in remote and same_content(info, remote[relative_path]):
+            stats.unchanged += 1
+        else:
+            changed.append(relative_path)
+
+    def upload(relative_path: str) -> None:
+        store.upload_file(prefix + relative_path, local_dir / relative_path)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="upload") as pool:
+        for phase in _catalog_last(changed):
+            list(pool.map(upload, phase))
+        stats.transferred = len(changed)
+        stats.bytes_transferred = sum(local[relative_path].size for relative_path in changed)
+
+        if delete:
+            stale = [relative_path for relative_path in remote if relative_path not in local and _syncable(relative_path)]
+            list(pool.map(lambda relative_path: store.delete(prefix + relative_path), stale))
+            stats.deleted = len(stale)
+
+    return stats
+
+
+def download_directory(
+    store: ObjectStore,
+    prefix: str,
+    local_dir: Path,
+    workers: Optional[int] = None,
+    delete: bool = True,
+) -> SyncStats:
+    """
+    Download the blobs under `prefix` that differ from the files in `local_dir`.
+
+    Each file is downloaded to a temporary name and renamed into place.
+
+    Args:
+        store: Source object store
+        prefix: Blob name prefix ending in "/" (e.g. "chroma_db/")
+        local_dir: Local directory to update
+        workers: Concurrent downloads. If None, uses CHROMA_SYNC_WORKERS
+        delete: If True, delete local files with no blob counterpart
+
+    Returns:
+        SyncStats for the download
+    """
+    workers = workers or get_sync_workers()
+    remote = {
+        name[len(prefix):]: info
+        for name, info in store.list_blobs(prefix).items()
+        if name[len(prefix):] and not name.endswith("/") and _syncable(name[len(prefix):])
+    }
+    local_dir.mkdir(parents=True, exist_ok=True)
+    local = _local_checksums(local_dir, workers)
+
+    stats = SyncStats()
+    changed = []
+    for relative_path, info in remote.items():
+        if relative_path in local and same_content(local[relative_path], info):
+            stats.unchanged += 1
+        else:
+            changed.append(relative_path)
+
+    def download(relative_path: str) -> None:
+        target = local_dir / relative_path
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = target.with_name(target.name + ".tmp")
+        store.download_file(prefix + relative_path, tmp_path)
+        os.replace(tmp_path, target)
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="download") as pool:
+        list(pool.map(download, changed))
+    stats.transferred = len(changed)
+    stats.bytes_transferred = sum(remote[relative_path].size for relative_path in changed)
+
+    if delete:
+        for relative_path in local:
+            if relative_path not in remote:
+                (local_dir / relative_path).unlink(missing_ok=True)
+                stats.deleted += 1
+
+    return stats
@@ -0,0 +1,333 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Pluggable Embedding Backends.
+
+Ingestion (`generate_embeddings`) and queries (`query_knowledge_base`) embed
+text through the same `EmbeddingBackend`. EMBEDDING_BACKEND selects it:
+- `vertex` (default): gemini-embedding-001 on Vertex AI, via `EmbeddingEngine`
+- `hashing`: deterministic feature hashing; needs no network or model, for
+  tests and offline benchmarks
+- `sentence-transformers`: a local CPU model (optional dependency)
+
+Every collection records the backend, model and dimensionality it was built
+with (see `identity`). Queries compare that with the active backend, so a
+mismatch is reported instead of silently returning meaningless neighbours.
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .batch_packer import estimate_tokens
+from .embedding_engine import (
+    EMBEDDING_MODEL,
+    EMBEDDING_TASK_TYPE,
+    FULL_EMBEDDING_DIMENSIONALITY,
+    EmbeddingBudget,
+    EmbeddingEngine,
+    EmbeddingStats,
+    get_embedding_dimensionality,
+    truncate_embedding,
+)
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_BACKENDS = ("vertex", "hashing", "sentence-transformers")
+DEFAULT_EMBEDDING_BACKEND = "vertex"
+
+# Vector size of the hashing backend unless EMBEDDING_DIMENSIONALITY is set
+DEFAULT_HASHING_DIMENSIONALITY = 512
+
+# Local model: multilingual, since the guidelines are mostly Indonesian
+DEFAULT_LOCAL_MODEL = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+
+
+class EmbeddingBackend:
+    """
+    Embeds documents (ingestion) and queries with one model.
+
+    Attributes:
+        name: Backend name (one of EMBEDDING_BACKENDS)
+        model: Model identifier recorded in collections, manifests and the cache
+        task_type: Task type recorded with cached vectors
+        dimensionality: Size of the returned vectors
+        output_dimensionality: Requested reduced size, or None for the model's own size
+        cacheable: Whether vectors are worth keeping in the embedding cache
+        supports_truncation: Whether a prefix of a larger vector is a valid smaller one
+    """
+
+    name = ""
+    cacheable = True
+    supports_truncation = False
+
+    def __init__(self, model: str, task_type: str, dimensionality: int, output_dimensionality: Optional[int] = None):
+        self.model = model
+        self.task_type = task_type
+        self.dimensionality = dimensionality
+        self.output_dimensionality = output_dimensionality
+
+    @property
+    def identity(self) -> dict:
+        """Embedding settings recorded as collection metadata."""
+        return {
+            "embedding_backend": self.name,
+            "embedding_model": self.model,
+            "embedding_dimensionality": self.dimensionality,
+        }
+
+    def describe(self) -> str:
+        return f"{self.name}/{self.model} ({self.dimensionality}-dim)"
+
+    def embed_documents(
+        self,
+        texts: List[str],
+        max_in_flight: Optional[int] = None,
+        budget: Optional[EmbeddingBudget] = None,
+        on_event: Optional[Callable[[dict], None]] = None,
+    ) -> Tuple[List[List[float]], EmbeddingStats]:
+        """
+        Embed texts for indexing.
+
+        Args:
+            texts: Texts to embed
+            max_in_flight: Maximum concurrent requests (remote backends)
+            budget: Request budget shared with concurrent callers (remote backends)
+            on_event: Optional callback receiving structured batch events
+
+        Returns:
+            (vectors in input order, empty for texts that could not be embedded;
+            `EmbeddingStats` of this call). The backend is shared by concurrent
+            ingestions, so the stats are returned rather than kept on it.
+        """
+        stats = EmbeddingStats(total_chunks=len(texts))
+        vectors = self._embed(texts) if texts else []
+        stats.embedded_chunks = len(vectors)
+        stats.requests = 1 if texts else 0
+        stats.finished_at = time.monotonic()
+        if texts and on_event is not None:
+            on_event({
+                "event": "embedding_batch_complete",
+                "chunk_start": 0,
+                "chunk_end": len(texts),
+                "batch_size": len(texts),
+                "estimated_tokens": sum(estimate_tokens(text) for text in texts),
+                "attempt": 0,
+                "latency_ms": round(stats.elapsed * 1000, 1),
+                "successful_embeddings": len(vectors),
+            })
+        return vectors, stats
+
+    def embed_query(self, text: str) -> List[float]:
+        """Embed one search query."""
+        return self._embed([text])[0]
+
+    async def embed_query_async(self, text: str) -> List[float]:
+        """Embed one search query without blocking the event loop (local backends run in a thread)."""
+        return await asyncio.get_running_loop().run_in_executor(None, self.embed_query, text)
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        raise NotImplementedError
+
+
+class VertexEmbeddingBackend(EmbeddingBackend):
+    """gemini-embedding-001 on Vertex AI (optionally Matryoshka-truncated)."""
+
+    name = "vertex"
+    supports_truncation = True
+
+    def __init__(self, model: str = EMBEDDING_MODEL, task_type: str = EMBEDDING_TASK_TYPE, output_dimensionality: Optional[int] = None):
+        super().__init__(model, task_type, output_dimensionality or FULL_EMBEDDING_DIMENSIONALITY, output_dimensionality)
+
+    def client(self) -> Any:
+        """The process-wide pooled `genai.Client` (see genai_client)."""
+        from ..genai_client import get_genai_client
+
+        return get_genai_client()
+
+    def embed_documents(self, texts, max_in_flight=None, budget=None, on_event=None):
+        # Pack requests by estimated tokens to stay under the 2,048 token limit per request
+        engine = EmbeddingEngine(
+            self.client(),
+            model=self.model,
+            task_type=self.task_type,
+            max_in_flight=max_in_flight,
+            on_event=on_event,
+            budget=budget,
+            output_dimensionality=self.output_dimensionality,
+        )
+        print(
+            f"Processing {len(texts)} chunks in requests of up to ~{engine.max_request_tokens} tokens "
+            f"({engine.max_in_flight} requests in flight)..."
+        )
+        vectors = engine.embed(texts)
+        return vectors, engine.stats
+
+    def _config(self) -> Any:
+        from google.genai import types
+
+        # Output size must match the one the collections were built with
+        return types.EmbedContentConfig(task_type=self.task_type, output_dimensionality=self.output_dimensionality)
+
+    def _vectors(self, response: Any) -> List[List[float]]:
+        embeddings = getattr(response, "embeddings", None) or []
+        return [
+            truncate_embedding(list(e.values), self.output_dimensionality) if getattr(e, "values", None) else []
+            for e in embeddings
+        ]
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        response = self.client().models.embed_content(model=self.model, contents=texts, config=self._config())
+        return self._vectors(response)
+
+    def embed_query(self, text: str) -> List[float]:
+        vectors = self._embed([text])
+        return vectors[0] if vectors else []
+
+    async def embed_query_async(self, text: str) -> List[float]:
+        from ..genai_client import get_async_genai_client
+
+        response = await get_async_genai_client().models.embed_content(
+            model=self.model, contents=[text], config=self._config()
+        )
+        vectors = self._vectors(response)
+        return vectors[0] if vectors else []
+
+
+class HashingEmbeddingBackend(EmbeddingBackend):
+    """
+    Deterministic feature-hashing embedder.
+
+    Lowercased words and their character trigrams are hashed into signed
+    buckets, and the result is L2-normalized. Texts are close when they share
+    vocabulary. That is enough to test and benchmark the retrieval plumbing
+    offline, but it is not a semantic model.
+    """
+
+    name = "hashing"
+    cacheable = False
+
+    def __init__(self, dimensionality: Optional[int] = None):
+        dimensionality = dimensionality or DEFAULT_HASHING_DIMENSIONALITY
+        super().__init__("hashing-v1", "", dimensionality, dimensionality)
+
+    def _vector(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensionality, dtype=np.float32)
+        words = re.findall(r"\w+", text.lower())
+        features = words + [f"#{word[i:i + 3]}" for word in words if len(word) > 3 for i in range(len(word) - 2)]
+        for feature in features:
+            value = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+            vector[value % self.dimensionality] += 1.0 if value >> 63 else -1.0
+        norm = float(np.linalg.norm(vector))
+        return (vector / norm if norm else vector).tolist()
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        return [self._vector(text) for text in texts]
+
+
+class SentenceTransformerBackend(EmbeddingBackend):
+    """Local CPU embedding model via the optional `sentence-transformers` package."""
+
+    name = "sentence-transformers"
+
+    def __init__(self, model: Optional[str] = None):
+        try:
+            from sentence_transformers import SentenceTransformer
+        except ImportError as e:
+            raise ImportError(
+                "EMBEDDING_BACKEND=sentence-transformers needs the optional sentence-transformers package "
+                "(pip install 'medical-triage-agent[local-embeddings]')"
+            ) from e
+        model = model or DEFAULT_LOCAL_MODEL
+        self._model = SentenceTransformer(model, device="cpu")
+        super().__init__(model, "", self._model.get_sentence_embedding_dimension())
+
+    def _embed(self, texts: List[str]) -> List[List[float]]:
+        # Unit length, like the other backends
+        return self._model.encode(texts, batch_size=32, normalize_embeddings=True, convert_to_numpy=True).tolist()
+
+
+def get_embedding_backend_name() -> str:
+    """Get the backend from EMBEDDING_BACKEND (default "vertex")."""
+    name = os.getenv("EMBEDDING_BACKEND", DEFAULT_EMBEDDING_BACKEND).strip().lower() or DEFAULT_EMBEDDING_BACKEND
+    if name not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND {name!r}; use one of {EMBEDDING_BACKENDS}")
+    return name
+
+
+_backends: Dict[tuple, EmbeddingBackend] = {}
+_backends_lock = threading.Lock()
+
+
+def get_embedding_backend(name: Optional[str] = None) -> EmbeddingBackend:
+    """
+    Get the configured embedding backend (one instance per configuration per process).
+
+    Args:
+        name: Backend name. If None, uses EMBEDDING_BACKEND
+
+    Returns:
+        The backend
+    """
+    name = name or get_embedding_backend_name()
+    dimensionality = get_embedding_dimensionality()
+    local_model = os.getenv("EMBEDDING_LOCAL_MODEL") or None
+    key = (name, dimensionality, local_model)
+    with _backends_lock:
+        backend = _backends.get(key)
+        if backend is None:
+            if name == "hashing":
+                backend = HashingEmbeddingBackend(dimensionality)
+            elif name == "sentence-transformers":
+                backend = SentenceTransformerBackend(local_model)
+            else:
+                backend = VertexEmbeddingBackend(output_dimensionality=dimensionality)
+            _backends[key] = backend
+        return backend
+
+
+def backend_mismatch(collection_metadata: Optional[dict], backend: EmbeddingBackend) -> Optional[str]:
+    """
+    Compare the embedding settings a collection was built with against a backend.
+
+    Collections without these keys predate them and were built by Vertex AI
+    with gemini-embedding-001 at full size.
+
+    Args:
+        collection_metadata: Chroma collection metadata
+        backend: Backend that will embed queries or new chunks
+
+    Returns:
+        A description of the mismatch, or None if the vectors are compatible
+    """
+    metadata = collection_metadata or {}
+    indexed = {
+        "embedding_backend": metadata.get("embedding_backend", "vertex"),
+        "embedding_model": metadata.get("embedding_model", EMBEDDING_MODEL),
+        "embedding_dimensionality": metadata.get("embedding_dimensionality", FULL_EMBEDDING_DIMENSIONALITY),
+    }
+    if indexed == backend.identity:
+        return None
+    return (
+        f"indexed with {indexed['embedding_backend']}/{indexed['embedding_model']} "
+        f"({indexed['embedding_dimensionality']}-dim) but the active embedding backend is {backend.describe()}"
+    )
@@ -0,0 +1,262 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Content-Addressed Embedding Cache.
+
+Embeddings are stored in a SQLite file next to the Chroma DB directory,
+keyed by (md5(chunk), model, task_type, dimensionality). A rebuild after a
+chunker tweak only pays for the chunks whose text actually changed.
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Default cache location: sibling of chroma_db/ so it is never uploaded with the DB
+DEFAULT_CACHE_PATH = Path(__file__).parent.parent.parent / "embedding_cache.sqlite3"
+
+# Default size bound for stored vectors (bytes)
+DEFAULT_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+
+def chunk_hash(text: str) -> str:
+    """Content hash used for chunk IDs and cache keys."""
+    return hashlib.md5(text.encode()).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Persistent embedding cache backed by SQLite.
+
+    Vectors are stored as packed float32. When the stored vectors exceed
+    `max_bytes`, the least recently used entries are evicted down to 90% of
+    the bound. Hit/miss counters cover the lifetime of the instance.
+    """
+
+    def __init__(self, path: Path, max_bytes: int = DEFAULT_CACHE_MAX_BYTES):
+        """
+        Args:
+            path: SQLite file path
+            max_bytes: Upper bound on stored vector bytes before LRU eviction
+        """
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                content_hash TEXT NOT NULL,
+                model TEXT NOT NULL,
+                task_type TEXT NOT NULL,
+                dimensionality INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (content_hash, model, task_type, dimensionality)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()[0]
+
+    def get_many(
+        self,
+        hashes: Iterable[str],
+        model: str,
+        task_type: str,
+        dimensionality: Optional[int] = None,
+    ) -> Dict[str, List[float]]:
+        """
+        Look up cached vectors.
+
+        Args:
+            hashes: Content hashes to look up
+            model: Embedding model name
+            task_type: Embedding task type
+            dimensionality: Output dimensionality (None for the model default)
+
+        Returns:
+            Mapping of content hash to vector for every hit
+        """
+        unique = list(dict.fromkeys(hashes))
+        found: Dict[str, List[float]] = {}
+        dim = dimensionality or 0
+
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit
+            for i in range(0, len(unique), 500):
+                part = unique[i:i + 500]
+                placeholders = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT content_hash, vector FROM embeddings "
+                    f"WHERE model = ? AND task_type = ? AND dimensionality = ? "
+                    f"AND content_hash IN ({placeholders})",
+                    (model, task_type, dim, *part),
+                ).fetchall()
+                for content_hash, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[content_hash] = vector.tolist()
+
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE content_hash = ? "
+                    "AND model = ? AND task_type = ? AND dimensionality = ?",
+                    [(now, h, model, task_type, dim) for h in found],
+                )
+                self._conn.commit()
+
+            self.hits += len(found)
+            self.misses += len(unique) - len(found)
+
+        return found
+
+    def put_many(
+        self,
+        items: Iterable[Tuple[str, List[float]]],
+        model: str,
+        task_type: str,
+        dimensionality: Optional[int] = None,
+    ) -> None:
+        """
+        Store vectors, evicting least recently used entries if over the size bound.
+
+        Args:
+            items: (content hash, vector) pairs; empty vectors are skipped
+            model: Embedding model name
+            task_type: Embedding task type
+            dimensionality: Output dimensionality (None for the model default)
+        """
+        now = time.time()
+        dim = dimensionality or 0
+        # One row per hash (the last vector wins, as with INSERT OR REPLACE)
+        blobs = {h: array("f", vector).tobytes() for h, vector in items if vector}
+        if not blobs:
+            return
+        rows = [(h, model, task_type, dim, blob, now) for h, blob in blobs.items()]
+
+        with self._lock:
+            # The size total is kept incrementally: replaced rows' sizes are
+            # subtracted, so no full-table scan is needed per batch
+            replaced = 0
+            hashes = list(blobs)
+            for i in range(0, len(hashes), 500):
+                part = hashes[i:i + 500]
+                placeholders = ",".join("?" * len(part))
+                replaced += self._conn.execute(
+                    f"SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings "
+                    f"WHERE model = ? AND task_type = ? AND dimensionality = ? "
+                    f"AND content_hash IN ({placeholders})",
+                    (model, task_type, dim, *part),
+                ).fetchone()[0]
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings "
+                "(content_hash, model, task_type, dimensionality, vector, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+            self._total_bytes += sum(len(blob) for blob in blobs.values()) - replaced
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        """Drop least recently used rows until the cache is at 90% of max_bytes."""
+        target = int(self.max_bytes * 0.9)
+        rows = self._conn.execute(
+            "SELECT rowid, LENGTH(vector) FROM embeddings ORDER BY last_used ASC"
+        ).fetchall()
+
+        to_delete = []
+        total = self._total_bytes
+        for rowid, size in rows:
+            if total <= target:
+                break
+            to_delete.append((rowid,))
+            total -= size
+
+        self._conn.executemany("DELETE FROM embeddings WHERE rowid = ?", to_delete)
+        self._conn.commit()
+        self._total_bytes = total
+        self.evictions += len(to_delete)
+        logger.info(f"Embedding cache evicted {len(to_delete)} entries ({total} bytes remain)")
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and current size."""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "evictions": self.evictions,
+                "entries": entries,
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """
+    Get the process-wide embedding cache.
+
+    Configured with EMBEDDING_CACHE_PATH (set to an empty string to disable)
+    and EMBEDDING_CACHE_MAX_MB.
+
+    Returns:
+        EmbeddingCache instance, or None if disabled or unavailable
+    """
+    global _cache
+    path = os.getenv("EMBEDDING_CACHE_PATH", str(DEFAULT_CACHE_PATH))
+    if not path:
+        return None
+
+    with _cache_lock:
+        if _cache is None or _cache.path != Path(path):
+            try:
+                max_mb = int(os.getenv("EMBEDDING_CACHE_MAX_MB", DEFAULT_CACHE_MAX_BYTES // (1024 * 1024)))
+                _cache = EmbeddingCache(Path(path), max_bytes=max_mb * 1024 * 1024)
+            except Exception as e:
+                logger.warning(f"Embedding cache unavailable at {path}: {e}")
+                return None
+        return _cache
@@ -0,0 +1,441 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Concurrent Embedding Engine for Knowledge Base Ingestion.
+
+This module keeps several `embed_content` requests in flight at once
+instead of waiting on one batch at a time:
+- Bounded concurrency (N requests in flight)
+- Adaptive backoff on 429 / 5xx responses (the in-flight limit is halved
+  on throttling and grows back slowly on success)
+- Failed batches are re-queued instead of being replaced by empty vectors
+- Throughput reporting (chunks/sec)
+- Optional reduced output dimensionality (Matryoshka truncation)
+"""
+
+import heapq
+import logging
+import math
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, List, Optional
+
+from google.genai import types
+
+from .batch_packer import DEFAULT_MAX_BATCH_ITEMS, estimate_tokens, get_max_request_tokens, pack_batches
+
+logger = logging.getLogger(__name__)
+
+# Embedding model used for both ingestion and query
+EMBEDDING_MODEL = "gemini-embedding-001"
+EMBEDDING_TASK_TYPE = "SEMANTIC_SIMILARITY"
+
+# Full output size of gemini-embedding-001
+FULL_EMBEDDING_DIMENSIONALITY = 3072
+
+# Default number of embedding requests kept in flight
+DEFAULT_MAX_IN_FLIGHT = 4
+
+
+def get_max_in_flight() -> int:
+    """Get the embedding concurrency from EMBEDDING_MAX_IN_FLIGHT (default 4)."""
+    try:
+        return max(1, int(os.getenv("EMBEDDING_MAX_IN_FLIGHT", DEFAULT_MAX_IN_FLIGHT)))
+    except ValueError:
+        return DEFAULT_MAX_IN_FLIGHT
+
+
+def get_embedding_dimensionality() -> Optional[int]:
+    """
+    Get the embedding output size from EMBEDDING_DIMENSIONALITY (e.g. 768).
+
+    The same value must be used for ingestion and queries. Unset, invalid or
+    full-size values mean the model's full 3072 dimensions (returns None).
+    """
+    try:
+        dimensionality = int(os.getenv("EMBEDDING_DIMENSIONALITY", "0"))
+    except ValueError:
+        return None
+    if dimensionality <= 0 or dimensionality >= FULL_EMBEDDING_DIMENSIONALITY:
+        return None
+    return dimensionality
+
+
+def truncate_embedding(vector: List[float], dimensionality: Optional[int]) -> List[float]:
+    """
+    Reduce a vector to its first `dimensionality` components and re-normalize.
+
+    gemini-embedding-001 is trained Matryoshka-style, so a prefix of the full
+    vector is a valid smaller embedding; only the full 3072-dim output is
+    unit length, so reduced vectors are normalized here (Chroma's default L2
+    distance then ranks like cosine similarity).
+
+    Args:
+        vector: Embedding vector
+        dimensionality: Target size, or None to keep the full vector
+
+    Returns:
+        Truncated unit-length vector (the input unchanged if no truncation applies)
+    """
+    if not dimensionality or not vector:
+        return vector
+    prefix = vector[:dimensionality]
+    norm = math.sqrt(sum(value * value for value in prefix))
+    return [value / norm for value in prefix] if norm else prefix
+
+
+_RETRYABLE_MESSAGE = re.compile(r"\bRESOURCE_EXHAUSTED\b|\bUNAVAILABLE\b|\b429\b")
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """
+    Check whether an embedding error is transient (quota or server side).
+
+    Args:
+        error: Exception raised by the GenAI client
+
+    Returns:
+        True for 429 / 5xx style errors and network failures, False otherwise
+    """
+    # google-genai APIError carries `code`; raw HTTP errors carry `status_code`
+    for attribute in ("code", "status_code"):
+        code = getattr(error, attribute, None)
+        if isinstance(code, int) and not isinstance(code, bool):
+            return code == 429 or code == 408 or code >= 500
+
+    # Fallback for errors with no status: whole-word status text only, so
+    # "429" inside an ID, token count or byte size does not count
+    message = str(error)
+    if _RETRYABLE_MESSAGE.search(message):
+        return True
+
+    # Connection resets, timeouts, etc. carry no status code
+    return isinstance(error, (ConnectionError, TimeoutError, OSError))
+
+
+class EmbeddingBudget:
+    """
+    Shared cap on embedding requests in flight across concurrent engines.
+
+    When several collections are ingested at once, each engine acquires a
+    slot from the same budget before sending a request, so the total number
+    of concurrent requests against the quota stays bounded.
+    """
+
+    def __init__(self, capacity: Optional[int] = None):
+        """
+        Args:
+            capacity: Maximum concurrent requests. If None, uses EMBEDDING_MAX_IN_FLIGHT
+        """
+        self.capacity = capacity or get_max_in_flight()
+        self._semaphore = threading.BoundedSemaphore(self.capacity)
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        return self._semaphore.acquire(timeout=timeout)
+
+    def release(self) -> None:
+        self._semaphore.release()
+
+
+class EmbeddingStats:
+    """Counters collected during one `EmbeddingEngine.embed` run."""
+
+    def __init__(self, total_chunks: int = 0):
+        self.total_chunks = total_chunks
+        self.embedded_chunks = 0
+        self.failed_chunks = 0
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+        self.started_at = time.monotonic()
+        self.finished_at: Optional[float] = None
+
+    @property
+    def elapsed(self) -> float:
+        end = self.finished_at if self.finished_at is not None else time.monotonic()
+        return max(end - self.started_at, 1e-9)
+
+    @property
+    def chunks_per_sec(self) -> float:
+        return self.embedded_chunks / self.elapsed
+
+    def as_dict(self) -> dict:
+        return {
+            "total_chunks": self.total_chunks,
+            "embedded_chunks": self.embedded_chunks,
+            "failed_chunks": self.failed_chunks,
+            "requests": self.requests,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "elapsed_sec": round(self.elapsed, 3),
+            "chunks_per_sec": round(self.chunks_per_sec, 2),
+        }
+
+
+class _Batch:
+    """A packed request: indices into the input texts waiting to be embedded."""
+
+    __slots__ = ("indices", "texts", "attempt", "not_before", "submitted_at")
+
+    def __init__(self, indices: List[int], texts: List[str], attempt: int = 0, not_before: float = 0.0):
+        self.indices = indices
+        self.texts = texts
+        self.attempt = attempt
+        self.not_before = not_before
+        self.submitted_at = 0.0
+
+    def report(self) -> dict:
+        """Fields shared by this batch's events."""
+        return {
+            "chunk_start": self.indices[0],
+            "chunk_end": self.indices[-1] + 1,
+            "batch_size": len(self.texts),
+            "estimated_tokens": sum(estimate_tokens(text) for text in self.texts),
+            "attempt": self.attempt,
+            "latency_ms": round((time.monotonic() - self.submitted_at) * 1000, 1),
+        }
+
+
+class EmbeddingEngine:
+    """
+    Bounded-concurrency embedding engine with adaptive backoff.
+
+    Texts are packed into requests by estimated tokens (see `batch_packer`).
+    Batches are submitted to a thread pool while fewer than the current
+    in-flight limit are running. A throttled (429) or failed (5xx) batch is
+    pushed back onto the queue with exponential backoff and the in-flight
+    limit is halved; every run of successful requests grows it back by one.
+    Non-retryable errors on multi-chunk batches split the batch in half so a
+    single bad chunk cannot take its neighbours down with it.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        model: str = EMBEDDING_MODEL,
+        task_type: str = EMBEDDING_TASK_TYPE,
+        max_in_flight: Optional[int] = None,
+        max_request_tokens: Optional[int] = None,
+        max_batch_items: int = DEFAULT_MAX_BATCH_ITEMS,
+        max_retries: int = 8,
+        base_backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        on_event: Optional[Callable[[dict], None]] = None,
+        budget: Optional[EmbeddingBudget] = None,
+        output_dimensionality: Optional[int] = None,
+    ):
+        """
+        Args:
+            client: `genai.Client` used for `models.embed_content`
+            model: Embedding model name
+            task_type: Embedding task type
+            max_in_flight: Maximum concurrent requests. If None, uses EMBEDDING_MAX_IN_FLIGHT
+            max_request_tokens: Estimated token budget per request. If None, uses EMBEDDING_MAX_REQUEST_TOKENS
+            max_batch_items: Maximum texts per request
+            max_retries: Attempts per batch before its chunks are given up on
+            base_backoff: Initial backoff delay in seconds
+            max_backoff: Upper bound for the backoff delay in seconds
+            on_event: Optional callback receiving structured batch events
+            budget: Optional budget shared with other engines running concurrently
+            output_dimensionality: Reduced embedding size, or None for the full vector
+        """
+        self.client = client
+        self.model = model
+        self.task_type = task_type
+        self.max_in_flight = max_in_flight or get_max_in_flight()
+        self.max_request_tokens = max_request_tokens or get_max_request_tokens()
+        self.max_batch_items = max(1, max_batch_items)
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.on_event = on_event
+        self.budget = budget
+        self.output_dimensionality = output_dimensionality
+        # Oversized texts are sent alone and truncated server-side instead of failing
+        self.config = types.EmbedContentConfig(
+            task_type=task_type,
+            auto_truncate=True,
+            output_dimensionality=output_dimensionality,
+        )
+
+        # Adaptive concurrency state (only touched from the dispatching thread)
+        self._limit = self.max_in_flight
+        self._success_streak = 0
+        self._resume_at = 0.0
+
+    def _emit(self, event: dict) -> None:
+        if self.on_event is None:
+            return
+        try:
+            self.on_event(event)
+        except Exception:
+            pass  # Never let reporting break embedding
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        """Embed one batch with a single blocking request (runs in a worker thread)."""
+        response = self.client.models.embed_content(
+            model=self.model,
+            contents=texts,
+            config=self.config,
+        )
+        embeddings = getattr(response, "embeddings", None) or []
+        vectors = [
+            truncate_embedding(list(e.values), self.output_dimensionality) if getattr(e, "values", None) else []
+            for e in embeddings
+        ]
+        if len(vectors) != len(texts) or not all(vectors):
+            raise ValueError(
+                f"Embedding response returned {sum(1 for v in vectors if v)} vectors for {len(texts)} texts"
+            )
+        return vectors
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(self.max_backoff, self.base_backoff * (2 ** attempt))
+        # Full jitter keeps concurrent workers from retrying in lock-step
+        return delay * (0.5 + random.random() / 2)
+
+    def _on_success(self) -> None:
+        self._success_streak += 1
+        if self._limit < self.max_in_flight and self._success_streak >= self._limit:
+            self._limit += 1
+            self._success_streak = 0
+
+    def _on_throttle(self, delay: float) -> None:
+        self._limit = max(1, self._limit // 2)
+        self._success_streak = 0
+        self._resume_at = max(self._resume_at, time.monotonic() + delay)
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed texts, keeping up to `max_in_flight` requests running.
+
+        Args:
+            texts: List of texts to embed
+
+        Returns:
+            List of embedding vectors in input order. Chunks that still fail
+            after `max_retries` attempts get an empty vector.
+        """
+        self.stats = EmbeddingStats(total_chunks=len(texts))
+        results: List[List[float]] = [[] for _ in texts]
+        if not texts:
+            self.stats.finished_at = time.monotonic()
+            return results
+
+        # Heap of (not_before, sequence, batch) so retries wait their backoff
+        pending: list = []
+        sequence = 0
+        for indices in pack_batches(texts, self.max_request_tokens, self.max_batch_items):
+            heapq.heappush(pending, (0.0, sequence, _Batch(indices, [texts[i] for i in indices])))
+            sequence += 1
+
+        last_report = 0
+
+        with ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="embed") as pool:
+            in_flight = {}
+
+            while pending or in_flight:
+                now = time.monotonic()
+
+                # Submit ready batches up to the current (adaptive) limit
+                while (
+                    pending
+                    and len(in_flight) < self._limit
+                    and now >= self._resume_at
+                    and pending[0][0] <= now
+                ):
+                    if self.budget is not None and not self.budget.acquire(timeout=0 if in_flight else 0.05):
+                        break  # Other engines hold the shared budget
+                    _, _, batch = heapq.heappop(pending)
+                    batch.submitted_at = time.monotonic()
+                    future = pool.submit(self._embed_batch, batch.texts)
+                    if self.budget is not None:
+                        future.add_done_callback(lambda _: self.budget.release())
+                    in_flight[future] = batch
+                    self.stats.requests += 1
+
+                if not in_flight:
+                    # Everything is waiting on backoff
+                    next_ready = max(pending[0][0], self._resume_at)
+                    time.sleep(max(0.0, next_ready - time.monotonic()))
+                    continue
+
+                timeout = None
+                if pending:
+                    timeout = max(0.05, max(pending[0][0], self._resume_at) - time.monotonic())
+                done, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    batch = in_flight.pop(future)
+                    try:
+                        vectors = future.result()
+                    except Exception as e:
+                        retryable = is_retryable_error(e)
+                        self._emit({
+                            "event": "embedding_batch_error",
+                            **batch.report(),
+                            "retryable": retryable,
+                            "error": str(e),
+                        })
+
+                        if not retryable and len(batch.texts) > 1:
+                            # Split so one bad chunk does not sink the whole batch
+                            mid = len(batch.texts) // 2
+                            for part in (slice(None, mid), slice(mid, None)):
+                                half = _Batch(batch.indices[part], batch.texts[part], batch.attempt)
+                                heapq.heappush(pending, (0.0, sequence, half))
+                                sequence += 1
+                            continue
+
+                        if batch.attempt + 1 >= self.max_retries or not retryable:
+                            print(f"Giving up on chunks {batch.indices}: {e}")
+                            self.stats.failed_chunks += len(batch.texts)
+                            continue
+
+                        delay = self._backoff(batch.attempt)
+                        self._on_throttle(delay)
+                        self.stats.throttled += 1
+                        self.stats.retries += 1
+                        batch.attempt += 1
+                        batch.not_before = time.monotonic() + delay
+                        heapq.heappush(pending, (batch.not_before, sequence, batch))
+                        sequence += 1
+                        continue
+
+                    for i, vector in zip(batch.indices, vectors):
+                        results[i] = vector
+                    self.stats.embedded_chunks += len(vectors)
+                    self._on_success()
+                    self._emit({
+                        "event": "embedding_batch_complete",
+                        **batch.report(),
+                        "successful_embeddings": len(vectors),
+                    })
+
+                processed = self.stats.embedded_chunks + self.stats.failed_chunks
+                if processed - last_report >= 100 or (processed == len(texts) and processed != last_report):
+                    last_report = processed
+                    progress_pct = 100 * processed // len(texts)
+                    print(
+                        f"  Progress: {processed}/{len(texts)} chunks ({progress_pct}%), "
+                        f"{self.stats.chunks_per_sec:.1f} chunks/sec, in-flight limit {self._limit}"
+                    )
+
+        self.stats.finished_at = time.monotonic()
+        return results
@@ -0,0 +1,147 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Durable Ingestion Manifests.
+
+Each collection has a small JSON manifest inside the Chroma DB directory
+recording what it was built from (source file hash, chunker parameters,
+embedding model and dimensionality) and how far the build got (last
+committed window). The manifest is rewritten atomically after every
+committed window, so an interrupted run can resume where it stopped, and a
+half-built collection is never mistaken for a finished one. Manifests
+travel with the DB when it is uploaded to Cloud Storage.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+from dataclasses import asdict, dataclass, field, fields
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Subdirectory of the Chroma DB directory holding one manifest per collection
+MANIFEST_DIR_NAME = "ingest_manifests"
+
+STATUS_IN_PROGRESS = "in_progress"
+STATUS_COMPLETE = "complete"
+
+
+@dataclass
+class IngestManifest:
+    """Build parameters and progress of one collection."""
+
+    collection: str
+    source: str
+    source_hash: str
+    chunk_size: int
+    chunk_overlap: int
+    embedding_model: str
+    task_type: str
+    chunker: str = "fixed"
+    retrieval: str = "chunk"  # "parent": child chunks are indexed, parent sections returned
+    dimensionality: Optional[int] = None  # None = full model output
+    cleaner: Optional[str] = None  # chunk_cleaner version, None = uncleaned text
+    status: str = STATUS_IN_PROGRESS
+    last_committed_batch: int = -1  # Index of the last window written to Chroma
+    next_chunk_index: int = 0  # First chunk not yet written
+    committed_chunks: int = 0
+    failed_chunks: int = 0
+    updated_at: float = field(default_factory=time.time)
+
+    def same_build(self, other: "IngestManifest") -> bool:
+        """True if both manifests describe the same source, chunking, retrieval mode, cleaning, model and vector size."""
+        return (
+            self.source_hash == other.source_hash
+            and self.chunk_size == other.chunk_size
+            and self.chunk_overlap == other.chunk_overlap
+            and self.chunker == other.chunker
+            and self.retrieval == other.retrieval
+            and self.embedding_model == other.embedding_model
+            and self.task_type == other.task_type
+            and self.dimensionality == other.dimensionality
+            and self.cleaner == other.cleaner
+        )
+
+    @property
+    def complete(self) -> bool:
+        return self.status == STATUS_COMPLETE
+
+
+def file_sha256(path: Path) -> str:
+    """SHA-256 of a file, read in 1 MB blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def manifest_path(db_path: Path, collection_name: str) -> Path:
+    """Location of a collection's manifest inside the Chroma DB directory."""
+    return Path(db_path) / MANIFEST_DIR_NAME / f"{collection_name}.json"
+
+
+def load_manifest(db_path: Path, collection_name: str) -> Optional[IngestManifest]:
+    """
+    Read a collection's manifest.
+
+    Returns:
+        The manifest, or None if there is none (or it cannot be parsed)
+    """
+    path = manifest_path(db_path, collection_name)
+    if not path.exists():
+        return None
+    try:
+        data = json.loads(path.read_text())
+        known = {f.name for f in fields(IngestManifest)}
+        return IngestManifest(**{key: value for key, value in data.items() if key in known})
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable ingestion manifest {path}: {e}")
+        return None
+
+
+def save_manifest(db_path: Path, manifest: IngestManifest) -> None:
+    """Write a manifest atomically (temp file, fsync, rename)."""
+    path = manifest_path(db_path, manifest.collection)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    manifest.updated_at = time.time()
+    tmp_path = path.with_suffix(".json.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(asdict(manifest), f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def delete_manifest(db_path: Path, collection_name: str) -> None:
+    """Remove a collection's manifest if present."""
+    manifest_path(db_path, collection_name).unlink(missing_ok=True)
+
+
+def is_collection_complete(db_path: Path, collection_name: str) -> bool:
+    """
+    Whether a collection finished building.
+
+    Collections built before manifests existed have none and are treated as
+    complete; a collection with an in-progress or unreadable manifest is not.
+    """
+    if not manifest_path(db_path, collection_name).exists():
+        return True
+    manifest = load_manifest(db_path, collection_name)
+    return manifest is not None and manifest.complete
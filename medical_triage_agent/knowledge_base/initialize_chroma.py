@@ -23,7 +23,11 @@ else:
     print(f"Warning: .env file not found at {env_path}")
     print("Make sure GOOGLE_CLOUD_PROJECT and GOOGLE_CLOUD_LOCATION are set")
 
-from .chroma_setup import initialize_knowledge_base
+from .chroma_setup import get_build_lease, initialize_knowledge_base
+from .compact_store import COMPACT_DTYPES
+from .embedding_backends import get_embedding_backend
+from .parent_store import RETRIEVAL_MODES
+from .pdf_pipeline import CHUNKERS
 
 
 def main():
@@ -35,14 +39,71 @@ def main():
         action="store_true",
         help="Delete existing collections and reload all PDFs"
     )
+    parser.add_argument(
+        "--sync",
+        action="store_true",
+        help="Incrementally sync collections: embed only new/changed chunks and delete stale ones"
+    )
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=None,
+        help="Maximum concurrent embedding requests (default: EMBEDDING_MAX_IN_FLIGHT or 4)"
+    )
+    parser.add_argument(
+        "--extraction-workers",
+        type=int,
+        default=None,
+        help="Processes used for PDF text extraction (default: PDF_EXTRACTION_WORKERS or 1)"
+    )
+    parser.add_argument(
+        "--sequential",
+        action="store_true",
+        help="Ingest PDFs one after another instead of concurrently"
+    )
+    parser.add_argument(
+        "--chunker",
+        action="append",
+        default=[],
+        metavar="COLLECTION=CHUNKER",
+        help="Chunker for a collection: fixed or structured (repeatable; default: KB_CHUNKERS or fixed)"
+    )
+    parser.add_argument(
+        "--retrieval",
+        action="append",
+        default=[],
+        metavar="COLLECTION=MODE",
+        help="Retrieval mode for a collection: chunk, or parent to index small chunks and return their "
+             "parent sections (repeatable; default: KB_RETRIEVAL_MODES or chunk)"
+    )
+    parser.add_argument(
+        "--export-compact",
+        choices=COMPACT_DTYPES,
+        default=None,
+        help="Also export collections to a compact local store (queried when COMPACT_STORE_DTYPE matches)"
+    )
     
     args = parser.parse_args()
     
+    chunkers = {}
+    for entry in args.chunker:
+        collection_name, _, chunker = entry.partition("=")
+        if chunker not in CHUNKERS:
+            parser.error(f"--chunker {entry!r}: use COLLECTION=CHUNKER with CHUNKER one of {CHUNKERS}")
+        chunkers[collection_name] = chunker
+    retrieval_modes = {}
+    for entry in args.retrieval:
+        collection_name, _, mode = entry.partition("=")
+        if mode not in RETRIEVAL_MODES:
+            parser.error(f"--retrieval {entry!r}: use COLLECTION=MODE with MODE one of {RETRIEVAL_MODES}")
+        retrieval_modes[collection_name] = mode
+    
     # Verify environment variables
     google_project = os.getenv("GOOGLE_CLOUD_PROJECT")
     google_location = os.getenv("GOOGLE_CLOUD_LOCATION", "us-central1")
     
-    if not google_project:
+    backend = get_embedding_backend()
+    if not google_project and backend.name == "vertex":
         print("❌ Error: GOOGLE_CLOUD_PROJECT environment variable is not set!")
         print("\nPlease set it in your .env file or export it:")
         print("  export GOOGLE_CLOUD_PROJECT=your-project-id")
@@ -54,13 +115,41 @@ def main():
     print("=" * 60)
     print(f"Project: {google_project}")
     print(f"Location: {google_location}")
+    print(f"Embedding backend: {backend.describe()}")
     print()
     
-    if args.force_reload:
-        print("⚠️  Force reload enabled - existing collections will be deleted")
+    if args.sync:
+        print("🔄 Sync mode enabled - only new/changed chunks will be embedded")
         print()
+    elif args.force_reload:
+        print("⚠️  Force reload enabled - collections are rebuilt into new versions; current ones keep serving until swapped")
+        print()
+    
+    # Never build concurrently with another instance or CLI run
+    lease = get_build_lease()
+    if not lease.try_acquire():
+        holder = lease.holder()
+        print(f"❌ Error: knowledge base build already in progress ({holder['owner'] if holder else 'unknown holder'})")
+        print("Wait for it to finish, or for its lease to expire (KB_LOCK_TTL_SECONDS).")
+        return
     
-    results = initialize_knowledge_base(force_reload=args.force_reload)
+    with lease.keep_alive():
+        results = initialize_knowledge_base(
+            force_reload=args.force_reload,
+            max_in_flight=args.max_in_flight,
+            sync=args.sync,
+            extraction_workers=args.extraction_workers,
+            concurrent=not args.sequential,
+            chunkers=chunkers,
+            retrieval_modes=retrieval_modes,
+            export_compact=args.export_compact,
+        )
+    
+    empty = [collection_name for collection_name, count in results.items() if not count]
+    if empty:
+        print(f"\n⚠️  Initialization finished without chunks for: {', '.join(empty)}")
+        print("Check the PDF paths and the errors above, then run again.")
+        return
     
     print("\n✅ Initialization complete!")
     print("\nYou can now use the knowledge base tools in your agents.")
@@ -0,0 +1,311 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Object Storage Backends for Knowledge Base Artifacts.
+
+Snapshots and other artifacts are written through a small `ObjectStore`
+interface with two implementations: Cloud Storage, and a local directory
+that stands in for the bucket so publishing and fetching can be tested
+offline.
+
+Blobs carry a generation number, and conditional writes and deletes
+(`write_if_generation`, `delete_if_generation`) only succeed if the blob is
+still at the generation the caller read. Generation 0 means "does not
+exist". Leases are built on these.
+"""
+
+import base64
+import fcntl
+import hashlib
+import logging
+import os
+import shutil
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Dict, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class BlobInfo(NamedTuple):
+    """Size and base64 checksums of a blob (as reported by Cloud Storage)."""
+
+    size: int
+    md5: Optional[str]
+    crc32c: Optional[str]
+
+
+def file_checksums(path: Path) -> BlobInfo:
+    """
+    Size, md5 and crc32c of a local file in the Cloud Storage base64 format.
+
+    crc32c is only computed when `google_crc32c` (a google-cloud-storage
+    dependency) is importable.
+    """
+    try:
+        import google_crc32c
+        crc = google_crc32c.Checksum()
+    except ImportError:
+        crc = None
+
+    md5 = hashlib.md5()
+    size = 0
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            md5.update(block)
+            if crc is not None:
+                crc.update(block)
+            size += len(block)
+    return BlobInfo(
+        size=size,
+        md5=base64.b64encode(md5.digest()).decode(),
+        crc32c=base64.b64encode(crc.digest()).decode() if crc is not None else None,
+    )
+
+
+def same_content(local: BlobInfo, remote: BlobInfo) -> bool:
+    """Compare by md5 when both sides have it, else crc32c (composite uploads have no md5)."""
+    if local.size != remote.size:
+        return False
+    if local.md5 and remote.md5:
+        return local.md5 == remote.md5
+    if local.crc32c and remote.crc32c:
+        return local.crc32c == remote.crc32c
+    return False
+
+
+class ObjectStore:
+    """Minimal blob interface: names are '/'-separated keys."""
+
+    def exists(self, name: str) -> bool:
+        raise NotImplementedError
+
+    def read_bytes(self, name: str) -> bytes:
+        raise NotImplementedError
+
+    def write_bytes(self, name: str, data: bytes) -> None:
+        raise NotImplementedError
+
+    def upload_file(self, name: str, local_path: Path) -> None:
+        raise NotImplementedError
+
+    def download_file(self, name: str, local_path: Path) -> None:
+        raise NotImplementedError
+
+    def list_blobs(self, prefix: str = "") -> Dict[str, BlobInfo]:
+        """Names (with `prefix`) and checksums of every blob under `prefix`."""
+        raise NotImplementedError
+
+    def open_read(self, name: str) -> BinaryIO:
+        """Open a blob for streaming reads."""
+        raise NotImplementedError
+
+    def delete(self, name: str) -> None:
+        raise NotImplementedError
+
+    def describe(self, name: str = "") -> str:
+        """Human-readable location of a blob, for log messages."""
+        raise NotImplementedError
+
+    def read_versioned(self, name: str) -> Optional[Tuple[bytes, int]]:
+        """Contents and generation of a blob, or None if it does not exist."""
+        raise NotImplementedError
+
+    def write_if_generation(self, name: str, data: bytes, generation: int) -> bool:
+        """Write only if the blob is at `generation` (0: does not exist). Returns False otherwise."""
+        raise NotImplementedError
+
+    def delete_if_generation(self, name: str, generation: int) -> bool:
+        """Delete only if the blob is at `generation`. Returns False otherwise."""
+        raise NotImplementedError
+
+
+class LocalDirectoryStore(ObjectStore):
+    """
+    Object store backed by a local directory (offline stand-in for a bucket).
+
+    A file's generation is its modification time in nanoseconds. Conditional
+    writes hold an exclusive `flock` on a guard file, so they are atomic
+    across threads and processes on the same host.
+    """
+
+    _GUARD_FILE = ".generations.lock"
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, name: str) -> Path:
+        return self.root / name
+
+    @contextmanager
+    def _guard(self):
+        with open(self.root / self._GUARD_FILE, "a") as guard:
+            fcntl.flock(guard, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(guard, fcntl.LOCK_UN)
+
+    def _generation(self, name: str) -> int:
+        try:
+            return self._path(name).stat().st_mtime_ns
+        except FileNotFoundError:
+            return 0
+
+    def exists(self, name: str) -> bool:
+        return self._path(name).exists()
+
+    def read_bytes(self, name: str) -> bytes:
+        return self._path(name).read_bytes()
+
+    def write_bytes(self, name: str, data: bytes) -> None:
+        path = self._path(name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+
+    def upload_file(self, name: str, local_path: Path) -> None:
+        path = self._path(name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        shutil.copyfile(local_path, tmp_path)
+        os.replace(tmp_path, path)
+
+    def download_file(self, name: str, local_path: Path) -> None:
+        shutil.copyfile(self._path(name), local_path)
+
+    def list_blobs(self, prefix: str = "") -> Dict[str, BlobInfo]:
+        blobs = {}
+        for path in self.root.rglob("*"):
+            name = path.relative_to(self.root).as_posix()
+            if path.is_file() and name.startswith(prefix) and not name.endswith(".tmp") and name != self._GUARD_FILE:
+                blobs[name] = file_checksums(path)
+        return blobs
+
+    def open_read(self, name: str) -> BinaryIO:
+        return open(self._path(name), "rb")
+
+    def delete(self, name: str) -> None:
+        self._path(name).unlink(missing_ok=True)
+
+    def describe(self, name: str = "") -> str:
+        return str(self._path(name))
+
+    def read_versioned(self, name: str) -> Optional[Tuple[bytes, int]]:
+        with self._guard():
+            generation = self._generation(name)
+            return (self.read_bytes(name), generation) if generation else None
+
+    def write_if_generation(self, name: str, data: bytes, generation: int) -> bool:
+        with self._guard():
+            if self._generation(name) != generation:
+                return False
+            self.write_bytes(name, data)
+            if self._generation(name) == generation:
+                # Same mtime tick as the replaced file; make the change visible
+                os.utime(self._path(name), ns=(generation + 1, generation + 1))
+            return True
+
+    def delete_if_generation(self, name: str, generation: int) -> bool:
+        with self._guard():
+            if not generation or self._generation(name) != generation:
+                return False
+            self.delete(name)
+            return True
+
+
+class GCSObjectStore(ObjectStore):
+    """Object store backed by a Cloud Storage bucket."""
+
+    def __init__(self, bucket_name: str, location: Optional[str] = None, create: bool = False):
+        """
+        Args:
+            bucket_name: GCS bucket name
+            location: Bucket location used if the bucket has to be created
+            create: If True, create the bucket when it does not exist
+        """
+        from google.cloud import storage
+
+        self.bucket_name = bucket_name
+        self.client = storage.Client()
+        self.bucket = self.client.bucket(bucket_name)
+        if create and not self.bucket.exists():
+            logger.info(f"Creating bucket: {bucket_name}")
+            self.bucket.create(location=location)
+
+    def exists(self, name: str) -> bool:
+        return self.bucket.blob(name).exists()
+
+    def read_bytes(self, name: str) -> bytes:
+        return self.bucket.blob(name).download_as_bytes()
+
+    def write_bytes(self, name: str, data: bytes) -> None:
+        self.bucket.blob(name).upload_from_string(data)
+
+    def upload_file(self, name: str, local_path: Path) -> None:
+        self.bucket.blob(name).upload_from_filename(str(local_path))
+
+    def download_file(self, name: str, local_path: Path) -> None:
+        self.bucket.blob(name).download_to_filename(str(local_path))
+
+    def list_blobs(self, prefix: str = "") -> Dict[str, BlobInfo]:
+        return {
+            blob.name: BlobInfo(size=blob.size or 0, md5=blob.md5_hash, crc32c=blob.crc32c)
+            for blob in self.client.list_blobs(self.bucket_name, prefix=prefix)
+        }
+
+    def open_read(self, name: str) -> BinaryIO:
+        # Chunked streaming download; the caller decompresses as bytes arrive
+        return self.bucket.blob(name).open("rb", chunk_size=8 * 1024 * 1024)
+
+    def delete(self, name: str) -> None:
+        blob = self.bucket.blob(name)
+        if blob.exists():
+            blob.delete()
+
+    def describe(self, name: str = "") -> str:
+        return f"gs://{self.bucket_name}/{name}"
+
+    def read_versioned(self, name: str) -> Optional[Tuple[bytes, int]]:
+        from google.api_core.exceptions import NotFound, PreconditionFailed
+
+        blob = self.bucket.get_blob(name)
+        if blob is None:
+            return None
+        try:
+            return blob.download_as_bytes(if_generation_match=blob.generation), blob.generation
+        except (NotFound, PreconditionFailed):
+            # Replaced or deleted between the metadata read and the download
+            return self.read_versioned(name)
+
+    def write_if_generation(self, name: str, data: bytes, generation: int) -> bool:
+        from google.api_core.exceptions import PreconditionFailed
+
+        try:
+            self.bucket.blob(name).upload_from_string(data, if_generation_match=generation)
+            return True
+        except PreconditionFailed:
+            return False
+
+    def delete_if_generation(self, name: str, generation: int) -> bool:
+        from google.api_core.exceptions import NotFound, PreconditionFailed
+
+        try:
+            self.bucket.blob(name).delete(if_generation_match=generation)
+            return True
+        except (NotFound, PreconditionFailed):
+            return False
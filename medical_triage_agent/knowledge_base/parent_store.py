@@ -0,0 +1,173 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Parent Sections for Small-to-Big Retrieval.
+
+In "parent" retrieval mode a collection indexes small child chunks (precise
+embedding matches). Each child records the `parent_id` of the larger
+section it was cut from. The parent texts live in `parent_sections.sqlite3`
+in the Chroma DB directory, so they travel with snapshots. A query collapses
+its child hits into their parents, in rank order, and returns each parent
+once. Several hits in one section then give a single context block instead
+of overlapping fragments.
+"""
+
+import logging
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from .embedding_cache import chunk_hash
+from .pdf_pipeline import TextChunk
+
+logger = logging.getLogger(__name__)
+
+PARENT_STORE_FILE = "parent_sections.sqlite3"
+
+# "chunk": chunks are returned as indexed; "parent": children are indexed, parents returned
+RETRIEVAL_MODES = ("chunk", "parent")
+DEFAULT_RETRIEVAL_MODE = "chunk"
+
+# Parent sections and the children embedded for them (characters)
+DEFAULT_PARENT_CHUNK_SIZE = 2000
+DEFAULT_CHILD_CHUNK_SIZE = 400
+
+
+def parent_store_path(db_path: Path) -> Path:
+    return Path(db_path) / PARENT_STORE_FILE
+
+
+def parent_key(parent: TextChunk) -> str:
+    """Stable id of a parent section (position and content)."""
+    return f"p{parent.index}_{chunk_hash(parent.text)}"
+
+
+def _connect(db_path: Path) -> sqlite3.Connection:
+    path = parent_store_path(db_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(path))
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS parents (
+            collection TEXT NOT NULL,
+            parent_id TEXT NOT NULL,
+            text TEXT NOT NULL,
+            section_path TEXT NOT NULL,
+            page_start INTEGER NOT NULL,
+            page_end INTEGER NOT NULL,
+            PRIMARY KEY (collection, parent_id)
+        )
+        """
+    )
+    return conn
+
+
+def save_parents(db_path: Path, collection_name: str, parents: Iterable[TextChunk]) -> None:
+    """Store (or replace) parent sections of a physical collection."""
+    rows = [
+        (collection_name, parent_key(parent), parent.text, parent.section_path, parent.page_start, parent.page_end)
+        for parent in parents
+    ]
+    if not rows:
+        return
+    with closing(_connect(db_path)) as conn, conn:
+        conn.executemany("INSERT OR REPLACE INTO parents VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+
+def load_parents(db_path: Path, collection_name: str, parent_ids: List[str]) -> Dict[str, str]:
+    """
+    Look up parent texts.
+
+    Returns:
+        Mapping of parent id to text for the ids found
+    """
+    if not parent_ids or not parent_store_path(db_path).exists():
+        return {}
+    found = {}
+    with closing(_connect(db_path)) as conn:
+        for i in range(0, len(parent_ids), 500):
+            part = parent_ids[i:i + 500]
+            rows = conn.execute(
+                f"SELECT parent_id, text FROM parents WHERE collection = ? AND parent_id IN ({','.join('?' * len(part))})",
+                (collection_name, *part),
+            ).fetchall()
+            found.update(rows)
+    return found
+
+
+def delete_parents(db_path: Path, collection_name: str, keep: Optional[Iterable[str]] = None) -> int:
+    """
+    Delete the parent sections of a collection.
+
+    Args:
+        db_path: Chroma DB directory
+        collection_name: Physical collection name
+        keep: Parent ids to keep. If None, all are deleted
+
+    Returns:
+        Number of deleted parents
+    """
+    if not parent_store_path(db_path).exists():
+        return 0
+    with closing(_connect(db_path)) as conn, conn:
+        if keep is None:
+            return conn.execute("DELETE FROM parents WHERE collection = ?", (collection_name,)).rowcount
+        keep = set(keep)
+        stored = [row[0] for row in conn.execute("SELECT parent_id FROM parents WHERE collection = ?", (collection_name,))]
+        stale = [(collection_name, parent_id) for parent_id in stored if parent_id not in keep]
+        conn.executemany("DELETE FROM parents WHERE collection = ? AND parent_id = ?", stale)
+        return len(stale)
+
+
+def collapse_to_parents(
+    db_path: Path,
+    collection_name: str,
+    documents: List[str],
+    metadatas: Optional[List[dict]],
+) -> List[str]:
+    """
+    Replace ranked child hits with their parent sections, each once.
+
+    Hits without a parent id (or whose parent is missing) are returned as they are.
+
+    Args:
+        db_path: Chroma DB directory
+        collection_name: Physical collection name
+        documents: Child texts in rank order
+        metadatas: Child metadata in rank order
+
+    Returns:
+        Parent texts in the rank order of their best child
+    """
+    metadatas = metadatas or [None] * len(documents)
+    keys = []
+    for document, metadata in zip(documents, metadatas):
+        parent_id = (metadata or {}).get("parent_id")
+        keys.append(("parent", parent_id) if parent_id else ("chunk", document))
+    ordered = list(dict.fromkeys(keys))
+    parents = load_parents(db_path, collection_name, [value for kind, value in ordered if kind == "parent"])
+    texts = []
+    for kind, value in ordered:
+        if kind == "chunk":
+            texts.append(value)
+        elif value in parents:
+            texts.append(parents[value])
+        else:
+            logger.warning(f"Parent section {value} of '{collection_name}' is missing; returning its child chunks")
+            texts.extend(
+                document for document, key in zip(documents, keys) if key == (kind, value)
+            )
+    return list(dict.fromkeys(texts))
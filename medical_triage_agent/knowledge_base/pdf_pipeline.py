@@ -0,0 +1,347 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Streaming, Page-Aware PDF Extraction and Chunking.
+
+Pages are extracted one at a time and chunked as they stream in, so only a
+window of roughly one page plus one chunk is held in memory regardless of
+the PDF size. Every chunk records the pages it spans.
+"""
+
+import bisect
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from pypdf import PdfReader
+
+from .chunk_cleaner import CleaningStats, drop_near_duplicates, strip_repeated_lines
+
+# Default chunking parameters (characters)
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_CHUNK_OVERLAP = 200
+
+# "fixed": every ~chunk_size characters; "structured": along headings (structured_chunker)
+CHUNKERS = ("fixed", "structured")
+DEFAULT_CHUNKER = "fixed"
+
+# Pages handed to a worker process per task in parallel extraction
+DEFAULT_PAGES_PER_TASK = 32
+
+
+class TextChunk(NamedTuple):
+    """
+    A chunk of document text and the (1-based) pages it spans.
+
+    `section_path` is set by the structured chunker; `parent` is the larger
+    chunk a child was cut from (parent retrieval mode).
+    """
+
+    text: str
+    index: int
+    page_start: int
+    page_end: int
+    section_path: str = ""
+    parent: Optional["TextChunk"] = None
+
+
+def iter_pdf_pages(pdf_path: Path) -> Iterator[Tuple[int, str]]:
+    """
+    Extract text from a PDF one page at a time.
+
+    Args:
+        pdf_path: Path to PDF file
+
+    Yields:
+        (page_number, page_text) tuples, page numbers starting at 1
+    """
+    try:
+        reader = PdfReader(pdf_path)
+    except Exception as e:
+        print(f"Error extracting text from {pdf_path}: {e}")
+        return
+
+    for page_number, page in enumerate(reader.pages, 1):
+        try:
+            yield page_number, page.extract_text() or ""
+        except Exception as e:
+            print(f"Error extracting page {page_number} from {pdf_path}: {e}")
+            yield page_number, ""
+
+
+# PdfReader per worker process, so each worker parses the PDF structure once
+_worker_readers: Dict[str, PdfReader] = {}
+
+
+def _extract_page_range(pdf_path: str, first: int, last: int) -> List[str]:
+    """Extract pages [first, last) in a worker process (0-based indices)."""
+    reader = _worker_readers.get(pdf_path)
+    if reader is None:
+        reader = _worker_readers[pdf_path] = PdfReader(pdf_path)
+    texts = []
+    for page_index in range(first, last):
+        try:
+            texts.append(reader.pages[page_index].extract_text() or "")
+        except Exception as e:
+            print(f"Error extracting page {page_index + 1} from {pdf_path}: {e}")
+            texts.append("")
+    return texts
+
+
+def get_extraction_workers() -> int:
+    """Get the PDF extraction worker count from PDF_EXTRACTION_WORKERS (default 1, serial)."""
+    try:
+        return max(1, int(os.getenv("PDF_EXTRACTION_WORKERS", "1")))
+    except ValueError:
+        return 1
+
+
+def iter_pdf_pages_parallel(
+    pdf_path: Path,
+    workers: Optional[int] = None,
+    pages_per_task: int = DEFAULT_PAGES_PER_TASK,
+) -> Iterator[Tuple[int, str]]:
+    """
+    Extract text from a PDF with a process pool, yielding pages in order.
+
+    Page ranges are split across worker processes (pypdf extraction is
+    CPU-bound). At most two ranges per worker are outstanding, so memory
+    stays bounded while the consumer chunks and embeds earlier pages.
+
+    Args:
+        pdf_path: Path to PDF file
+        workers: Number of worker processes. If None, uses PDF_EXTRACTION_WORKERS
+        pages_per_task: Pages extracted per task
+
+    Yields:
+        (page_number, page_text) tuples, page numbers starting at 1
+    """
+    workers = workers or get_extraction_workers()
+    if workers <= 1:
+        yield from iter_pdf_pages(pdf_path)
+        return
+
+    try:
+        page_count = len(PdfReader(pdf_path).pages)
+    except Exception as e:
+        print(f"Error extracting text from {pdf_path}: {e}")
+        return
+
+    ranges = deque(
+        (first, min(first + pages_per_task, page_count))
+        for first in range(0, page_count, pages_per_task)
+    )
+    with ProcessPoolExecutor(max_workers=min(workers, max(1, len(ranges)))) as pool:
+        outstanding = deque()
+        while ranges or outstanding:
+            while ranges and len(outstanding) < workers * 2:
+                first, last = ranges.popleft()
+                outstanding.append((first, pool.submit(_extract_page_range, str(pdf_path), first, last)))
+
+            first, future = outstanding.popleft()
+            for offset, text in enumerate(future.result()):
+                yield first + offset + 1, text
+
+
+def iter_chunks(
+    pages: Iterable[Tuple[int, str]],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+) -> Iterator[TextChunk]:
+    """
+    Chunk a stream of pages, carrying chunks across page boundaries.
+
+    Uses the same rule as `chunk_text`: cut every `chunk_size` characters,
+    preferring the last sentence end or newline past the halfway point, and
+    start the next chunk `chunk_overlap` characters before the cut. Each page
+    is followed by a newline, as in the concatenated document text.
+
+    Args:
+        pages: Iterable of (page_number, page_text) tuples
+        chunk_size: Maximum size of each chunk (in characters)
+        chunk_overlap: Overlap between chunks (in characters)
+
+    Yields:
+        TextChunk for every non-empty chunk
+    """
+    buffer = ""
+    buffer_offset = 0  # Absolute document offset of buffer[0]
+    page_offsets: List[int] = []  # Absolute offset where each buffered page starts
+    page_numbers: List[int] = []
+    start = 0  # Absolute offset of the next chunk
+    index = 0
+
+    def page_at(offset: int) -> int:
+        return page_numbers[max(0, bisect.bisect_right(page_offsets, offset) - 1)]
+
+    def take_chunk(total_length: int):
+        nonlocal start
+        end = start + chunk_size
+        raw = buffer[start - buffer_offset:end - buffer_offset]
+
+        # Try to break at sentence boundary
+        if end < total_length:
+            break_point = max(raw.rfind('.'), raw.rfind('\n'))
+            if break_point > chunk_size * 0.5:  # Only break if we're past halfway
+                raw = raw[:break_point + 1]
+                end = start + break_point + 1
+
+        chunk_start = start
+        # Overlap for context, but always make progress
+        start = max(end - chunk_overlap, chunk_start + 1)
+
+        text = raw.strip()
+        if not text:
+            return None, end
+        leading = len(raw) - len(raw.lstrip())
+        trailing = len(raw) - len(raw.rstrip())
+        page_start = page_at(chunk_start + leading)
+        page_end = page_at(chunk_start + len(raw) - 1 - trailing)
+        return (text, page_start, page_end), end
+
+    def trim_buffer():
+        nonlocal buffer, buffer_offset
+        drop = start - buffer_offset
+        if drop <= 0:
+            return
+        buffer = buffer[drop:]
+        buffer_offset = start
+        # Keep the page that contains the new buffer start
+        keep_from = max(0, bisect.bisect_right(page_offsets, start) - 1)
+        del page_offsets[:keep_from]
+        del page_numbers[:keep_from]
+
+    for page_number, page_text in pages:
+        page_offsets.append(buffer_offset + len(buffer))
+        page_numbers.append(page_number)
+        buffer += page_text + "\n"
+
+        # Only cut while the document is known to continue past this chunk
+        while buffer_offset + len(buffer) > start + chunk_size:
+            chunk, _ = take_chunk(buffer_offset + len(buffer))
+            if chunk:
+                yield TextChunk(chunk[0], index, chunk[1], chunk[2])
+                index += 1
+        trim_buffer()
+
+    total_length = buffer_offset + len(buffer)
+    while page_numbers and start < total_length:
+        chunk, end = take_chunk(total_length)
+        if chunk:
+            yield TextChunk(chunk[0], index, chunk[1], chunk[2])
+            index += 1
+        if end >= total_length:
+            break
+
+
+def iter_child_chunks(parents: Iterable[TextChunk], child_size: int) -> Iterator[TextChunk]:
+    """
+    Cut chunks into smaller children at line boundaries.
+
+    Children of a chunk with a section path repeat it as their first line.
+    They carry their parent and its page range, and are numbered across the
+    whole document.
+
+    Args:
+        parents: Chunks to cut
+        child_size: Maximum size of each child (in characters)
+
+    Yields:
+        TextChunk with `parent` set
+    """
+    index = 0
+    for parent in parents:
+        lines = parent.text.split("\n")
+        prefix = ""
+        if parent.section_path and lines[0] == parent.section_path:
+            prefix = parent.section_path + "\n"
+            lines = lines[1:]
+        budget = max(1, child_size - len(prefix))
+        pieces: List[str] = []
+        piece = ""
+        for line in lines:
+            for part in [line[i:i + budget] for i in range(0, len(line), budget)] or [""]:
+                if piece and len(piece) + 1 + len(part) > budget:
+                    pieces.append(piece)
+                    piece = ""
+                piece = f"{piece}\n{part}" if piece else part
+        if piece:
+            pieces.append(piece)
+        for piece in pieces:
+            if not piece.strip():
+                continue
+            yield TextChunk(prefix + piece.strip(), index, parent.page_start, parent.page_end, parent.section_path, parent)
+            index += 1
+
+
+def iter_pdf_chunks(
+    pdf_path: Path,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    chunk_overlap: int = DEFAULT_CHUNK_OVERLAP,
+    workers: Optional[int] = None,
+    cleaning: Optional[CleaningStats] = None,
+    chunker: str = DEFAULT_CHUNKER,
+    child_size: Optional[int] = None,
+) -> Iterator[TextChunk]:
+    """
+    Stream page-aware chunks straight from a PDF.
+
+    With `cleaning`, repeated page headers/footers are stripped before
+    chunking and near-duplicate chunks are dropped afterwards (see
+    chunk_cleaner). Kept chunks keep their original indices, so a resumed
+    build skips exactly the chunks it already wrote.
+
+    Args:
+        pdf_path: Path to PDF file
+        chunk_size: Maximum size of each chunk (in characters)
+        chunk_overlap: Overlap between chunks (in characters, fixed chunker only)
+        workers: Extraction worker processes. If None, uses PDF_EXTRACTION_WORKERS
+        cleaning: Stats to fill while cleaning. If None, text is not cleaned
+        chunker: One of CHUNKERS
+        child_size: If set, chunks of `chunk_size` are cut into children of this size
+            (see iter_child_chunks) and the children are yielded
+
+    Yields:
+        TextChunk with page_start/page_end (and section_path for the structured chunker)
+    """
+    if chunker not in CHUNKERS:
+        raise ValueError(f"Unknown chunker {chunker!r}; use one of {CHUNKERS}")
+    pages = iter_pdf_pages_parallel(pdf_path, workers)
+    if cleaning is not None:
+        pages = strip_repeated_lines(pages, cleaning)
+    if chunker == "structured":
+        from .structured_chunker import iter_structured_chunks
+
+        chunks = iter_structured_chunks(pages, chunk_size)
+    else:
+        chunks = iter_chunks(pages, chunk_size, chunk_overlap)
+    if child_size:
+        chunks = iter_child_chunks(chunks, child_size)
+    if cleaning is None:
+        return chunks
+    return drop_near_duplicates(chunks, cleaning)
+
+
+def batched(iterable: Iterable, size: int) -> Iterator[list]:
+    """Yield successive lists of up to `size` items from an iterable."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
@@ -0,0 +1,291 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Query Embedding Cache.
+
+Triage queries repeat a lot ("demam", "nyeri dada", "sesak napas"). Query
+embeddings are kept in an in-process LRU keyed by the normalized query text
+and the backend's model, task type and dimensionality. A repeated query
+then skips the embedding call. Normalization (Unicode NFKC, lower case,
+collapsed whitespace) only forms the key, so "Nyeri  dada" and "nyeri dada"
+share one entry. The backend always embeds the query as given, whether the
+cache is on or off.
+
+The LRU is bounded by vector bytes (QUERY_CACHE_MAX_MB, default 64; 0
+disables the cache). Entries expire after QUERY_CACHE_TTL_SECONDS (default
+one day). If QUERY_CACHE_PATH is set, misses also go to a shared SQLite
+store (an `EmbeddingCache`) before the backend is called. Other processes,
+and this one after a restart, then reuse the vectors. The store has no TTL;
+it is bounded by its own LRU size (QUERY_CACHE_DISK_MAX_MB, default 64).
+Vectors of a fixed model and dimensionality do not go stale.
+"""
+
+import asyncio
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from ..env import env_number
+from .embedding_cache import EmbeddingCache, chunk_hash
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUERY_CACHE_MAX_MB = 64
+DEFAULT_QUERY_CACHE_TTL_SECONDS = 24 * 60 * 60
+DEFAULT_QUERY_CACHE_DISK_MAX_MB = 64
+
+# Task type prefix of query vectors in the shared store, apart from chunk vectors
+_DISK_TASK_PREFIX = "query:"
+
+
+def normalize_query(text: str) -> str:
+    """Normalized form of a query: NFKC, lower case, whitespace collapsed."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFKC", text).lower()).strip()
+
+
+class QueryEmbeddingCache:
+    """
+    LRU of query embeddings with a byte bound and a TTL (thread-safe).
+
+    Vectors are held as packed float32, so the byte bound reflects memory use.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = DEFAULT_QUERY_CACHE_MAX_MB * 1024 * 1024,
+        ttl: float = DEFAULT_QUERY_CACHE_TTL_SECONDS,
+        disk: Optional[EmbeddingCache] = None,
+    ):
+        """
+        Args:
+            max_bytes: Upper bound on cached vector bytes before LRU eviction
+            ttl: Seconds an entry is served after it was embedded (0 = no expiry)
+            disk: Optional shared store consulted on misses
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk = disk
+        self._entries: "OrderedDict[Tuple, Tuple[array, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def _key(backend, normalized: str) -> Tuple:
+        return (normalized, backend.name, backend.model, backend.task_type, backend.dimensionality)
+
+    def get(self, backend, text: str) -> Optional[List[float]]:
+        """Cached vector of a query for a backend, or None."""
+        key = self._key(backend, normalize_query(text))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            vector, created = entry
+            if self.ttl and time.time() - created > self.ttl:
+                self._remove(key)
+                self.expirations += 1
+                return None
+            self._entries.move_to_end(key)
+            return vector.tolist()
+
+    def put(self, backend, text: str, vector: List[float], created: Optional[float] = None) -> None:
+        """Cache a query vector, evicting least recently used entries over the byte bound."""
+        if not vector:
+            return
+        key = self._key(backend, normalize_query(text))
+        packed = array("f", vector)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (packed, created or time.time())
+            self._bytes += len(packed) * packed.itemsize
+            while self._bytes > self.max_bytes and self._entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, key: Tuple) -> None:
+        vector, _ = self._entries.pop(key)
+        self._bytes -= len(vector) * vector.itemsize
+
+    def embed(self, backend, text: str) -> List[float]:
+        """
+        Embedding of a query: from the cache, the shared store, or the backend.
+
+        The backend embeds the original text; the normalized text is only the
+        key. Empty results are not cached.
+        """
+        cached = self._cached(backend, text)
+        if cached is not None:
+            return cached
+        normalized = normalize_query(text)
+        if self.disk is not None:
+            vector = self._load(backend, normalized)
+            if vector is not None:
+                return vector
+        with self._lock:
+            self.misses += 1
+        vector = backend.embed_query(text)
+        self._store(backend, normalized, vector)
+        return vector
+
+    async def embed_async(self, backend, text: str) -> List[float]:
+        """`embed` for event loops: the shared store is read and written in a thread, the backend is awaited."""
+        cached = self._cached(backend, text)
+        if cached is not None:
+            return cached
+        normalized = normalize_query(text)
+        loop = asyncio.get_running_loop()
+        if self.disk is not None:
+            vector = await loop.run_in_executor(None, self._load, backend, normalized)
+            if vector is not None:
+                return vector
+        with self._lock:
+            self.misses += 1
+        vector = await backend.embed_query_async(text)
+        if self.disk is not None:
+            await loop.run_in_executor(None, self._store, backend, normalized, vector)
+        else:
+            self._store(backend, normalized, vector)
+        return vector
+
+    def _cached(self, backend, text: str) -> Optional[List[float]]:
+        cached = self.get(backend, text)
+        if cached is not None:
+            with self._lock:
+                self.hits += 1
+        return cached
+
+    def _load(self, backend, normalized: str) -> Optional[List[float]]:
+        """Vector of a normalized query from the shared store (cached in memory when found)."""
+        try:
+            found = self.disk.get_many(
+                [chunk_hash(normalized)],
+                backend.model,
+                _DISK_TASK_PREFIX + backend.task_type,
+                backend.dimensionality,
+            )
+        except Exception as e:
+            logger.warning(f"Query cache store lookup failed: {e}")
+            found = {}
+        if not found:
+            return None
+        vector = next(iter(found.values()))
+        with self._lock:
+            self.disk_hits += 1
+        self.put(backend, normalized, vector)
+        return vector
+
+    def _store(self, backend, normalized: str, vector: List[float]) -> None:
+        """Cache a freshly embedded query in memory and the shared store."""
+        if not vector:
+            return
+        self.put(backend, normalized, vector)
+        if self.disk is not None:
+            try:
+                self.disk.put_many(
+                    [(chunk_hash(normalized), vector)],
+                    backend.model,
+                    _DISK_TASK_PREFIX + backend.task_type,
+                    backend.dimensionality,
+                )
+            except Exception as e:
+                logger.warning(f"Query cache store write failed: {e}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> dict:
+        """Hit/miss counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "shared_store": str(self.disk.path) if self.disk is not None else None,
+            }
+
+
+_query_cache: Optional[QueryEmbeddingCache] = None
+_query_cache_lock = threading.Lock()
+
+
+def get_query_cache() -> Optional[QueryEmbeddingCache]:
+    """
+    Get the process-wide query embedding cache.
+
+    Configured with QUERY_CACHE_MAX_MB (0 disables it), QUERY_CACHE_TTL_SECONDS,
+    QUERY_CACHE_PATH (shared SQLite store; unset = memory only) and
+    QUERY_CACHE_DISK_MAX_MB.
+
+    Returns:
+        QueryEmbeddingCache instance, or None if disabled
+    """
+    global _query_cache
+    max_mb = env_number("QUERY_CACHE_MAX_MB", DEFAULT_QUERY_CACHE_MAX_MB)
+    if not max_mb:
+        return None
+    with _query_cache_lock:
+        if _query_cache is None:
+            disk = None
+            path = os.getenv("QUERY_CACHE_PATH")
+            if path:
+                try:
+                    disk_mb = env_number("QUERY_CACHE_DISK_MAX_MB", DEFAULT_QUERY_CACHE_DISK_MAX_MB)
+                    disk = EmbeddingCache(Path(path), max_bytes=int(disk_mb * 1024 * 1024))
+                except Exception as e:
+                    logger.warning(f"Query cache store unavailable at {path}: {e}")
+            _query_cache = QueryEmbeddingCache(
+                max_bytes=int(max_mb * 1024 * 1024),
+                ttl=env_number("QUERY_CACHE_TTL_SECONDS", DEFAULT_QUERY_CACHE_TTL_SECONDS),
+                disk=disk,
+            )
+        return _query_cache
+
+
+def embed_query_cached(backend, text: str) -> List[float]:
+    """Embed a search query through the process-wide cache (or directly if it is disabled)."""
+    cache = get_query_cache()
+    if cache is None:
+        return backend.embed_query(text)
+    return cache.embed(backend, text)
+
+
+async def embed_query_cached_async(backend, text: str) -> List[float]:
+    """`embed_query_cached` for event loops."""
+    cache = get_query_cache()
+    if cache is None:
+        return await backend.embed_query_async(text)
+    return await cache.embed_async(backend, text)
@@ -0,0 +1,112 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Knowledge Base Readiness Manifest.
+
+A small `ready.json` in the Chroma DB directory records the collections, their
+chunk counts and a build id. It is written atomically once every collection
+is fully built, and removed only when a build finishes incomplete. Rebuilds go
+into new collection versions, so the previous build stays ready (and served)
+while they run. "Is the knowledge base ready?" is answered by reading one
+file, without opening SQLite or loading HNSW indexes. It is part of the DB
+directory and therefore of every snapshot.
+"""
+
+import json
+import logging
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+READINESS_FILE = "ready.json"
+
+
+def new_build_id() -> str:
+    """Sortable, unique id for a knowledge base build."""
+    return f"{time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())}-{uuid.uuid4().hex[:8]}"
+
+
+def readiness_path(db_path: Path) -> Path:
+    return Path(db_path) / READINESS_FILE
+
+
+def write_readiness(db_path: Path, collection_counts: Dict[str, int], build_id: Optional[str] = None) -> dict:
+    """
+    Atomically record that the knowledge base is ready.
+
+    Args:
+        db_path: Chroma DB directory
+        collection_counts: Chunks per collection
+        build_id: Build id. If None, a new one is generated
+
+    Returns:
+        The written readiness manifest
+    """
+    manifest = {
+        "build_id": build_id or new_build_id(),
+        "ready_at": time.time(),
+        "collections": dict(collection_counts),
+        "total_chunks": sum(collection_counts.values()),
+    }
+    path = readiness_path(db_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return manifest
+
+
+def read_readiness(db_path: Path) -> Optional[dict]:
+    """Read the readiness manifest, or None if missing or unreadable."""
+    path = readiness_path(db_path)
+    try:
+        return json.loads(path.read_text())
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning(f"Ignoring unreadable readiness manifest {path}: {e}")
+        return None
+
+
+def clear_readiness(db_path: Path) -> None:
+    """Mark the knowledge base as not ready (a build finished with collections missing or incomplete)."""
+    readiness_path(db_path).unlink(missing_ok=True)
+
+
+def check_readiness(db_path: Path, expected_collections: List[str]) -> Optional[dict]:
+    """
+    Cheap readiness check that reads only the manifest file.
+
+    Args:
+        db_path: Chroma DB directory
+        expected_collections: Collections that must be present with data
+
+    Returns:
+        The readiness manifest if every expected collection has chunks, else None
+    """
+    manifest = read_readiness(db_path)
+    if not manifest:
+        return None
+    counts = manifest.get("collections") or {}
+    if all(counts.get(collection_name, 0) > 0 for collection_name in expected_collections):
+        return manifest
+    return None
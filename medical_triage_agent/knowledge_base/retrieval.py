@@ -0,0 +1,292 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Multi-Collection Retrieval: Embed Once, Search Many.
+
+`search_knowledge_base` embeds a query once (through the query embedding
+cache) and searches every requested collection concurrently, on a bounded
+process-wide thread pool (KB_SEARCH_WORKERS, default 4). It returns one
+`SearchResults` with a `CollectionResult` per collection. The agent tools in
+chroma_tools format these as text. Code that needs several collections
+(e.g. `check_bpjs_criteria`) calls this once instead of one tool per
+collection.
+
+`search_knowledge_base_async` is the same search for the async agent tools.
+The query is embedded with an async GenAI call, and the Chroma searches are
+awaited on the same bounded pool. A slow search then no longer blocks the
+event loop that serves every other session.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+from .chroma_setup import (
+    CHROMA_DB_PATH,
+    COLLECTION_BATES,
+    COLLECTION_BPJS,
+    COLLECTION_PPK,
+    get_chroma_registry,
+)
+from .collection_aliases import resolve_collection
+from .compact_store import get_compact_dtype, get_compact_store
+from .embedding_backends import EmbeddingBackend, backend_mismatch, get_embedding_backend
+from .parent_store import collapse_to_parents
+from .query_cache import embed_query_cached, embed_query_cached_async
+
+ALL_COLLECTIONS = [COLLECTION_BPJS, COLLECTION_PPK, COLLECTION_BATES]
+
+DEFAULT_SEARCH_WORKERS = 4
+
+NO_RESULTS_TEXT = "No relevant information found in knowledge base."
+
+
+@dataclass
+class CollectionResult:
+    """
+    Search result of one collection.
+
+    `documents` are what the tools return: chunks, or parent sections for
+    collections in "parent" retrieval mode. `metadatas` and `distances`
+    describe the matched chunks themselves (children in parent mode).
+    """
+
+    collection: str
+    documents: List[str] = field(default_factory=list)
+    metadatas: List[dict] = field(default_factory=list)
+    distances: List[float] = field(default_factory=list)
+    mismatch: Optional[str] = None  # Built with another embedding backend; not searched
+    error: Optional[str] = None
+    elapsed_ms: float = 0.0
+
+
+@dataclass
+class SearchResults:
+    """Per-collection results of one query, in the order the collections were requested."""
+
+    query: str
+    collections: Dict[str, CollectionResult] = field(default_factory=dict)
+    error: Optional[str] = None  # The query could not be embedded
+    embed_ms: float = 0.0
+    search_ms: float = 0.0
+
+    def documents(self, collection_name: str) -> List[str]:
+        result = self.collections.get(collection_name)
+        return result.documents if result else []
+
+    def format(self, collection_names: Optional[List[str]] = None) -> str:
+        """
+        Tool output for some (default: all) of the searched collections.
+
+        Returns:
+            "=== COLLECTION ===" blocks of numbered results, or an error or
+            no-results message
+        """
+        if self.error:
+            return self.error
+        names = list(self.collections) if collection_names is None else collection_names
+        results_text = []
+        mismatches = []
+        for collection_name in names:
+            result = self.collections.get(collection_name)
+            if result is None:
+                continue
+            if result.mismatch:
+                mismatches.append(f"'{collection_name}' was {result.mismatch}")
+            if result.documents:
+                results_text.append(f"\n=== {collection_name.upper()} ===")
+                for i, doc in enumerate(result.documents, 1):
+                    results_text.append(f"\n[Result {i}]")
+                    results_text.append(doc)
+                    results_text.append("")
+        if not results_text and mismatches:
+            return "Error: knowledge base embedding mismatch: " + "; ".join(mismatches)
+        if not results_text:
+            return NO_RESULTS_TEXT
+        return "\n".join(results_text)
+
+
+def get_search_workers() -> int:
+    """Get the concurrent collection searches from KB_SEARCH_WORKERS (default 4)."""
+    try:
+        return max(1, int(os.getenv("KB_SEARCH_WORKERS", DEFAULT_SEARCH_WORKERS)))
+    except ValueError:
+        return DEFAULT_SEARCH_WORKERS
+
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_search_executor() -> ThreadPoolExecutor:
+    """The process-wide pool collection searches run on (created on first use)."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=get_search_workers(), thread_name_prefix="kb-search")
+        return _executor
+
+
+def search_collection(
+    collection_name: str,
+    query_embedding: List[float],
+    n_results: int,
+    backend: EmbeddingBackend,
+) -> CollectionResult:
+    """
+    Search one logical collection with an embedded query.
+
+    Errors are reported in the result, never raised.
+    """
+    start = time.perf_counter()
+    result = CollectionResult(collection_name)
+    try:
+        # Served version of the logical collection; the alias file is
+        # re-read when it changes, so a swapped-in rebuild is used at once
+        physical_name = resolve_collection(CHROMA_DB_PATH, collection_name)
+
+        collection = get_chroma_registry().collection(physical_name)
+        mismatch = backend_mismatch(collection.metadata, backend)
+        if mismatch:
+            print(f"Skipping collection {collection_name}: {mismatch}")
+            result.mismatch = mismatch
+            return result
+
+        # Exported float16/int8 store if configured, otherwise Chroma
+        compact_dtype = get_compact_dtype()
+        store = get_compact_store(CHROMA_DB_PATH, physical_name, compact_dtype) if compact_dtype else None
+        if store is not None:
+            found = store.query([query_embedding], n_results)
+        else:
+            found = collection.query(query_embeddings=[query_embedding], n_results=n_results)
+
+        documents = found["documents"][0] if found.get("documents") else []
+        result.metadatas = list(found["metadatas"][0]) if found.get("metadatas") else []
+        result.distances = list(found["distances"][0]) if found.get("distances") else []
+        if documents and (collection.metadata or {}).get("retrieval") == "parent":
+            # Child hits collapse into their parent sections, each returned once
+            documents = collapse_to_parents(CHROMA_DB_PATH, physical_name, documents, result.metadatas)
+        result.documents = list(documents)
+    except Exception as e:
+        print(f"Error querying collection {collection_name}: {e}")
+        result.error = str(e)
+    finally:
+        result.elapsed_ms = (time.perf_counter() - start) * 1000
+    return result
+
+
+def search_knowledge_base(
+    query: str,
+    collection_names: Optional[List[str]] = None,
+    n_results: int = 5,
+    backend: Optional[EmbeddingBackend] = None,
+) -> SearchResults:
+    """
+    Embed a query once and search several collections concurrently.
+
+    Args:
+        query: Search query
+        collection_names: Logical collections to search. If None, searches all
+        n_results: Results per collection (for collections in "parent"
+            retrieval mode: child hits, which collapse into at most as many parent sections)
+        backend: Embedding backend. If None, uses the configured one
+
+    Returns:
+        SearchResults with one CollectionResult per collection
+    """
+    if collection_names is None:
+        collection_names = ALL_COLLECTIONS
+    results = SearchResults(query)
+
+    # Queries must be embedded by the same backend and model the collections were built with;
+    # repeated queries are served from the query embedding cache
+    start = time.perf_counter()
+    try:
+        backend = backend or get_embedding_backend()
+        query_embedding = embed_query_cached(backend, query)
+        if not query_embedding:
+            results.error = "Error: Could not extract embedding from response"
+            return results
+    except Exception as e:
+        results.error = f"Error generating embedding: {str(e)}"
+        return results
+    finally:
+        results.embed_ms = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    if len(collection_names) == 1:
+        found = [search_collection(collection_names[0], query_embedding, n_results, backend)]
+    else:
+        executor = get_search_executor()
+        futures = [
+            executor.submit(search_collection, collection_name, query_embedding, n_results, backend)
+            for collection_name in collection_names
+        ]
+        found = [future.result() for future in futures]
+    results.search_ms = (time.perf_counter() - start) * 1000
+    results.collections = {result.collection: result for result in found}
+    return results
+
+
+async def search_knowledge_base_async(
+    query: str,
+    collection_names: Optional[List[str]] = None,
+    n_results: int = 5,
+    backend: Optional[EmbeddingBackend] = None,
+) -> SearchResults:
+    """
+    `search_knowledge_base` without blocking the event loop.
+
+    Args:
+        query: Search query
+        collection_names: Logical collections to search. If None, searches all
+        n_results: Results per collection
+        backend: Embedding backend. If None, uses the configured one
+
+    Returns:
+        SearchResults with one CollectionResult per collection
+    """
+    if collection_names is None:
+        collection_names = ALL_COLLECTIONS
+    results = SearchResults(query)
+
+    start = time.perf_counter()
+    try:
+        backend = backend or get_embedding_backend()
+        query_embedding = await embed_query_cached_async(backend, query)
+        if not query_embedding:
+            results.error = "Error: Could not extract embedding from response"
+            return results
+    except Exception as e:
+        results.error = f"Error generating embedding: {str(e)}"
+        return results
+    finally:
+        results.embed_ms = (time.perf_counter() - start) * 1000
+
+    # Chroma and SQLite calls are blocking; they run on the bounded search pool
+    start = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    executor = get_search_executor()
+    found = await asyncio.gather(*[
+        loop.run_in_executor(executor, search_collection, collection_name, query_embedding, n_results, backend)
+        for collection_name in collection_names
+    ])
+    results.search_ms = (time.perf_counter() - start) * 1000
+    results.collections = {result.collection: result for result in found}
+    return results
@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Single-Artifact Knowledge Base Snapshots.
+
+The Chroma DB directory is published as one zstd-compressed tarball plus a
+JSON manifest describing the build (collections and counts, embedding model
+and dimensionality, source PDF hashes, artifact SHA-256). Fetching is one
+streamed download decompressed straight into a staging directory; the
+checksum is verified before the staging directory replaces the local DB.
+
+Layout in the store:
+    snapshots/<build_id>.tar.zst
+    snapshots/<build_id>.json
+    snapshots/latest.json        (copy of the newest manifest)
+
+Usage:
+    python -m medical_triage_agent.knowledge_base.snapshot publish
+    python -m medical_triage_agent.knowledge_base.snapshot fetch
+    python -m medical_triage_agent.knowledge_base.snapshot fetch --local-dir /tmp/kb-bucket
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+from pathlib import Path
+from typing import BinaryIO, Dict, Optional
+
+from .embedding_backends import get_embedding_backend
+from .collection_aliases import resolve_collection
+from .ingest_manifest import load_manifest
+from .object_store import GCSObjectStore, LocalDirectoryStore, ObjectStore
+from .readiness import new_build_id, read_readiness
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FORMAT_VERSION = 1
+SNAPSHOT_PREFIX = "snapshots"
+LATEST_MANIFEST = f"{SNAPSHOT_PREFIX}/latest.json"
+
+# Manifest of the snapshot a local DB was fetched from or published as
+LOCAL_SNAPSHOT_MANIFEST = "snapshot.json"
+
+# zstd compression level (multi-threaded when publishing)
+DEFAULT_COMPRESSION_LEVEL = 10
+
+
+class SnapshotError(Exception):
+    """Snapshot could not be published or failed verification."""
+
+
+class _HashingReader:
+    """File-like wrapper that hashes and counts bytes as they are read."""
+
+    def __init__(self, raw: BinaryIO):
+        self.raw = raw
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self.raw.read(size)
+        self.sha256.update(data)
+        self.size += len(data)
+        return data
+
+
+class _HashingWriter:
+    """File-like wrapper that hashes and counts bytes as they are written."""
+
+    def __init__(self, raw: BinaryIO):
+        self.raw = raw
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data: bytes) -> int:
+        self.sha256.update(data)
+        self.size += len(data)
+        return self.raw.write(data)
+
+    def flush(self) -> None:
+        self.raw.flush()
+
+
+def _include_in_snapshot(relative_path: Path) -> bool:
+    name = relative_path.name
+    # SQLite journals and half-written temp files are never part of a build
+    return not (name.endswith("-journal") or name.endswith(".tmp") or name == LOCAL_SNAPSHOT_MANIFEST)
+
+
+def get_snapshot_store(bucket_name: Optional[str] = None, create: bool = False) -> Optional[ObjectStore]:
+    """
+    Get the snapshot store.
+
+    CHROMA_SNAPSHOT_DIR selects a local directory stand-in for the bucket;
+    otherwise the Chroma Cloud Storage bucket is used.
+
+    Args:
+        bucket_name: GCS bucket name. If None, uses get_chroma_bucket_name()
+        create: If True, create the bucket when it does not exist
+
+    Returns:
+        The store, or None if neither is configured
+    """
+    local_dir = os.getenv("CHROMA_SNAPSHOT_DIR")
+    if local_dir:
+        return LocalDirectoryStore(Path(local_dir))
+
+    from .chroma_setup import get_chroma_bucket_name, get_google_cloud_location
+
+    bucket_name = bucket_name or get_chroma_bucket_name()
+    if not bucket_name:
+        return None
+    return GCSObjectStore(bucket_name, location=get_google_cloud_location(), create=create)
+
+
+def read_local_snapshot_manifest(db_path: Path) -> Optional[dict]:
+    """Manifest of the snapshot the local DB came from, if any."""
+    path = Path(db_path) / LOCAL_SNAPSHOT_MANIFEST
+    try:
+        return json.loads(path.read_text()) if path.exists() else None
+    except Exception:
+        return None
+
+
+def build_snapshot_manifest(db_path: Path, collection_counts: Dict[str, int]) -> dict:
+    """
+    Describe the build in a Chroma DB directory.
+
+    Args:
+        db_path: Chroma DB directory
+        collection_counts: Chunks per collection
+
+    Returns:
+        Manifest dictionary (artifact fields are filled in by `publish_snapshot`)
+    """
+    readiness = read_readiness(db_path)
+    collections = {}
+    for collection_name, count in collection_counts.items():
+        physical_name = resolve_collection(db_path, collection_name)
+        ingest = load_manifest(db_path, physical_name)
+        collections[collection_name] = {
+            "collection": physical_name,
+            "count": count,
+            "source": ingest.source if ingest else None,
+            "source_sha256": ingest.source_hash if ingest else None,
+            "status": ingest.status if ingest else None,
+        }
+    return {
+        "format_version": SNAPSHOT_FORMAT_VERSION,
+        # The snapshot carries the build id the knowledge base was marked ready with
+        "build_id": (readiness or {}).get("build_id") or new_build_id(),
+        "created_at": time.time(),
+        **get_embedding_backend().identity,
+        "collections": collections,
+    }
+
+
+def publish_snapshot(
+    store: ObjectStore,
+    db_path: Path,
+    collection_counts: Dict[str, int],
+    compression_level: int = DEFAULT_COMPRESSION_LEVEL,
+) -> dict:
+    """
+    Publish the Chroma DB directory as a compressed snapshot.
+
+    The tarball is streamed through the compressor into a temporary file
+    (hashed on the way), uploaded, then its manifest is uploaded and
+    `latest.json` is switched to it last, so readers never see a manifest
+    whose artifact is missing.
+
+    Args:
+        store: Destination object store
+        db_path: Chroma DB directory
+        collection_counts: Chunks per collection, recorded in the manifest
+        compression_level: zstd compression level
+
+    Returns:
+        The published manifest
+    """
+    import zstandard
+
+    db_path = Path(db_path)
+    if not db_path.exists():
+        raise SnapshotError(f"Chroma DB path {db_path} does not exist")
+
+    manifest = build_snapshot_manifest(db_path, collection_counts)
+    artifact = f"{SNAPSHOT_PREFIX}/{manifest['build_id']}.tar.zst"
+
+    uncompressed = 0
+    with tempfile.NamedTemporaryFile(suffix=".tar.zst", delete=False) as tmp:
+        tmp_path = Path(tmp.name)
+        try:
+            hashing = _HashingWriter(tmp)
+            compressor = zstandard.ZstdCompressor(level=compression_level, threads=-1)
+            with compressor.stream_writer(hashing, closefd=False) as compressed:
+                with tarfile.open(fileobj=compressed, mode="w|") as tar:
+                    for path in sorted(db_path.rglob("*")):
+                        relative_path = path.relative_to(db_path)
+                        if path.is_file() and _include_in_snapshot(relative_path):
+                            tar.add(path, arcname=relative_path.as_posix(), recursive=False)
+                            uncompressed += path.stat().st_size
+            tmp.flush()
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+    try:
+        manifest["artifact"] = {
+            "name": artifact,
+            "sha256": hashing.sha256.hexdigest(),
+            "size_bytes": hashing.size,
+            "uncompressed_bytes": uncompressed,
+            "compression": "zstd",
+        }
+        logger.info(
+            f"Uploading snapshot {manifest['build_id']} to {store.describe(artifact)} "
+            f"({hashing.size / 1024 / 1024:.1f} MB, {uncompressed / 1024 / 1024:.1f} MB uncompressed)"
+        )
+        store.upload_file(artifact, tmp_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+
+    payload = json.dumps(manifest, indent=2).encode()
+    store.write_bytes(f"{SNAPSHOT_PREFIX}/{manifest['build_id']}.json", payload)
+    store.write_bytes(LATEST_MANIFEST, payload)
+    (db_path / LOCAL_SNAPSHOT_MANIFEST).write_bytes(payload)
+    logger.info(f"Published snapshot {manifest['build_id']}")
+    return manifest
+
+
+def previous_snapshot_path(db_path: Path) -> Path:
+    """Where `fetch_snapshot(keep_previous=True)` leaves the replaced DB directory."""
+    db_path = Path(db_path)
+    return db_path.parent / f".{db_path.name}.previous"
+
+
+def discard_previous_snapshot(db_path: Path) -> None:
+    """Delete the DB directory replaced by the last install, if it was kept."""
+    shutil.rmtree(previous_snapshot_path(db_path), ignore_errors=True)
+
+
+def fetch_snapshot(
+    store: ObjectStore,
+    db_path: Path,
+    build_id: Optional[str] = None,
+    force: bool = False,
+    keep_previous: bool = False,
+) -> Optional[dict]:
+    """
+    Download and install a snapshot into the Chroma DB directory.
+
+    The artifact is streamed, decompressed and unpacked into a staging
+    directory next to `db_path` while its SHA-256 is computed. Only if the
+    checksum matches the manifest does the staging directory replace the
+    current DB (two renames); otherwise it is discarded.
+
+    Args:
+        store: Source object store
+        db_path: Chroma DB directory to install into
+        build_id: Snapshot to fetch. If None, fetches the latest
+        force: If False, skip the download when the local DB is already this build
+        keep_previous: Keep the replaced DB directory (`previous_snapshot_path`)
+            instead of deleting it. A running process sets this: queries on
+            handles opened before the swap may still read the old files. The
+            directory is deleted by the next install or `discard_previous_snapshot`.
+
+    Returns:
+        The installed manifest, or None if no snapshot is published
+
+    Raises:
+        SnapshotError: If the artifact fails verification
+    """
+    import zstandard
+
+    manifest_name = f"{SNAPSHOT_PREFIX}/{build_id}.json" if build_id else LATEST_MANIFEST
+    if not store.exists(manifest_name):
+        return None
+    manifest = json.loads(store.read_bytes(manifest_name))
+    artifact = manifest["artifact"]
+
+    db_path = Path(db_path)
+    local = read_local_snapshot_manifest(db_path)
+    if not force and local and local.get("build_id") == manifest["build_id"] and db_path.exists():
+        logger.info(f"Local Chroma DB is already snapshot {manifest['build_id']}")
+        return manifest
+
+    staging = db_path.parent / f".{db_path.name}.incoming"
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+
+    logger.info(f"Fetching snapshot {manifest['build_id']} from {store.describe(artifact['name'])}...")
+    started = time.monotonic()
+    try:
+        with store.open_read(artifact["name"]) as raw:
+            hashing = _HashingReader(raw)
+            with zstandard.ZstdDecompressor().stream_reader(hashing, closefd=False) as decompressed:
+                with tarfile.open(fileobj=decompressed, mode="r|") as tar:
+                    for member in tar:
+                        # Refuse anything that would land outside the staging directory
+                        target = (staging / member.name).resolve()
+                        if not member.isfile() or staging.resolve() not in target.parents:
+                            raise SnapshotError(f"Unexpected entry in snapshot: {member.name}")
+                        tar.extract(member, staging, filter="data")
+            # Hash any trailing bytes the decompressor did not need
+            while hashing.read(1024 * 1024):
+                pass
+
+        if hashing.sha256.hexdigest() != artifact["sha256"] or hashing.size != artifact["size_bytes"]:
+            raise SnapshotError(
+                f"Checksum mismatch for snapshot {manifest['build_id']}: "
+                f"expected {artifact['sha256']}, got {hashing.sha256.hexdigest()}"
+            )
+    except BaseException as e:
+        shutil.rmtree(staging, ignore_errors=True)
+        if isinstance(e, Exception) and not isinstance(e, SnapshotError):
+            raise SnapshotError(f"Could not unpack snapshot {manifest['build_id']}: {e}") from e
+        raise
+
+    (staging / LOCAL_SNAPSHOT_MANIFEST).write_text(json.dumps(manifest, indent=2))
+
+    # Swap the verified build in
+    previous = previous_snapshot_path(db_path)
+    shutil.rmtree(previous, ignore_errors=True)
+    if db_path.exists():
+        os.replace(db_path, previous)
+    os.replace(staging, db_path)
+    if not keep_previous:
+        shutil.rmtree(previous, ignore_errors=True)
+
+    logger.info(
+        f"Installed snapshot {manifest['build_id']} ({artifact['size_bytes'] / 1024 / 1024:.1f} MB) "
+        f"in {time.monotonic() - started:.1f}s"
+    )
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Publish or fetch a compressed knowledge base snapshot"
+    )
+    parser.add_argument(
+        "command",
+        choices=["publish", "fetch"],
+        help="publish the local Chroma DB, or fetch the latest snapshot into it"
+    )
+    parser.add_argument(
+        "--local-dir",
+        type=Path,
+        default=None,
+        help="Use a local directory instead of the Cloud Storage bucket (default: CHROMA_SNAPSHOT_DIR)"
+    )
+    parser.add_argument("--build-id", default=None, help="Snapshot to fetch (default: latest)")
+    parser.add_argument("--force", action="store_true", help="Fetch even if the local DB is already that build")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    from .chroma_setup import CHROMA_DB_PATH, get_collection_counts, get_chroma_client
+
+    store = LocalDirectoryStore(args.local_dir) if args.local_dir else get_snapshot_store(create=args.command == "publish")
+    if store is None:
+        print("❌ No snapshot store configured. Set CHROMA_BUCKET_NAME or CHROMA_SNAPSHOT_DIR, or pass --local-dir.")
+        return
+
+    if args.command == "publish":
+        manifest = publish_snapshot(store, CHROMA_DB_PATH, get_collection_counts(get_chroma_client()))
+    else:
+        manifest = fetch_snapshot(store, CHROMA_DB_PATH, args.build_id, args.force)
+        if manifest is None:
+            print(f"❌ No snapshot found in {store.describe(SNAPSHOT_PREFIX)}")
+            return
+
+    print("=" * 60)
+    print(json.dumps(manifest, indent=2))
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
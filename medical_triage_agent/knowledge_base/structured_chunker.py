@@ -0,0 +1,237 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Structure-Aware Chunking for Guideline Documents.
+
+The fixed-size chunker cuts every ~1000 characters. That splits BPJS
+criteria lists (e.g. "VIII THT" ... "13 Vertigo (berat)") and PPK disease
+sections across chunks. This chunker first splits the page stream into
+sections at detected headings:
+- level 1: chapters and categories ("BAB II", "VIII THT", "VIII. THT")
+- level 2: numbered entries ("13 Vertigo (berat)", "1. VERTIGO"). The
+  numbering must continue the previous entry's (or restart at 1). Inside a
+  PPK subsection only upper-case titles count, so numbered lists there are
+  not taken as headings
+- level 3: the standard PPK subsections ("Hasil Anamnesis", "Penegakan
+  Diagnosis", "Rencana Penatalaksanaan", ...)
+
+Whole sections are then packed into chunks of up to `chunk_size`
+characters. A section is kept together with its subsections, and
+consecutive sibling entries without subsections (criteria lists) share a
+chunk. Only a section that is too large on its own is split, at line
+boundaries. Each chunk starts with its section path ("VIII THT > 13 Vertigo
+(berat)") and records it as `section_path`.
+
+Heading detection is heuristic and tuned to the BPJS and PPK documents.
+Text before the first heading is chunked like any other section.
+"""
+
+import re
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from .pdf_pipeline import TextChunk
+
+SECTION_PATH_SEPARATOR = " > "
+
+# Longest line taken as a heading
+MAX_HEADING_LENGTH = 80
+
+_ROMAN_HEADING = re.compile(r"^(?:BAB|BAGIAN)\s+[IVXLC\d]+\b|^[IVX]{1,5}\.?\s+[A-Z]")
+_NUMBERED_HEADING = re.compile(r"^(\d{1,3})[.)]?\s+[A-Z(]")
+_SUBSECTION_HEADINGS = (
+    "masalah kesehatan",
+    "hasil anamnesis",
+    "hasil pemeriksaan fisik",
+    "pemeriksaan fisik",
+    "pemeriksaan penunjang",
+    "penegakan diagnosis",
+    "diagnosis banding",
+    "komplikasi",
+    "rencana penatalaksanaan",
+    "penatalaksanaan",
+    "kriteria rujukan",
+    "peralatan",
+    "prognosis",
+    "referensi",
+)
+
+
+class _Section:
+    """Lines between one heading and the next, with their page numbers."""
+
+    __slots__ = ("path", "heading", "lines")
+
+    def __init__(self, path: Tuple[str, ...], heading: Optional[Tuple[int, str]] = None):
+        self.path = path
+        self.heading = heading  # (page, text), or None for text before the first heading
+        self.lines: List[Tuple[int, str]] = []
+
+    @property
+    def size(self) -> int:
+        heading = len(self.heading[1]) + 1 if self.heading else 0
+        return heading + sum(len(text) + 1 for _, text in self.lines)
+
+
+class _HeadingDetector:
+    """Classifies lines as headings, tracking entry numbering and nesting."""
+
+    def __init__(self):
+        self.last_number: Optional[int] = None
+        self.in_subsection = False
+
+    def level(self, line: str) -> Optional[int]:
+        if len(line) > MAX_HEADING_LENGTH or line[-1] in ".,;:":
+            return None
+        if _ROMAN_HEADING.match(line):
+            self.last_number = None
+            self.in_subsection = False
+            return 1
+        match = _NUMBERED_HEADING.match(line)
+        if match:
+            number = int(match.group(1))
+            title = line[match.end() - 1:]
+            if self.in_subsection:
+                # Inside a PPK subsection only an upper-case title ("2. VERTIGO")
+                # starts the next entry; mixed-case numbered lines are list items
+                is_heading = title.upper() == title
+            else:
+                is_heading = number == 1 or (self.last_number is not None and number == self.last_number + 1)
+            if is_heading:
+                self.last_number = number
+                self.in_subsection = False
+                return 2
+            return None
+        if line.lower().startswith(_SUBSECTION_HEADINGS):
+            self.in_subsection = True
+            return 3
+        return None
+
+
+def iter_sections(pages: Iterable[Tuple[int, str]]) -> Iterator[_Section]:
+    """Split a page stream into sections at detected headings."""
+    detector = _HeadingDetector()
+    stack: List[Tuple[int, str]] = []  # (level, heading) of the current path
+    section = _Section(())
+    for page_number, page_text in pages:
+        for raw in page_text.split("\n"):
+            line = raw.strip()
+            if not line:
+                continue
+            level = detector.level(line)
+            if level is None:
+                section.lines.append((page_number, line))
+                continue
+            if section.heading or section.lines:
+                yield section
+            while stack and stack[-1][0] >= level:
+                stack.pop()
+            stack.append((level, line))
+            section = _Section(tuple(heading for _, heading in stack), (page_number, line))
+    if section.heading or section.lines:
+        yield section
+
+
+def _common_prefix(paths: List[Tuple[str, ...]]) -> Tuple[str, ...]:
+    prefix = paths[0]
+    for path in paths[1:]:
+        length = 0
+        while length < min(len(prefix), len(path)) and prefix[length] == path[length]:
+            length += 1
+        prefix = prefix[:length]
+    return prefix
+
+
+def _belongs_with(group: List[_Section], section: _Section) -> bool:
+    """Whether `section` continues the group: a subsection of it, or a sibling in a flat list."""
+    anchor = group[0].path
+    if not anchor:
+        return not section.path
+    if section.path[:len(anchor)] == anchor and len(section.path) > len(anchor):
+        # Subsections join their section, unless the group is already a list of
+        # siblings, or this starts a new entry after one that had subsections
+        return all(
+            member.path[:len(anchor)] == anchor and len(member.path) <= len(section.path)
+            for member in group
+        )
+    flat = all(len(member.path) == len(anchor) for member in group)
+    return flat and len(section.path) == len(anchor) and section.path[:-1] == anchor[:-1]
+
+
+def _render(group: List[_Section], chunk_size: int) -> Iterator[Tuple[str, int, int, str]]:
+    """Chunk text (split at lines if too large), pages and section path of a group."""
+    path = _common_prefix([section.path for section in group])
+    breadcrumb = SECTION_PATH_SEPARATOR.join(path)
+    lines: List[Tuple[int, str]] = []
+    for section in group:
+        # Headings already in the breadcrumb are not repeated
+        if section.heading and len(section.path) > len(path):
+            lines.append(section.heading)
+        lines.extend(section.lines)
+    if not lines:
+        return
+
+    budget = max(1, chunk_size - len(breadcrumb) - 1)
+    piece: List[Tuple[int, str]] = []
+    piece_size = 0
+
+    def emit(piece):
+        body = "\n".join(text for _, text in piece)
+        text = f"{breadcrumb}\n{body}" if breadcrumb else body
+        return text, piece[0][0], piece[-1][0], breadcrumb
+
+    for page_number, text in lines:
+        # A single line longer than the budget is cut into pieces
+        parts = [text[i:i + budget] for i in range(0, len(text), budget)]
+        for part in parts:
+            if piece and piece_size + len(part) + 1 > budget:
+                yield emit(piece)
+                piece, piece_size = [], 0
+            piece.append((page_number, part))
+            piece_size += len(part) + 1
+    if piece:
+        yield emit(piece)
+
+
+def iter_structured_chunks(pages: Iterable[Tuple[int, str]], chunk_size: int) -> Iterator[TextChunk]:
+    """
+    Chunk a stream of pages along its section structure.
+
+    Args:
+        pages: Iterable of (page_number, page_text) tuples
+        chunk_size: Maximum size of each chunk (in characters, including the section path)
+
+    Yields:
+        TextChunk with page_start/page_end and section_path
+    """
+    index = 0
+    group: List[_Section] = []
+    group_size = 0
+
+    def flush():
+        nonlocal index
+        for text, page_start, page_end, section_path in _render(group, chunk_size):
+            yield TextChunk(text, index, page_start, page_end, section_path)
+            index += 1
+
+    for section in iter_sections(pages):
+        if group and group_size + section.size <= chunk_size and _belongs_with(group, section):
+            group.append(section)
+            group_size += section.size
+            continue
+        if group:
+            yield from flush()
+        group, group_size = [section], section.size
+    if group:
+        yield from flush()
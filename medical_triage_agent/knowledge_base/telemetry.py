@@ -0,0 +1,359 @@
+# Copyright 2025 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Buffered Telemetry for Knowledge Base Ingestion.
+
+Ingestion reports structured events (embedding batches, errors, completed
+runs) through a `TelemetrySink`. `emit` only appends to a bounded in-memory
+queue. A background thread writes the queue in batches to the backend, so
+embedding never waits on logging I/O. If the backend falls behind and the
+queue is full, new events are dropped and counted.
+
+Backends, chosen with TELEMETRY_BACKEND:
+- `cloud`: Google Cloud Logging, one batched write per flush
+  (default when GOOGLE_CLOUD_PROJECT is set)
+- `jsonl`: append to a local JSON Lines file (TELEMETRY_JSONL_PATH), for
+  offline runs
+- `none`: keep only the in-memory metrics (default otherwise)
+
+Every sink aggregates batch latency, tokens and failures in memory, so a
+summary can be printed at the end of a run.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import Counter, deque
+from pathlib import Path
+from typing import List, Optional
+
+from ..genai_client import get_google_cloud_project
+
+logger = logging.getLogger(__name__)
+
+TELEMETRY_BACKENDS = ("cloud", "jsonl", "none")
+
+# Cloud Logging log name of ingestion events
+DEFAULT_LOG_NAME = "chroma-embeddings"
+
+DEFAULT_JSONL_PATH = Path(__file__).parent / "telemetry.jsonl"
+
+# Events buffered before new ones are dropped
+DEFAULT_QUEUE_SIZE = 10000
+
+# Events written per backend call
+DEFAULT_BATCH_SIZE = 200
+
+# Longest an event waits in the buffer before it is written
+DEFAULT_FLUSH_SECONDS = 2.0
+
+# Batch latencies kept for percentiles
+_MAX_LATENCY_SAMPLES = 10000
+
+
+def get_telemetry_queue_size() -> int:
+    """Get the event buffer size from TELEMETRY_QUEUE_SIZE (default 10000)."""
+    try:
+        return max(1, int(os.getenv("TELEMETRY_QUEUE_SIZE", DEFAULT_QUEUE_SIZE)))
+    except ValueError:
+        return DEFAULT_QUEUE_SIZE
+
+
+def get_telemetry_batch_size() -> int:
+    """Get the events written per backend call from TELEMETRY_BATCH_SIZE (default 200)."""
+    try:
+        return max(1, int(os.getenv("TELEMETRY_BATCH_SIZE", DEFAULT_BATCH_SIZE)))
+    except ValueError:
+        return DEFAULT_BATCH_SIZE
+
+
+def get_telemetry_flush_interval() -> float:
+    """Get the longest buffering delay from TELEMETRY_FLUSH_SECONDS (default 2)."""
+    try:
+        return max(0.1, float(os.getenv("TELEMETRY_FLUSH_SECONDS", DEFAULT_FLUSH_SECONDS)))
+    except ValueError:
+        return DEFAULT_FLUSH_SECONDS
+
+
+class TelemetryMetrics:
+    """In-memory aggregate of embedding events (thread-safe)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.events = Counter()
+            self.batches = 0
+            self.embedded_chunks = 0
+            self.tokens = 0
+            self.batch_errors = 0
+            self.failed_chunks = 0
+            self.cached_chunks = 0
+            self.latencies_ms = deque(maxlen=_MAX_LATENCY_SAMPLES)
+
+    def record(self, event: dict) -> None:
+        name = event.get("event", "")
+        with self._lock:
+            self.events[name] += 1
+            if name == "embedding_batch_complete":
+                self.batches += 1
+                self.embedded_chunks += event.get("successful_embeddings", 0)
+                self.tokens += event.get("estimated_tokens", 0)
+                if "latency_ms" in event:
+                    self.latencies_ms.append(event["latency_ms"])
+            elif name == "embedding_batch_error":
+                self.batch_errors += 1
+            elif name == "embedding_generation_complete":
+                self.failed_chunks += event.get("failed_chunks", 0)
+                self.cached_chunks += event.get("cached_chunks", 0)
+
+    def latency_percentile(self, fraction: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self.latencies_ms)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            result = {
+                "batches": self.batches,
+                "embedded_chunks": self.embedded_chunks,
+                "cached_chunks": self.cached_chunks,
+                "estimated_tokens": self.tokens,
+                "batch_errors": self.batch_errors,
+                "failed_chunks": self.failed_chunks,
+            }
+        result.update({
+            "latency_p50_ms": self.latency_percentile(0.5),
+            "latency_p95_ms": self.latency_percentile(0.95),
+            "latency_max_ms": self.latency_percentile(1.0),
+        })
+        return result
+
+
+class TelemetrySink:
+    """
+    Non-blocking event sink; the base class keeps metrics only.
+
+    Subclasses implement `_write_batch`. It runs on the sink's background
+    thread, and its errors are counted, never raised to the caller.
+    """
+
+    name = "none"
+    writes = False
+
+    def __init__(
+        self,
+        max_queue: Optional[int] = None,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None,
+    ):
+        """
+        Args:
+            max_queue: Events buffered before dropping. If None, uses TELEMETRY_QUEUE_SIZE
+            batch_size: Events per write. If None, uses TELEMETRY_BATCH_SIZE
+            flush_interval: Seconds an event may wait before it is written. If None, uses TELEMETRY_FLUSH_SECONDS
+        """
+        self.metrics = TelemetryMetrics()
+        self.batch_size = batch_size or get_telemetry_batch_size()
+        self.flush_interval = flush_interval or get_telemetry_flush_interval()
+        self._queue = queue.Queue(maxsize=max_queue or get_telemetry_queue_size())
+        self._flush_requested = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.write_errors = 0
+
+    def describe(self) -> str:
+        return self.name
+
+    def emit(self, event: dict, severity: str = "INFO") -> None:
+        """Record an event and queue it for writing. Never blocks."""
+        self.metrics.record(event)
+        if not self.writes:
+            return
+        record = {"timestamp": time.time(), "severity": severity, **event}
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+        if self._thread is None:
+            self._start()
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """
+        Write everything queued so far.
+
+        Returns:
+            True if the queue drained within `timeout` seconds
+        """
+        deadline = time.monotonic() + timeout
+        self._flush_requested.set()
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._queue.all_tasks_done.wait(remaining)
+        return True
+
+    def summary(self) -> str:
+        metrics = self.metrics.as_dict()
+        latency = (
+            f"batch latency p50 {metrics['latency_p50_ms']:.0f} ms / p95 {metrics['latency_p95_ms']:.0f} ms / "
+            f"max {metrics['latency_max_ms']:.0f} ms"
+            if metrics["latency_p50_ms"] is not None else "no batch latencies"
+        )
+        return (
+            f"Telemetry ({self.describe()}): {metrics['batches']} embedding batches, "
+            f"{metrics['embedded_chunks']} chunks embedded, {metrics['cached_chunks']} cached, "
+            f"~{metrics['estimated_tokens']} tokens; {latency}; "
+            f"{metrics['batch_errors']} batch errors, {metrics['failed_chunks']} failed chunks; "
+            f"{self.written} events written, {self.dropped} dropped, {self.write_errors} write errors"
+        )
+
+    def _start(self) -> None:
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"telemetry-{self.name}", daemon=True)
+                self._thread.start()
+
+    def _next_batch(self) -> List[dict]:
+        """Wait for events; return up to `batch_size` once full, due or flushed."""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            if self._flush_requested.is_set():
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    self._flush_requested.clear()
+                    break
+                continue
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=min(remaining, 0.1)))
+            except queue.Empty:
+                continue
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            try:
+                self._write_batch(batch)
+                self.written += len(batch)
+            except Exception as e:
+                self.write_errors += 1
+                logger.warning(f"Could not write {len(batch)} telemetry events to {self.describe()}: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write_batch(self, records: List[dict]) -> None:
+        pass
+
+
+class JsonlTelemetrySink(TelemetrySink):
+    """Appends events to a local JSON Lines file."""
+
+    name = "jsonl"
+    writes = True
+
+    def __init__(self, path: Path, **kwargs):
+        super().__init__(**kwargs)
+        self.path = Path(path)
+
+    def describe(self) -> str:
+        return f"jsonl:{self.path}"
+
+    def _write_batch(self, records: List[dict]) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write("".join(json.dumps(record, default=str) + "\n" for record in records))
+
+
+class CloudLoggingTelemetrySink(TelemetrySink):
+    """Writes events to Google Cloud Logging, one batched API call per flush."""
+
+    name = "cloud"
+    writes = True
+
+    def __init__(self, project: str, log_name: str = DEFAULT_LOG_NAME, **kwargs):
+        from google.cloud import logging as cloud_logging
+
+        super().__init__(**kwargs)
+        self.log_name = log_name
+        # One client for the process; creating it per call costs an auth round trip
+        self._logger = cloud_logging.Client(project=project).logger(log_name)
+
+    def describe(self) -> str:
+        return f"cloud:{self.log_name}"
+
+    def _write_batch(self, records: List[dict]) -> None:
+        batch = self._logger.batch()
+        for record in records:
+            record = dict(record)
+            severity = record.pop("severity", "INFO")
+            record.pop("timestamp", None)
+            batch.log_struct(record, severity=severity)
+        batch.commit()
+
+
+def get_telemetry_backend_name() -> str:
+    """Get the backend from TELEMETRY_BACKEND (default "cloud" with a GCP project, else "none")."""
+    default = "cloud" if get_google_cloud_project() else "none"
+    name = os.getenv("TELEMETRY_BACKEND", default).strip().lower() or default
+    if name not in TELEMETRY_BACKENDS:
+        raise ValueError(f"Unknown TELEMETRY_BACKEND {name!r}; use one of {TELEMETRY_BACKENDS}")
+    return name
+
+
+_sink: Optional[TelemetrySink] = None
+_sink_lock = threading.Lock()
+
+
+def get_telemetry_sink() -> TelemetrySink:
+    """
+    Get the process-wide telemetry sink (created on first use, flushed at exit).
+
+    If the configured sink cannot be initialized, a metrics-only sink is used.
+    """
+    global _sink
+    with _sink_lock:
+        if _sink is None:
+            name = get_telemetry_backend_name()
+            try:
+                if name == "cloud":
+                    _sink = CloudLoggingTelemetrySink(get_google_cloud_project())
+                elif name == "jsonl":
+                    _sink = JsonlTelemetrySink(os.getenv("TELEMETRY_JSONL_PATH") or DEFAULT_JSONL_PATH)
+            except Exception as e:
+                print(f"Warning: Could not initialize {name} telemetry sink: {e}")
+            if _sink is None:
+                _sink = TelemetrySink()
+            atexit.register(_sink.flush)
+        return _sink
@@ -13,24 +13,20 @@
 # limitations under the License.
 
 import json
-import os
 import re
 from pathlib import Path
-from google import genai
 from google.genai import types
 from google.adk.tools import FunctionTool
 from google.adk.tools.tool_context import ToolContext
 
-# Get environment variables
-GOOGLE_CLOUD_PROJECT = os.getenv("GOOGLE_CLOUD_PROJECT")
-GOOGLE_CLOUD_LOCATION = os.getenv("GOOGLE_CLOUD_LOCATION", "us-central1")
+from medical_triage_agent.genai_client import get_async_genai_client
 
 # Path to knowledge PDF
 KNOWLEDGE_DIR = Path(__file__).parent.parent / "knowledge"
 BATES_PDF_PATH = KNOWLEDGE_DIR / "Bates_Guide_to_Physical_Examination.pdf"
 
 
-def extract_symptoms(conversation_transcript: str, tool_context: ToolContext = None) -> str:
+async def extract_symptoms(conversation_transcript: str, tool_context: ToolContext = None) -> str:
     """
     Mengekstrak dan strukturkan data gejala dari transkrip percakapan wawancara
     menggunakan Gemini LLM untuk ekstraksi entitas medis.
@@ -78,12 +74,8 @@ def extract_symptoms(conversation_transcript: str, tool_context: ToolContext = N
         
         return empty_json
     
-    # Initialize Gemini client
-    client = genai.Client(
-        vertexai=True,
-        project=GOOGLE_CLOUD_PROJECT,
-        location=GOOGLE_CLOUD_LOCATION,
-    )
+    # Async facade of the shared Gemini client, so the event loop keeps serving other sessions
+    client = get_async_genai_client()
     
     # NOTE: We do NOT load the full Bates Guide PDF here because:
     # 1. The PDF has 1010 pages, exceeding Gemini's 1000 page limit
@@ -162,7 +154,7 @@ dan medis yang relevan ke dalam format JSON terstruktur.
     try:
         # Generate response using Gemini
         response_text = ""
-        for chunk in client.models.generate_content_stream(
+        async for chunk in await client.models.generate_content_stream(
             model="gemini-2.5-flash",
             contents=contents,
             config=generate_content_config,
@@ -307,7 +299,7 @@ dan medis yang relevan ke dalam format JSON terstruktur.
         return error_json
 
 
-def query_interview_guide(question: str) -> str:
+async def query_interview_guide(question: str) -> str:
     """
     Mengquery Bates Guide to Physical Examination untuk mendapatkan panduan 
     teknik wawancara, pertanyaan yang tepat, atau informasi tentang pemeriksaan fisik.
@@ -338,7 +330,7 @@ def query_interview_guide(question: str) -> str:
     try:
         from medical_triage_agent.knowledge_base.chroma_tools import query_bates_guide
         
-        result = query_bates_guide(question, n_results=5)
+        result = await query_bates_guide(question, n_results=5)
         return result if result else "Tidak ada informasi yang ditemukan untuk pertanyaan ini."
     except Exception as e:
         return f"Error saat mengquery Bates Guide melalui Chroma: {str(e)}"
@@ -12,22 +12,17 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
 import json
-import os
 from pathlib import Path
-from google import genai
 from google.genai import types
 from google.adk.tools import FunctionTool
 
-# Import Chroma tools for vector database queries
-from medical_triage_agent.knowledge_base.chroma_tools import (
-    query_bpjs_criteria,
-    query_ppk_kemenkes,
-)
+from medical_triage_agent.genai_client import get_async_genai_client
 
-# Get environment variables
-GOOGLE_CLOUD_PROJECT = os.getenv("GOOGLE_CLOUD_PROJECT")
-GOOGLE_CLOUD_LOCATION = os.getenv("GOOGLE_CLOUD_LOCATION", "us-central1")
+# Chroma vector database retrieval (one embedding, collections searched concurrently)
+from medical_triage_agent.knowledge_base.chroma_setup import COLLECTION_BPJS, COLLECTION_PPK
+from medical_triage_agent.knowledge_base.retrieval import search_knowledge_base_async
 
 # Path to knowledge PDFs (fallback if Chroma is not available)
 # Note: Folder name is "knowlegde" (typo in original, but keeping it as is)
@@ -36,7 +31,7 @@ BPJS_PDF_PATH = KNOWLEDGE_DIR / "Pedoman-BPJS-Kriteria-Gawat-Darurat.pdf"
 PPK_KEMENKES_PDF_PATH = KNOWLEDGE_DIR / "ppk-kemenkes.pdf"
 
 
-def check_bpjs_criteria(symptoms_data: str) -> str:
+async def check_bpjs_criteria(symptoms_data: str) -> str:
     """
     Memetakan gejala ke Kriteria Gawat Darurat BPJS menggunakan Pedoman BPJS 
     dan menentukan triage level (Gawat Darurat / Mendesak / Non-Urgen).
@@ -71,12 +66,8 @@ def check_bpjs_criteria(symptoms_data: str) -> str:
     riwayat_medis = symptoms.get("riwayat_medis", [])
     obat = symptoms.get("obat", [])
     
-    # Initialize Gemini client
-    client = genai.Client(
-        vertexai=True,
-        project=GOOGLE_CLOUD_PROJECT,
-        location=GOOGLE_CLOUD_LOCATION,
-    )
+    # Async facade of the shared Gemini client, so the event loop keeps serving other sessions
+    client = get_async_genai_client()
     
     # Use Chroma vector database to get relevant information (FASTER & MORE ACCURATE)
     print("[INFO] Querying Chroma vector database for relevant BPJS and PPK criteria...")
@@ -98,40 +89,38 @@ def check_bpjs_criteria(symptoms_data: str) -> str:
     bpjs_info = ""
     ppk_info = ""
     try:
-        bpjs_info = query_bpjs_criteria(query_text, n_results=10)
+        # One query embedding for both collections, searched in parallel
+        kb_results = await search_knowledge_base_async(query_text, [COLLECTION_BPJS, COLLECTION_PPK], n_results=10)
+        bpjs_info = kb_results.format([COLLECTION_BPJS])
+        ppk_info = kb_results.format([COLLECTION_PPK])
         print(f"[INFO] Retrieved {len(bpjs_info)} characters from BPJS criteria")
-    except Exception as e:
-        print(f"Warning: Could not query BPJS criteria from Chroma: {e}")
-    
-    try:
-        ppk_info = query_ppk_kemenkes(query_text, n_results=10)
         print(f"[INFO] Retrieved {len(ppk_info)} characters from PPK Kemenkes")
     except Exception as e:
-        print(f"Warning: Could not query PPK Kemenkes from Chroma: {e}")
+        print(f"Warning: Could not query BPJS/PPK criteria from Chroma: {e}")
     
     # Fallback: Read PDFs if Chroma queries failed or returned no results
     pdf_parts = []
     if (not bpjs_info or "No relevant information" in bpjs_info) and BPJS_PDF_PATH.exists():
         try:
-            with open(BPJS_PDF_PATH, 'rb') as pdf_file:
-                pdf_bytes = pdf_file.read()
-                pdf_parts.append(types.Part.from_bytes(
-                    data=pdf_bytes,
-                    mime_type="application/pdf"
-                ))
-                print(f"[INFO] Fallback: Loaded BPJS criteria PDF: {BPJS_PDF_PATH.name}")
+            # Read off the event loop; the guideline PDFs are several MB
+            pdf_bytes = await asyncio.to_thread(BPJS_PDF_PATH.read_bytes)
+            pdf_parts.append(types.Part.from_bytes(
+                data=pdf_bytes,
+                mime_type="application/pdf"
+            ))
+            print(f"[INFO] Fallback: Loaded BPJS criteria PDF: {BPJS_PDF_PATH.name}")
         except Exception as e:
             print(f"Warning: Could not read BPJS PDF: {e}")
     
     if (not ppk_info or "No relevant information" in ppk_info) and PPK_KEMENKES_PDF_PATH.exists():
         try:
-            with open(PPK_KEMENKES_PDF_PATH, 'rb') as pdf_file:
-                pdf_bytes = pdf_file.read()
-                pdf_parts.append(types.Part.from_bytes(
-                    data=pdf_bytes,
-                    mime_type="application/pdf"
-                ))
-                print(f"[INFO] Fallback: Loaded PPK Kemenkes PDF: {PPK_KEMENKES_PDF_PATH.name}")
+            # Read off the event loop; the guideline PDFs are several MB
+            pdf_bytes = await asyncio.to_thread(PPK_KEMENKES_PDF_PATH.read_bytes)
+            pdf_parts.append(types.Part.from_bytes(
+                data=pdf_bytes,
+                mime_type="application/pdf"
+            ))
+            print(f"[INFO] Fallback: Loaded PPK Kemenkes PDF: {PPK_KEMENKES_PDF_PATH.name}")
         except Exception as e:
             print(f"Warning: Could not read PPK Kemenkes PDF: {e}")
     
@@ -245,7 +234,7 @@ gejala pasien dan memetakannya ke Kriteria Gawat Darurat BPJS berdasarkan
     try:
         # Generate response
         response_text = ""
-        for chunk in client.models.generate_content_stream(
+        async for chunk in await client.models.generate_content_stream(
             model="gemini-2.5-flash",
             contents=contents,
             config=generate_content_config,
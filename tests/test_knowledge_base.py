@@ -0,0 +1,102 @@
+"""
+Offline tests of the knowledge base: ingestion, versioned rebuilds, sync and search.
+
+Embeddings come from the hashing backend and PDF pages are fed directly to
+the extraction pipeline, so the tests need no network, credentials or PDFs.
+"""
+
+import pytest
+
+from medical_triage_agent.knowledge_base import chroma_setup, pdf_pipeline, retrieval
+from medical_triage_agent.knowledge_base.collection_aliases import resolve_collection
+
+COLLECTION = chroma_setup.COLLECTION_BATES
+
+
+def make_pages(topic: str, count: int = 3):
+    return [
+        (page, "\n".join(f"Kalimat {line} halaman {page} tentang {topic} pada pasien." for line in range(30)))
+        for page in range(1, count + 1)
+    ]
+
+
+@pytest.fixture
+def knowledge_base(tmp_path, monkeypatch):
+    """A Chroma DB in tmp_path whose source PDF yields the pages in `kb.pages`."""
+    monkeypatch.setenv("EMBEDDING_BACKEND", "hashing")
+    monkeypatch.setenv("EMBEDDING_CACHE_PATH", str(tmp_path / "embedding_cache.sqlite3"))
+    monkeypatch.setenv("QUERY_CACHE_MAX_MB", "0")
+    monkeypatch.setenv("TELEMETRY_BACKEND", "none")
+    monkeypatch.delenv("COMPACT_STORE_DTYPE", raising=False)
+
+    db_path = tmp_path / "chroma_db"
+    monkeypatch.setattr(chroma_setup, "CHROMA_DB_PATH", db_path)
+    monkeypatch.setattr(retrieval, "CHROMA_DB_PATH", db_path)
+
+    class KnowledgeBase:
+        pass
+
+    kb = KnowledgeBase()
+    kb.db_path = db_path
+    kb.pdf_path = tmp_path / "source.pdf"
+    kb.pdf_path.write_text("placeholder")  # Hashed for the manifest; pages come from kb.pages
+    kb.pages = make_pages("nyeri dada")
+    monkeypatch.setattr(pdf_pipeline, "iter_pdf_pages_parallel", lambda pdf_path, workers=None: iter(kb.pages))
+
+    chroma_setup.reload_collections()
+    yield kb
+    chroma_setup.reload_collections()
+
+
+def search_text(query: str) -> str:
+    return retrieval.search_knowledge_base(query, [COLLECTION], n_results=3).format()
+
+
+def test_ingest_then_search(knowledge_base):
+    count = chroma_setup.ingest_pdf_to_chroma(knowledge_base.pdf_path, COLLECTION)
+
+    assert count > 0
+    assert chroma_setup.is_collection_built(COLLECTION)
+    assert resolve_collection(knowledge_base.db_path, COLLECTION) != COLLECTION
+
+    results = retrieval.search_knowledge_base("nyeri dada", [COLLECTION], n_results=3)
+    assert results.error is None
+    assert results.collections[COLLECTION].error is None
+    assert results.documents(COLLECTION)
+    assert "nyeri dada" in results.format()
+
+
+def test_force_reload_swaps_alias_to_new_version(knowledge_base):
+    chroma_setup.ingest_pdf_to_chroma(knowledge_base.pdf_path, COLLECTION)
+    first = resolve_collection(knowledge_base.db_path, COLLECTION)
+
+    knowledge_base.pages = make_pages("sesak napas")
+    chroma_setup.ingest_pdf_to_chroma(knowledge_base.pdf_path, COLLECTION, force_reload=True)
+    second = resolve_collection(knowledge_base.db_path, COLLECTION)
+
+    assert second != first
+    assert chroma_setup.is_collection_built(COLLECTION)
+    text = search_text("sesak napas")
+    assert "sesak napas" in text
+    assert "nyeri dada" not in text
+
+
+def test_sync_updates_collection_in_place(knowledge_base):
+    chroma_setup.ingest_pdf_to_chroma(knowledge_base.pdf_path, COLLECTION)
+    version = resolve_collection(knowledge_base.db_path, COLLECTION)
+
+    # The first page changes; the others keep their chunks and vectors
+    knowledge_base.pages = make_pages("demam tinggi", count=1) + knowledge_base.pages[1:]
+    count = chroma_setup.ingest_pdf_to_chroma(knowledge_base.pdf_path, COLLECTION, sync=True)
+
+    assert count > 0
+    assert resolve_collection(knowledge_base.db_path, COLLECTION) == version
+    assert "demam tinggi" in search_text("demam tinggi")
+    assert "halaman 1 tentang nyeri dada" not in search_text("nyeri dada")
+
+
+def test_search_reports_missing_collection(knowledge_base):
+    results = retrieval.search_knowledge_base("nyeri dada", [COLLECTION], n_results=3)
+
+    assert results.collections[COLLECTION].error
+    assert results.format() == retrieval.NO_RESULTS_TEXT
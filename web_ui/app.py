@@ -25,6 +25,7 @@ from pathlib import Path
 # Add parent directory to path to import medical_triage_agent
 sys.path.insert(0, str(Path(__file__).parent.parent))
 from medical_triage_agent.agent import root_agent
+from medical_triage_agent.env import env_number
 
 # Configure logging
 logging.basicConfig(
@@ -67,64 +68,94 @@ async def initialize_knowledge_base():
         try:
             from medical_triage_agent.knowledge_base.chroma_setup import (
                 get_chroma_client,
+                get_collection_counts,
                 initialize_knowledge_base,
-                ensure_chroma_from_gcs
+                ensure_chroma_from_gcs,
+                is_collection_built,
+                is_knowledge_base_ready,
+                get_build_lease,
+                elect_knowledge_base_builder
             )
             
             logger.info("Checking Chroma knowledge base...")
             
             # First, try to download from Cloud Storage if available
-            # This is fast (download) vs slow (re-embedding)
-            downloaded = ensure_chroma_from_gcs()
-            if downloaded:
-                logger.info("Chroma DB downloaded from Cloud Storage. Verifying...")
+            # This is fast (download) vs slow (re-embedding). Blocking work runs in
+            # threads so the event loop keeps serving WebSockets meanwhile.
+            downloaded = await asyncio.to_thread(ensure_chroma_from_gcs)
+            readiness = is_knowledge_base_ready()
+            if downloaded and readiness:
+                # The readiness manifest is only written once every collection is built
+                logger.info(f"Chroma knowledge base is ready (build {readiness['build_id']}, {readiness['total_chunks']} chunks).")
+                return
             
-            # Check if knowledge base already exists (either downloaded or local)
-            client = get_chroma_client()
-            # In Chroma v0.6.0+, list_collections() returns list of names (strings)
-            collection_names = client.list_collections()
+            # Exactly one instance builds; the others wait for its snapshot
+            lease = get_build_lease()
+            is_builder = await asyncio.to_thread(elect_knowledge_base_builder, lease)
+            if not is_builder:
+                logger.info("Chroma knowledge base was built by another instance and is ready.")
+                return
             
             expected_collections = ["bpjs_criteria", "ppk_kemenkes", "bates_guide"]
-            missing_collections = [c for c in expected_collections if c not in collection_names]
             
-            if missing_collections:
-                logger.info(f"Missing collections: {missing_collections}. Initializing knowledge base in background...")
-                # Run in thread pool to avoid blocking
-                import concurrent.futures
-                with concurrent.futures.ThreadPoolExecutor() as executor:
-                    future = executor.submit(initialize_knowledge_base, False)
-                    results = future.result()
-                logger.info(f"Knowledge base initialized: {results}")
-            else:
-                # Verify collections have data
-                all_have_data = True
-                for coll_name in expected_collections:
-                    try:
-                        collection = client.get_collection(coll_name)
-                        if collection.count() == 0:
-                            all_have_data = False
-                            break
-                    except Exception:
-                        all_have_data = False
-                        break
-                
-                if not all_have_data:
-                    logger.info("Some collections are empty. Re-initializing in background...")
-                    import concurrent.futures
-                    with concurrent.futures.ThreadPoolExecutor() as executor:
-                        future = executor.submit(initialize_knowledge_base, True)
-                        results = future.result()
-                    logger.info(f"Knowledge base re-initialized: {results}")
+            def inspect_collections():
+                # Counts are taken from the version each collection alias points to
+                counts = get_collection_counts(get_chroma_client())
+                built = {c: c in counts and is_collection_built(c) for c in expected_collections}
+                return counts, built
+            
+            with lease.keep_alive():
+                # Check if knowledge base already exists (either downloaded or local)
+                counts, built = await asyncio.to_thread(inspect_collections)
+                missing_collections = [c for c in expected_collections if c not in counts]
+            
+                if missing_collections:
+                    logger.info(f"Missing collections: {missing_collections}. Initializing knowledge base in background...")
+                    results = await asyncio.to_thread(initialize_knowledge_base, False)
+                    logger.info(f"Knowledge base initialized: {results}")
                 else:
-                    logger.info("Chroma knowledge base is already initialized and ready.")
+                    # Verify collections have data
+                    all_have_data = all(counts[coll_name] > 0 for coll_name in expected_collections)
+                
+                    if not all_have_data:
+                        logger.info("Some collections are empty. Re-initializing in background...")
+                        results = await asyncio.to_thread(initialize_knowledge_base, True)
+                        logger.info(f"Knowledge base re-initialized: {results}")
+                    elif not all(built.values()):
+                        partial_collections = [c for c in expected_collections if not built[c]]
+                        logger.info(f"Partially built collections: {partial_collections}. Resuming ingestion in background...")
+                        results = await asyncio.to_thread(initialize_knowledge_base, False)
+                        logger.info(f"Knowledge base ingestion resumed: {results}")
+                    else:
+                        logger.info("Chroma knowledge base is already initialized and ready.")
         
         except Exception as e:
             logger.warning(f"Could not initialize Chroma knowledge base: {e}")
             logger.warning("The app will continue, but knowledge base features may not work.")
             # Don't fail startup if Chroma init fails - app can still run
     
+    async def _refresh_chroma(init_task: asyncio.Task, interval: float):
+        """Background task to hot-reload newer published snapshots."""
+        from medical_triage_agent.knowledge_base.chroma_setup import refresh_knowledge_base
+        
+        # Never replace the DB under a build started by this instance
+        await init_task
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                build_id = await asyncio.to_thread(refresh_knowledge_base)
+                if build_id:
+                    logger.info(f"Knowledge base hot-reloaded to build {build_id}")
+            except Exception as e:
+                logger.warning(f"Could not refresh Chroma knowledge base: {e}")
+    
     # Run initialization in background task
-    asyncio.create_task(_init_chroma())
+    init_task = asyncio.create_task(_init_chroma())
+    
+    # Optionally pick up rebuilds published by other instances without a restart
+    refresh_interval = env_number("KB_REFRESH_INTERVAL_SECONDS", 0.0)
+    if refresh_interval > 0:
+        asyncio.create_task(_refresh_chroma(init_task, refresh_interval))
 
 # CORS middleware for development
 app.add_middleware(
@@ -170,35 +201,33 @@ async def root():
 async def health():
     """Health check endpoint."""
     chroma_status = "unknown"
+    chroma_client = None
+    query_cache = None
     try:
-        from medical_triage_agent.knowledge_base.chroma_setup import get_chroma_client
-        client = get_chroma_client()
-        # In Chroma v0.6.0+, list_collections() returns list of names (strings)
-        collection_names = client.list_collections()
-        expected = ["bpjs_criteria", "ppk_kemenkes", "bates_guide"]
-        
-        if all(c in collection_names for c in expected):
-            # Check if collections have data
-            total_chunks = 0
-            for coll_name in expected:
-                try:
-                    collection = client.get_collection(coll_name)
-                    total_chunks += collection.count()
-                except Exception:
-                    pass
-            if total_chunks > 0:
-                chroma_status = f"ready ({total_chunks} chunks)"
-            else:
-                chroma_status = "initializing"
+        # Reads only the readiness manifest and registry counters; never opens the Chroma DB
+        from medical_triage_agent.knowledge_base.chroma_setup import (
+            get_chroma_registry_stats,
+            is_knowledge_base_ready,
+        )
+        readiness = is_knowledge_base_ready()
+        if readiness:
+            chroma_status = f"ready ({readiness['total_chunks']} chunks, build {readiness['build_id']})"
         else:
             chroma_status = "initializing"
+        chroma_client = get_chroma_registry_stats()
+        
+        from medical_triage_agent.knowledge_base.query_cache import get_query_cache
+        cache = get_query_cache()
+        query_cache = cache.stats() if cache else None
     except Exception:
         chroma_status = "error"
     
     return {
         "status": "ok",
         "app": APP_NAME,
-        "chroma_knowledge_base": chroma_status
+        "chroma_knowledge_base": chroma_status,
+        "chroma_client": chroma_client,
+        "query_embedding_cache": query_cache
     }
 
 @app.get("/api/reverse-geocode")